@@ -1,17 +1,23 @@
 from django.contrib import admin
+from django.db import transaction
 
 from .models import Genre, Movie, Tag, UserRating
+from .ratings import add_rating, change_rating, remove_rating
 
 
 class MovieAdmin(admin.ModelAdmin):
     list_display = ("title", "rating")
     search_fields = ("title", "genres__name", "tags__name")
     list_filter = ("genres", "tags")
+    # Derived fields are maintained by rating writes and signals, and the version by every change
+    readonly_fields = ("rating", "rating_sum", "rating_count", "genre_mask", "tag_summary", "tag_count", "version")
 
 
 class GenreAdmin(admin.ModelAdmin):
     list_display = ("name",)
     search_fields = ("name",)
+    # Bits are assigned on creation, and changing one would orphan it in every movie's genre_mask
+    readonly_fields = ("bit",)
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -24,6 +30,32 @@ class UserRatingAdmin(admin.ModelAdmin):
     search_fields = ("movie__title", "user__username")
     list_filter = ("movie", "user")
 
+    # Keep the movies' running rating aggregates in sync with edits made through the admin
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        if change:
+            previous = UserRating.objects.select_for_update().get(pk=obj.pk)
+            if previous.movie_id != obj.movie_id:
+                remove_rating(previous.movie_id, previous.rating)
+                add_rating(obj.movie_id, obj.rating)
+            else:
+                change_rating(obj.movie_id, previous.rating, obj.rating)
+        else:
+            add_rating(obj.movie_id, obj.rating)
+        super().save_model(request, obj, form, change)
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        remove_rating(obj.movie_id, obj.rating)
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for user_rating in queryset.select_for_update():
+            remove_rating(user_rating.movie_id, user_rating.rating)
+        super().delete_queryset(request, queryset)
+
 
 admin.site.register(Movie, MovieAdmin)
 admin.site.register(Genre, GenreAdmin)
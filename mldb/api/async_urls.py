@@ -0,0 +1,9 @@
+from django.urls import path
+
+from .async_views import movie_detail, movie_list, movie_rate
+
+urlpatterns = [
+    path("movies/", movie_list, name="movie-list-create"),
+    path("movies/<int:pk>/", movie_detail, name="movie-detail-update"),
+    path("movies/<int:movie_id>/rate/", movie_rate, name="movie-rate"),
+]
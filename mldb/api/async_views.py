@@ -0,0 +1,272 @@
+"""
+Native async movie views, served in place of the DRF views when the project runs under ASGI.
+
+DRF views are sync, so under ASGI every request to them holds a thread of the sync bridge for its whole duration.
+These views read through Django's async ORM and async cache API instead and produce the same bytes as the DRF
+views with ``MOVIE_FAST_READS`` on. Requests they don't handle natively, such as writes to the catalog, cursor
+pages, filters or browsable API pages, are handed to the DRF views through ``sync_to_async``. Rating writes need
+a transaction, which the async ORM can't open, so only the write itself crosses the bridge.
+"""
+
+import json
+import math
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.filters import OrderingFilter
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from mldb.cache import (
+    acatalog_version,
+    amovie_version,
+    amovie_versions,
+    awrites_version,
+)
+from mldb.metrics import serialization
+from mldb.middleware import pinned_to_primary
+from mldb.models import Movie
+
+from .cache import normalized_query, record
+from .conditional import list_etag, movie_etag, set_validators
+from .fast_reads import MOVIE_ROW_FIELDS, FastJSONRenderer, amovie_representations
+from .pagination import StandardResultsSetPagination
+from .serializers import UserRatingSerializer, wants_full_tags
+from .views import MovieDetailUpdateView, MovieListCreateView, MovieRatingView
+
+sync_movie_list = sync_to_async(MovieListCreateView.as_view())
+sync_movie_detail = sync_to_async(MovieDetailUpdateView.as_view())
+sync_movie_rate = sync_to_async(MovieRatingView.as_view())
+
+# Query parameters of the movie list that the async view handles itself
+NATIVE_LIST_PARAMS = {"page", "page_size", "ordering", "tags", "pagination"}
+
+
+def json_response(data: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> HttpResponse:
+    """Renders data like the DRF views do with ``FastJSONRenderer``."""
+    with serialization():
+        content = FastJSONRenderer().render(data)
+    return HttpResponse(content, status=status, headers=headers, content_type="application/json")
+
+
+def exception_response(exc: exceptions.APIException) -> HttpResponse:
+    """Renders an API exception like DRF's default exception handler."""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    return json_response(data, status=exc.status_code)
+
+
+def renders_compact_json(request: HttpRequest) -> bool:
+    """Whether DRF would render the response as compact JSON, rather than as a browsable API page or indented."""
+    accept = request.headers.get("Accept", "")
+    return "format" not in request.GET and "text/html" not in accept and "indent" not in accept
+
+
+def not_authenticated_response() -> HttpResponse:
+    # Session authentication sends no WWW-Authenticate challenge, so DRF answers with 403 rather than 401
+    exc = exceptions.NotAuthenticated()
+    exc.status_code = 403
+    return exception_response(exc)
+
+
+async def authenticate(request: HttpRequest) -> Optional[HttpResponse]:
+    """Returns DRF's response to an unauthenticated request, or None if the session user is authenticated."""
+    user = await request.auser()
+    return None if user.is_authenticated else not_authenticated_response()
+
+
+async def movie_page(request: HttpRequest, rows) -> Dict[str, Any]:
+    """
+    Paginates movie rows by page number like ``StandardResultsSetPagination``.
+
+    Args:
+        request: The list request.
+        rows: The ordered values queryset of movies.
+
+    Returns:
+        The page response data.
+
+    Raises:
+        NotFound: If the page number is invalid.
+    """
+    pagination = StandardResultsSetPagination
+    try:
+        page_size = int(request.GET[pagination.page_size_query_param])
+        page_size = min(page_size, pagination.max_page_size) if page_size > 0 else pagination.page_size
+    except (KeyError, ValueError):
+        page_size = pagination.page_size
+
+    count = await rows.acount()
+    num_pages = math.ceil(max(count, 1) / page_size)
+    page_number = request.GET.get(pagination.page_query_param) or 1
+    try:
+        page_number = num_pages if page_number in pagination.last_page_strings else int(page_number)
+    except ValueError:
+        raise exceptions.NotFound(pagination.invalid_page_message)
+    if not 1 <= page_number <= num_pages:
+        raise exceptions.NotFound(pagination.invalid_page_message)
+
+    start = (page_number - 1) * page_size
+    page: List[Dict[str, Any]] = [row async for row in rows[start : start + page_size]]
+    url = request.build_absolute_uri()
+    previous = None
+    if page_number > 1:
+        previous = (
+            remove_query_param(url, pagination.page_query_param)
+            if page_number == 2
+            else replace_query_param(url, pagination.page_query_param, page_number - 1)
+        )
+    return {
+        "count": count,
+        "next": (
+            replace_query_param(url, pagination.page_query_param, page_number + 1) if page_number < num_pages else None
+        ),
+        "previous": previous,
+        "results": await amovie_representations(page, wants_full_tags(request)),
+    }
+
+
+@csrf_exempt
+async def movie_list(request: HttpRequest) -> HttpResponse:
+    """
+    Lists movies like ``MovieListCreateView``, with page-number pagination and ``ordering``.
+
+    Other requests, including creates, filters, cursor pages and those of clients pinned to the primary, which skip
+    the cache, are served by ``MovieListCreateView``.
+    """
+    if (
+        request.method != "GET"
+        or not settings.MOVIE_FAST_READS
+        or not renders_compact_json(request)
+        or pinned_to_primary(request)
+        or set(request.GET) - NATIVE_LIST_PARAMS
+        or request.GET.get("pagination", settings.MOVIE_LIST_PAGINATION) != "page"
+    ):
+        return await sync_movie_list(request)
+
+    denied = await authenticate(request)
+    if denied is not None:
+        return denied
+
+    writes, catalog = await awrites_version(), await acatalog_version()
+    last_modified = (await Movie.objects.aaggregate(last_modified=Max("updated_at")))["last_modified"]
+    if last_modified is not None:
+        etag = list_etag(request, last_modified, catalog, writes)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return set_validators(not_modified, etag, last_modified)
+
+    key = f"mldb:movies:{catalog}:{normalized_query(request)}"
+    entry: Optional[Dict[str, Any]] = await cache.aget(key)
+    if entry is not None and await amovie_versions(entry["versions"]) == entry["versions"]:
+        record(MovieListCreateView.cache_name, hit=True)
+        response = json_response(entry["data"], headers={"X-Cache": "HIT"})
+    else:
+        record(MovieListCreateView.cache_name, hit=False)
+        rows = Movie.objects.values(*MOVIE_ROW_FIELDS)
+        ordering_param = request.GET.get(OrderingFilter.ordering_param)
+        if ordering_param:
+            terms = [term.strip() for term in ordering_param.split(",")]
+            ordering = OrderingFilter().remove_invalid_fields(rows, terms, MovieListCreateView, request)
+            if ordering:
+                rows = rows.order_by(*ordering)
+        try:
+            data = await movie_page(request, rows)
+        except exceptions.NotFound as exc:
+            return exception_response(exc)
+        versions = await amovie_versions(movie["id"] for movie in data["results"])
+        # Like CachedListMixin, only stores pages no movie changed during
+        if await awrites_version() == writes:
+            await cache.aset(key, {"data": data, "versions": versions}, settings.MOVIE_CACHE_TIMEOUT)
+        response = json_response(data, headers={"X-Cache": "MISS"})
+
+    return response if last_modified is None else set_validators(response, etag, last_modified)
+
+
+@csrf_exempt
+async def movie_detail(request: HttpRequest, pk: int) -> HttpResponse:
+    """Retrieves a movie like ``MovieDetailUpdateView``; updates are served by ``MovieDetailUpdateView``."""
+    if (
+        request.method != "GET"
+        or not settings.MOVIE_FAST_READS
+        or not renders_compact_json(request)
+        or pinned_to_primary(request)
+    ):
+        return await sync_movie_detail(request, pk=pk)
+
+    denied = await authenticate(request)
+    if denied is not None:
+        return denied
+
+    state = await Movie.objects.filter(pk=pk).values_list("version", "updated_at").afirst()
+    if state is not None:
+        etag = movie_etag(pk, state[0], wants_full_tags(request))
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(state[1].timestamp()))
+        if not_modified is not None:
+            return set_validators(not_modified, etag, state[1])
+
+    key = f"mldb:movie:{pk}:{await amovie_version(pk)}:{normalized_query(request)}"
+    data = await cache.aget(key)
+    if data is not None:
+        record(MovieDetailUpdateView.cache_name, hit=True)
+        response = json_response(data, headers={"X-Cache": "HIT"})
+    else:
+        record(MovieDetailUpdateView.cache_name, hit=False)
+        row = await Movie.objects.values(*MOVIE_ROW_FIELDS).filter(pk=pk).afirst()
+        if row is None:
+            return exception_response(exceptions.NotFound(f"No {Movie._meta.object_name} matches the given query."))
+        data = (await amovie_representations([row], wants_full_tags(request)))[0]
+        await cache.aset(key, data, settings.MOVIE_CACHE_TIMEOUT)
+        response = json_response(data, headers={"X-Cache": "MISS"})
+
+    return response if state is None else set_validators(response, etag, state[1])
+
+
+@csrf_exempt
+async def movie_rate(request: HttpRequest, movie_id: int) -> HttpResponse:
+    """
+    Rates a movie like ``MovieRatingView``: POST adds a first rating, PUT and PATCH create or replace it.
+
+    Authentication, CSRF checks and validation run on the event loop; the transactional write runs in the sync
+    bridge. Requests with bodies other than JSON are served by ``MovieRatingView``.
+    """
+    if (
+        request.method not in ("POST", "PUT", "PATCH")
+        or request.content_type != "application/json"
+        or not renders_compact_json(request)
+    ):
+        return await sync_movie_rate(request, movie_id=movie_id)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return not_authenticated_response()
+    upsert = request.method != "POST"
+    try:
+        # Like SessionAuthentication, the only authentication the async views accept
+        SessionAuthentication().enforce_csrf(request)
+        data = json.loads(request.body)
+    except exceptions.APIException as exc:
+        return exception_response(exc)
+    except ValueError as exc:
+        return exception_response(exceptions.ParseError(f"JSON parse error - {exc}"))
+
+    serializer = UserRatingSerializer(data=data, context={"request": SimpleNamespace(user=user), "upsert": upsert})
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=400)
+
+    def save() -> Dict[str, Any]:
+        serializer.save(movie_id=movie_id)
+        return serializer.data
+
+    try:
+        saved = await sync_to_async(save)()
+    except exceptions.APIException as exc:
+        return exception_response(exc)
+    return json_response(saved, status=200 if upsert else 201)
@@ -0,0 +1,92 @@
+import hashlib
+from typing import Any, Dict, Optional, Union
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from mldb.cache import (
+    catalog_version,
+    movie_version,
+    movie_versions,
+    stats,
+    writes_version,
+)
+from mldb.middleware import pinned_to_primary
+
+
+def normalized_query(request: Union[Request, HttpRequest]) -> str:
+    """Returns a stable digest of the request's host and query parameters, independent of their order."""
+    params = sorted((key, value) for key in request.GET for value in request.GET.getlist(key))
+    return hashlib.md5(repr((request.get_host(), params)).encode()).hexdigest()
+
+
+def record(name: str, hit: bool) -> None:
+    """Counts a cache hit or miss for the named endpoint."""
+    stats[f"{name}_{'hits' if hit else 'misses'}"] += 1
+
+
+def cached_response(data: Any, hit: bool) -> Response:
+    return Response(data, headers={"X-Cache": "HIT" if hit else "MISS"})
+
+
+class CachedListMixin:
+    """
+    Caches list responses per normalized query under the catalog version.
+
+    Each entry also records the versions of the movies it contains and is only served while all of them are
+    unchanged, so a rating only invalidates the pages that show the rated movie. Those versions can only be looked
+    up once the page is read, so the entry is only stored if no movie changed since before the read.
+
+    Entries may be built from a replica that lags behind the primary, so clients pinned to the primary to read their
+    own writes skip the cache.
+    """
+
+    cache_name = "movie_list"
+
+    def list(self, request, *args, **kwargs):
+        if pinned_to_primary(request):
+            return super().list(request, *args, **kwargs)
+
+        writes = writes_version()
+        key = f"mldb:movies:{catalog_version()}:{normalized_query(request)}"
+        entry: Optional[Dict[str, Any]] = cache.get(key)
+        if entry is not None and movie_versions(entry["versions"]) == entry["versions"]:
+            record(self.cache_name, hit=True)
+            return cached_response(entry["data"], hit=True)
+
+        record(self.cache_name, hit=False)
+        response = super().list(request, *args, **kwargs)
+        results = response.data["results"] if isinstance(response.data, dict) else response.data
+        entry = {"data": response.data, "versions": movie_versions(movie["id"] for movie in results)}
+        if writes_version() == writes:
+            cache.set(key, entry, settings.MOVIE_CACHE_TIMEOUT)
+        return cached_response(response.data, hit=False)
+
+
+class CachedRetrieveMixin:
+    """
+    Caches detail responses per normalized query, such as ``?tags=full``, under the movie's version.
+
+    Like list entries, detail entries are skipped by clients pinned to the primary.
+    """
+
+    cache_name = "movie_detail"
+
+    def retrieve(self, request, *args, **kwargs):
+        if pinned_to_primary(request):
+            return super().retrieve(request, *args, **kwargs)
+
+        movie_id = self.kwargs[self.lookup_field]
+        key = f"mldb:movie:{movie_id}:{movie_version(movie_id)}:{normalized_query(request)}"
+        data = cache.get(key)
+        if data is not None:
+            record(self.cache_name, hit=True)
+            return cached_response(data, hit=True)
+
+        record(self.cache_name, hit=False)
+        response = super().retrieve(request, *args, **kwargs)
+        cache.set(key, response.data, settings.MOVIE_CACHE_TIMEOUT)
+        return cached_response(response.data, hit=False)
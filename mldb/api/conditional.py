@@ -0,0 +1,122 @@
+import hashlib
+from datetime import datetime
+from typing import Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Max
+from django.http import HttpResponseBase
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from mldb.cache import catalog_version, writes_version
+from mldb.models import Movie
+
+from .cache import normalized_query
+from .serializers import wants_full_tags
+
+
+def movie_etag(movie_id: int, version: int, full_tags: bool = False) -> str:
+    """Returns the strong ETag of a movie at the given version, in its tag summary or ``?tags=full`` form."""
+    return f'"{movie_id}-{version}-full"' if full_tags else f'"{movie_id}-{version}"'
+
+
+def list_etag(request, last_modified: datetime, catalog: int, writes: int) -> str:
+    """
+    Returns the strong ETag of a movie list response.
+
+    Args:
+        request: The list request, whose normalized query is part of the ETag.
+        last_modified: The latest movie modification time.
+        catalog: The catalog version, which changes when movies are added or deleted.
+        writes: The writes version, which changes when any movie changes, even if its commit lands after a later
+            modification time.
+
+    Returns:
+        The quoted ETag.
+    """
+    state = f"{normalized_query(request)}:{last_modified.isoformat()}:{catalog}:{writes}"
+    return f'"{hashlib.md5(state.encode()).hexdigest()}"'
+
+
+def movie_state(movie_id: int, lock: bool = False) -> Optional[Tuple[int, datetime]]:
+    """
+    Looks up a movie's version and modification time without loading the movie.
+
+    Args:
+        movie_id: The movie id.
+        lock: Whether to lock the movie row until the end of the transaction.
+
+    Returns:
+        The (version, updated_at) pair, or None if the movie does not exist.
+    """
+    movies = Movie.objects.select_for_update() if lock else Movie.objects.all()
+    return movies.filter(pk=movie_id).values_list("version", "updated_at").first()
+
+
+def set_validators(response: HttpResponseBase, etag: str, last_modified: datetime) -> HttpResponseBase:
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+class ConditionalRetrieveUpdateMixin:
+    """
+    Adds ETag and Last-Modified headers to movie detail responses.
+
+    ``If-None-Match`` and ``If-Modified-Since`` are answered with 304 from a version lookup, before the movie is
+    loaded or serialized. Updates honor ``If-Match``, checked against the locked row so concurrent updates can't
+    slip in between the check and the write.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        state = movie_state(self.kwargs[self.lookup_field])
+        if state is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag = movie_etag(self.kwargs[self.lookup_field], state[0], wants_full_tags(request))
+        not_modified = get_conditional_response(request._request, etag=etag, last_modified=int(state[1].timestamp()))
+        if not_modified is not None:
+            return set_validators(not_modified, etag, state[1])
+        return set_validators(super().retrieve(request, *args, **kwargs), etag, state[1])
+
+    def update(self, request, *args, **kwargs):
+        movie_id = self.kwargs[self.lookup_field]
+        with transaction.atomic():
+            state = movie_state(movie_id, lock=True)
+            if state is None:
+                return super().update(request, *args, **kwargs)
+
+            precondition_failed = get_conditional_response(
+                request._request, etag=movie_etag(movie_id, state[0]), last_modified=int(state[1].timestamp())
+            )
+            if precondition_failed is not None:
+                return precondition_failed
+
+            response = super().update(request, *args, **kwargs)
+            if response.status_code == 200:
+                version, updated_at = movie_state(movie_id)
+                set_validators(response, movie_etag(movie_id, version), updated_at)
+        return response
+
+
+class ConditionalListMixin:
+    """
+    Adds ETag and Last-Modified headers to movie list responses.
+
+    The ETag is derived from the normalized query, the latest movie modification time, which is an index lookup,
+    and the cache versions bumped by every movie commit, so ``If-None-Match`` is answered with 304 before any list
+    query runs. Deletes and commits that land out of modification-time order don't move the latest modification
+    time, so ``If-Modified-Since`` alone is never answered with 304.
+    """
+
+    def list(self, request, *args, **kwargs):
+        writes, catalog = writes_version(), catalog_version()
+        last_modified = Movie.objects.aggregate(last_modified=Max("updated_at"))["last_modified"]
+        if last_modified is None:
+            return super().list(request, *args, **kwargs)
+
+        etag = list_etag(request, last_modified, catalog, writes)
+        not_modified = get_conditional_response(request._request, etag=etag)
+        if not_modified is not None:
+            return set_validators(not_modified, etag, last_modified)
+        return set_validators(super().list(request, *args, **kwargs), etag, last_modified)
@@ -0,0 +1,44 @@
+from typing import List
+
+from django.db.models import F, QuerySet
+from django_filters import rest_framework as filters
+
+from mldb.genres import genre_mask
+from mldb.models import Movie
+
+
+def genre_names(value: str) -> List[str]:
+    """Splits a comma-separated list of genre names."""
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class MovieFilter(filters.FilterSet):
+    """
+    Movie list filters.
+
+    ``genres_all``, ``genres_any`` and ``genres_none`` take comma-separated genre names and are evaluated with
+    bitwise predicates on ``Movie.genre_mask``, so they never join the genre tables.
+    """
+
+    genres_all = filters.CharFilter(method="filter_genres_all", label="Movies with all of these genres")
+    genres_any = filters.CharFilter(method="filter_genres_any", label="Movies with any of these genres")
+    genres_none = filters.CharFilter(method="filter_genres_none", label="Movies with none of these genres")
+
+    class Meta:
+        model = Movie
+        fields = ["tags__name", "genres__name"]
+
+    def filter_genres_all(self, queryset: QuerySet, name: str, value: str) -> QuerySet:
+        mask = genre_mask(genre_names(value))
+        if mask is None:
+            return queryset.none()
+        return queryset.alias(masked=F("genre_mask").bitand(mask)).filter(masked=mask)
+
+    def filter_genres_any(self, queryset: QuerySet, name: str, value: str) -> QuerySet:
+        # Unknown genres can't match, so they are ignored
+        mask = genre_mask(genre_names(value), known_only=True)
+        return queryset.alias(masked=F("genre_mask").bitand(mask)).filter(masked__gt=0)
+
+    def filter_genres_none(self, queryset: QuerySet, name: str, value: str) -> QuerySet:
+        mask = genre_mask(genre_names(value), known_only=True)
+        return queryset.alias(masked=F("genre_mask").bitand(mask)).filter(masked=0)
@@ -1,7 +1,225 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import b64decode
+from typing import Callable, List, Sequence, Tuple
+from urllib import parse
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import F, Field, Func, Lookup, QuerySet, Value
+from django.db.models.lookups import GreaterThan, LessThan
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_count(queryset: QuerySet) -> int:
+    """
+    Returns the planner's row estimate for a queryset on PostgreSQL, or its exact count elsewhere.
+
+    Args:
+        queryset: The queryset to count.
+
+    Returns:
+        The estimated number of rows.
+    """
+    if connections[queryset.db].vendor != "postgresql":
+        return queryset.count()
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(DjangoPaginator):
+    """Paginator that reads the planner's row estimate instead of running ``COUNT(*)``."""
+
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # The estimate may be too low for the last pages; only then pay for an exact count
+            self.count = self.object_list.count()
+            self.__dict__.pop("num_pages", None)
+            return super().validate_number(number)
 
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
+    count_query_param = "count"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.count_query_param) == "estimated":
+            self.django_paginator_class = EstimatedCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+
+class Row(Func):
+    """A row value, such as ``(title, id)``, so several columns compare in one ordered comparison."""
+
+    template = "(%(expressions)s)"
+    output_field = Field()
+
+
+class MovieCursorPagination(CursorPagination):
+    """
+    Keyset pagination on ``id``, or on ``(title, id)`` with ``ordering=title``; it never counts rows.
+
+    Cursors hold the values of every ordering field of the row they point at, and pages are filtered with a row
+    comparison such as ``(title, id) > (last_title, last_id)``, so no page skips rows with an offset, however many
+    movies share a title.
+    """
+
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("id",)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not {"id", "-id"} & set(ordering):
+            # Break ties on the primary key so the ordering is unique
+            ordering = (*ordering, "-id" if ordering[0].startswith("-") else "id")
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(name[1:] if name.startswith("-") else f"-{name}" for name in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self.after(queryset.model, ordering, self.cursor.position))
+
+        # One extra row tells whether there is a page beyond this one
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        has_more = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def after(self, model, ordering: Sequence[str], position: Sequence[str]) -> Lookup:
+        """
+        Builds the condition selecting the rows that follow ``position`` in ``ordering``.
+
+        Args:
+            model: The paginated model.
+            ordering: The ordering fields, all ascending or all descending.
+            position: The values of the ordering fields at the cursor, as encoded in it.
+
+        Returns:
+            A row comparison of the ordering fields with the cursor values.
+        """
+        names = [name.lstrip("-") for name in ordering]
+        try:
+            values = [Value(model._meta.get_field(name).to_python(value)) for name, value in zip(names, position)]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        comparison = LessThan if ordering[0].startswith("-") else GreaterThan
+        return comparison(Row(*map(F, names)), Row(*values))
+
+    def position(self, row) -> Tuple[str, ...]:
+        """Returns the values of the ordering fields of a model instance or ``values()`` row, for a cursor."""
+        names = [name.lstrip("-") for name in self.ordering]
+        return tuple(str(row[name] if isinstance(row, dict) else getattr(row, name)) for name in names)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        # An empty page, reached backwards over deleted rows, continues from the same position
+        position = self.position(self.page[-1]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self.position(self.page[0]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            tokens = parse.parse_qs(b64decode(encoded.encode("ascii")).decode("ascii"), keep_blank_values=True)
+            reverse = bool(int(tokens.get("r", ["0"])[0]))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        # Cursors of another ordering, or from before cursors held every ordering field, can't be resumed
+        position = tuple(tokens.get("p", ()))
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=reverse, position=position)
+
+
+class SearchResultsPagination(PageNumberPagination):
+    """
+    Page-number pagination over ranked search results that never counts matches.
+
+    One extra result is fetched to tell whether a next page exists.
+    """
+
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_search(self, search: Callable[[int, int], List[int]], request) -> List[int]:
+        """
+        Runs a ranked search for the requested page.
+
+        Args:
+            search: Returns up to ``limit`` result ids after skipping ``offset`` results.
+            request: The request carrying the page parameters.
+
+        Returns:
+            The result ids on the page.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.page_number = max(int(request.query_params.get(self.page_query_param, 1)), 1)
+        except ValueError:
+            raise NotFound(self.invalid_page_message.format(page_number=request.query_params[self.page_query_param]))
+
+        ids = search(self.page_size + 1, (self.page_number - 1) * self.page_size)
+        self.has_next = len(ids) > self.page_size
+        return ids[: self.page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "previous": self.get_previous_link(), "results": data})
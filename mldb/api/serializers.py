@@ -1,47 +1,137 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 from rest_framework import exceptions, serializers
 
-from mldb.models import Genre, Movie, Tag, UserRating
+from mldb.metrics import serialization
+from mldb.models import (
+    Genre,
+    LeaderboardEntry,
+    Movie,
+    MovieNeighbor,
+    Tag,
+    UserRating,
+)
+from mldb.ratings import create_user_rating, upsert_user_rating
+from mldb.tags import TAG_SEPARATOR
 
 User = get_user_model()
 
 
 class UserRatingSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(read_only=True, default=serializers.CurrentUserDefault())
-    movie_id = serializers.IntegerField()
+    movie_id = serializers.IntegerField(required=False)
 
     class Meta:
         model = UserRating
         fields = ["id", "user", "movie_id", "rating"]
 
-    def validate_movie_id(self, value):
-        if Movie.objects.filter(id=value).exists():
-            return value
-        raise serializers.ValidationError("Movie with this ID does not exist.")
-
     def create(self, validated_data):
         user = self.context["request"].user
         movie_id = validated_data.get("movie_id")
         rating = validated_data.get("rating")
 
-        if UserRating.objects.filter(user=user, movie_id=movie_id).exists():
+        try:
+            if self.context.get("upsert"):
+                return upsert_user_rating(user, movie_id, rating)
+            return create_user_rating(user, movie_id, rating)
+        except Movie.DoesNotExist:
+            raise exceptions.NotFound("Movie not found.")
+        except IntegrityError:
             raise exceptions.ValidationError("You have already rated this movie.")
 
-        movie = Movie.objects.get(id=movie_id)
-        user_rating = UserRating.objects.create(user=user, movie=movie, rating=rating)
-        return user_rating
+
+class RatingBatchSerializer(serializers.ListSerializer):
+    """Rejects batches that rate a movie more than once, as only one of the ratings could be saved."""
+
+    def validate(self, attrs):
+        seen, repeated = set(), []
+        for item in attrs:
+            if item["movie_id"] in seen and item["movie_id"] not in repeated:
+                repeated.append(item["movie_id"])
+            seen.add(item["movie_id"])
+        if repeated:
+            raise exceptions.ValidationError(
+                f"Rate each movie at most once per batch; repeated movie ids: {', '.join(map(str, repeated))}."
+            )
+        return attrs
+
+
+class RatingBatchItemSerializer(serializers.ModelSerializer):
+    movie_id = serializers.IntegerField()
+
+    class Meta:
+        model = UserRating
+        fields = ["movie_id", "rating"]
+        list_serializer_class = RatingBatchSerializer
+
+
+class TimedDataMixin:
+    """Counts building a serializer's data towards the request's serialization time."""
+
+    @property
+    def data(self):
+        with serialization():
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
 
 
-class MovieSerializer(serializers.ModelSerializer):
+def wants_full_tags(request) -> bool:
+    """Whether a movie request asks for all tags with ``?tags=full`` rather than the tag summary."""
+    return request is not None and request.GET.get("tags") == "full"
+
+
+class MovieSerializer(TimedDataMixin, serializers.ModelSerializer):
     genres = serializers.SlugRelatedField(many=True, slug_field="name", queryset=Genre.objects.all())
     tags = serializers.SerializerMethodField()
 
     def get_tags(self, obj):
-        return ", ".join([tag.name for tag in obj.tags.all()])
+        if wants_full_tags(self.context.get("request")):
+            return TAG_SEPARATOR.join([tag.name for tag in obj.tags.all()])
+        return obj.tag_summary
 
     class Meta:
         model = Movie
-        fields = ["id", "title", "genres", "tags", "rating"]
+        fields = ["id", "title", "genres", "tags", "tag_count", "rating"]
+        # The rating is derived from user ratings, which maintain it
+        read_only_fields = ["tag_count", "rating"]
+        list_serializer_class = TimedListSerializer
+
+
+class SimilarMovieSerializer(TimedDataMixin, serializers.ModelSerializer):
+    id = serializers.IntegerField(source="neighbor_id")
+    title = serializers.CharField(source="neighbor.title")
+    rating = serializers.DecimalField(source="neighbor.rating", max_digits=5, decimal_places=1)
+
+    class Meta:
+        model = MovieNeighbor
+        fields = ["id", "title", "rating", "similarity"]
+        list_serializer_class = TimedListSerializer
+
+
+class LeaderboardEntrySerializer(TimedDataMixin, serializers.ModelSerializer):
+    id = serializers.IntegerField(source="movie_id")
+    title = serializers.CharField(source="movie.title")
+    rating = serializers.DecimalField(source="movie.rating", max_digits=5, decimal_places=1)
+    rating_count = serializers.IntegerField(source="movie.rating_count")
+
+    class Meta:
+        model = LeaderboardEntry
+        fields = ["id", "title", "rating", "rating_count", "score"]
+        list_serializer_class = TimedListSerializer
+
+
+class TrendingMovieSerializer(TimedDataMixin, serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    rating = serializers.DecimalField(max_digits=5, decimal_places=1)
+    window_rating_count = serializers.IntegerField()
+    window_rating = serializers.FloatField()
+
+    class Meta:
+        list_serializer_class = TimedListSerializer
 
 
 class GenreSerializer(serializers.ModelSerializer):
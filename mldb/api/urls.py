@@ -1,9 +1,27 @@
 from django.urls import path
 
-from .views import MovieDetailUpdateView, MovieListCreateView, MovieRatingView
+from .views import (
+    LeaderboardView,
+    MovieBatchView,
+    MovieDetailUpdateView,
+    MovieExportView,
+    MovieListCreateView,
+    MovieRatingView,
+    MovieSearchView,
+    RatingBatchView,
+    SimilarMoviesView,
+    TrendingMoviesView,
+)
 
 urlpatterns = [
     path("movies/", MovieListCreateView.as_view(), name="movie-list-create"),
+    path("movies/batch/", MovieBatchView.as_view(), name="movie-batch"),
+    path("movies/top/", LeaderboardView.as_view(), name="movie-leaderboard"),
+    path("movies/export/", MovieExportView.as_view(), name="movie-export"),
+    path("movies/trending/", TrendingMoviesView.as_view(), name="movie-trending"),
+    path("movies/search/", MovieSearchView.as_view(), name="movie-search"),
     path("movies/<int:pk>/", MovieDetailUpdateView.as_view(), name="movie-detail-update"),
+    path("movies/<int:pk>/similar/", SimilarMoviesView.as_view(), name="movie-similar"),
     path("movies/<int:movie_id>/rate/", MovieRatingView.as_view(), name="movie-rate"),
+    path("ratings/batch/", RatingBatchView.as_view(), name="rating-batch"),
 ]
@@ -1,41 +1,361 @@
+import re
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import generics, permissions, status, views
+from rest_framework import exceptions, generics, permissions, status, views
 from rest_framework.filters import OrderingFilter
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 
-from mldb.models import Movie
+from mldb.exporting import aiter_in_thread, gzip_stream, iter_export_text
+from mldb.models import Genre, LeaderboardEntry, Movie, MovieNeighbor, Tag
+from mldb.ratings import upsert_user_ratings
+from mldb.routers import read_database
+from mldb.search import search_movie_ids
+from mldb.trending import parse_window, trending_movies
 
-from .pagination import StandardResultsSetPagination
-from .serializers import MovieSerializer, UserRatingSerializer
+from .cache import CachedListMixin, CachedRetrieveMixin
+from .conditional import ConditionalListMixin, ConditionalRetrieveUpdateMixin
+from .fast_reads import (
+    MOVIE_ROW_FIELDS,
+    FastJSONRenderer,
+    FastListMixin,
+    FastRetrieveMixin,
+    movie_representations,
+)
+from .filters import MovieFilter
+from .pagination import (
+    MovieCursorPagination,
+    SearchResultsPagination,
+    StandardResultsSetPagination,
+)
+from .serializers import (
+    LeaderboardEntrySerializer,
+    MovieSerializer,
+    RatingBatchItemSerializer,
+    SimilarMovieSerializer,
+    TrendingMovieSerializer,
+    UserRatingSerializer,
+    wants_full_tags,
+)
 
 
 class MovieRatingView(views.APIView):
+    """Rates a movie: POST adds a first rating, PUT and PATCH create or replace the user's rating."""
+
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, movie_id):
-        serializer = UserRatingSerializer(data=request.data, context={"request": request})
-        if serializer.is_valid():
-            # Check if the movie exists
-            if not Movie.objects.filter(id=movie_id).exists():
-                return Response({"detail": "Movie not found."}, status=status.HTTP_404_NOT_FOUND)
+        return self.save_rating(request, movie_id, upsert=False)
+
+    def put(self, request, movie_id):
+        return self.save_rating(request, movie_id, upsert=True)
+
+    def patch(self, request, movie_id):
+        return self.save_rating(request, movie_id, upsert=True)
 
-            serializer.validated_data["movie_id"] = movie_id
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+    def save_rating(self, request, movie_id, upsert):
+        serializer = UserRatingSerializer(data=request.data, context={"request": request, "upsert": upsert})
+        if serializer.is_valid():
+            serializer.save(movie_id=movie_id)
+            return Response(serializer.data, status=status.HTTP_200_OK if upsert else status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class MovieListCreateView(generics.ListCreateAPIView):
-    queryset = Movie.objects.all()
+class RatingBatchView(views.APIView):
+    """Creates or replaces a batch of the user's ratings, given as a list of movie_id/rating pairs."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = RatingBatchItemSerializer(
+            data=request.data, many=True, allow_empty=False, max_length=settings.RATING_BATCH_MAX_SIZE
+        )
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        ratings = {item["movie_id"]: item["rating"] for item in serializer.validated_data}
+        saved = upsert_user_ratings(request.user, ratings)
+        results = [
+            {**item, "status": "saved" if item["movie_id"] in saved else "not_found"}
+            for item in serializer.validated_data
+        ]
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+def movie_read_queryset():
+    """Movies with their genre names prefetched in name order, so serialization runs a fixed number of queries."""
+    return Movie.objects.prefetch_related(Prefetch("genres", queryset=Genre.objects.only("name").order_by("name")))
+
+
+class FullTagsMixin:
+    """Prefetches tag names when ``?tags=full`` asks for all tags instead of the stored tag summary."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if wants_full_tags(self.request):
+            queryset = queryset.prefetch_related(Prefetch("tags", queryset=Tag.objects.only("name").order_by("name")))
+        return queryset
+
+
+class MovieIdsMixin(FullTagsMixin):
+    """Represents movies given by id with a fixed number of queries."""
+
+    def represent_ids(self, ids):
+        """
+        Looks up and represents movies with one ``id__in`` query plus one query per prefetched relation.
+
+        Args:
+            ids: The movie ids.
+
+        Returns:
+            The movie representations in the order of ``ids``, skipping ids without a movie.
+        """
+        if settings.MOVIE_FAST_READS:
+            rows = {row["id"]: row for row in Movie.objects.filter(id__in=ids).values(*MOVIE_ROW_FIELDS)}
+            return movie_representations(
+                [rows[movie_id] for movie_id in ids if movie_id in rows], wants_full_tags(self.request)
+            )
+
+        movies = self.get_queryset().in_bulk(ids)
+        return self.get_serializer([movies[movie_id] for movie_id in ids if movie_id in movies], many=True).data
+
+
+class MovieListCreateView(
+    ConditionalListMixin, CachedListMixin, FastListMixin, FullTagsMixin, generics.ListCreateAPIView
+):
+    queryset = movie_read_queryset()
     serializer_class = MovieSerializer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = StandardResultsSetPagination
+    cursor_pagination_class = MovieCursorPagination
     filter_backends = [DjangoFilterBackend, OrderingFilter]
-    filterset_fields = ["tags__name", "genres__name"]
+    filterset_class = MovieFilter
     ordering_fields = ["title"]
 
+    @property
+    def paginator(self):
+        """Cursor or page-number paginator, chosen by the ``pagination`` query parameter or the project default."""
+        if not hasattr(self, "_paginator"):
+            request = getattr(self, "request", None)
+            pagination = settings.MOVIE_LIST_PAGINATION
+            if request is not None:
+                pagination = request.query_params.get("pagination", pagination)
+            self._paginator = self.cursor_pagination_class() if pagination == "cursor" else self.pagination_class()
+        return self._paginator
+
+
+class MovieDetailUpdateView(
+    ConditionalRetrieveUpdateMixin,
+    CachedRetrieveMixin,
+    FastRetrieveMixin,
+    FullTagsMixin,
+    generics.RetrieveUpdateAPIView,
+):
+    queryset = movie_read_queryset()
+    serializer_class = MovieSerializer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    permission_classes = [permissions.IsAuthenticated]
+
+
+class MovieSearchView(MovieIdsMixin, generics.GenericAPIView):
+    """
+    Searches movie titles, best match first.
+
+    Takes the search text in ``q`` and an optional genre name in ``genre``. Every word is matched as a prefix,
+    and on PostgreSQL near-miss spellings match too.
+    """
+
+    queryset = movie_read_queryset()
+    serializer_class = MovieSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SearchResultsPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response({"q": ["This query parameter is required."]}, status=status.HTTP_400_BAD_REQUEST)
+        genre = request.query_params.get("genre") or None
 
-class MovieDetailUpdateView(generics.RetrieveUpdateAPIView):
-    queryset = Movie.objects.all()
+        ids = self.paginator.paginate_search(
+            lambda limit, offset: search_movie_ids(query, genre=genre, limit=limit, offset=offset), request
+        )
+        return self.paginator.get_paginated_response(self.represent_ids(ids))
+
+
+class MovieBatchView(MovieIdsMixin, generics.GenericAPIView):
+    """
+    Looks up movies by the comma-separated ids in ``ids``, at most ``MOVIE_BATCH_MAX_SIZE`` of them.
+
+    Movies are returned once each, in request order, and ids without a movie are listed in ``missing``.
+    """
+
+    queryset = movie_read_queryset()
     serializer_class = MovieSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def get(self, request):
+        low, high = connection.ops.integer_field_range(Movie._meta.pk.get_internal_type())
+        try:
+            values = request.query_params.get("ids", "").split(",")
+            ids = list(dict.fromkeys(int(value) for value in values if value.strip()))
+            # Ids the primary key column can't hold would overflow in the query
+            if not all(low <= movie_id <= high for movie_id in ids):
+                raise ValueError
+        except ValueError:
+            return Response({"ids": ["Use a comma-separated list of integer ids."]}, status=status.HTTP_400_BAD_REQUEST)
+        if not ids:
+            return Response({"ids": ["This query parameter is required."]}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > settings.MOVIE_BATCH_MAX_SIZE:
+            return Response(
+                {"ids": [f"Ensure this field has no more than {settings.MOVIE_BATCH_MAX_SIZE} elements."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = self.represent_ids(ids)
+        found = {movie["id"] for movie in results}
+        return Response({"results": results, "missing": [movie_id for movie_id in ids if movie_id not in found]})
+
+
+class SimilarMoviesView(generics.ListAPIView):
+    """Lists a movie's precomputed most similar movies, most similar first."""
+
+    serializer_class = SimilarMovieSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        return (
+            MovieNeighbor.objects.filter(movie_id=self.kwargs["pk"])
+            .select_related("neighbor")
+            .only("neighbor_id", "similarity", "neighbor__title", "neighbor__rating")
+            .order_by("rank")
+        )
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if not response.data and not Movie.objects.filter(pk=self.kwargs["pk"]).exists():
+            raise exceptions.NotFound("Movie not found.")
+        return response
+
+
+class LeaderboardView(generics.ListAPIView):
+    """
+    Lists the best movies by damped mean rating, overall or in the genre named by ``genre``.
+
+    ``limit`` sets the number of movies, 10 by default and at most ``max_limit``.
+    """
+
+    serializer_class = LeaderboardEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+    default_limit = 10
+    max_limit = 100
+
+    def get_queryset(self):
+        genre_name = self.request.query_params.get("genre")
+        entries = LeaderboardEntry.objects.filter(genre__isnull=True)
+        if genre_name:
+            genre_id = Genre.objects.filter(name=genre_name).values_list("id", flat=True).first()
+            if genre_id is None:
+                raise exceptions.NotFound("Genre not found.")
+            entries = LeaderboardEntry.objects.filter(genre_id=genre_id)
+
+        try:
+            limit = min(max(int(self.request.query_params.get("limit", self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            raise exceptions.ValidationError({"limit": ["A valid integer is required."]})
+
+        return (
+            entries.select_related("movie")
+            .only("movie_id", "score", "movie__title", "movie__rating", "movie__rating_count")
+            .order_by("-score", "movie_id")[:limit]
+        )
+
+
+class TrendingMoviesView(views.APIView):
+    """
+    Lists the movies rated most often in the ``window`` (such as ``7d`` or ``4w``, 7 days by default) that ends
+    on the latest day with ratings.
+
+    ``limit`` sets the number of movies, 10 by default and at most ``max_limit``.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    default_window = "7d"
+    default_limit = 10
+    max_limit = 100
+
+    def get(self, request):
+        days = parse_window(request.query_params.get("window", self.default_window))
+        if days is None:
+            return Response(
+                {"window": ["Use a number of days or weeks such as 7d or 4w, up to a year."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limit = min(max(int(request.query_params.get("limit", self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            return Response({"limit": ["A valid integer is required."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        window_end, ranking = trending_movies(days, limit)
+        movies = Movie.objects.only("title", "rating").in_bulk([row["movie_id"] for row in ranking])
+        results = [
+            {
+                "id": row["movie_id"],
+                "title": movies[row["movie_id"]].title,
+                "rating": movies[row["movie_id"]].rating,
+                "window_rating_count": row["rating_count"],
+                "window_rating": round(row["rating_sum"] / row["rating_count"] / 2, 2),
+            }
+            for row in ranking
+            if row["movie_id"] in movies
+        ]
+        return Response({"window_end": window_end, "results": TrendingMovieSerializer(results, many=True).data})
+
+
+class MovieExportView(views.APIView):
+    """
+    Streams the whole catalog as CSV or newline-delimited JSON, chosen by ``output`` (``csv`` by default).
+
+    Movies are read in keyset chunks while the response is written, so the first bytes go out before the first
+    query and server memory stays flat. Under ASGI the chunks are read in the sync thread one at a time. The stream
+    is gzip-encoded for clients that accept it.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    outputs = {
+        "csv": ("csv", "text/csv; charset=utf-8", "movies.csv"),
+        "ndjson": ("jsonl", "application/x-ndjson; charset=utf-8", "movies.ndjson"),
+    }
+    accepts_gzip = re.compile(r"\bgzip\b")
+
+    def get(self, request):
+        output = request.query_params.get("output", "csv")
+        if output not in self.outputs:
+            return Response(
+                {"output": [f"Choose one of: {', '.join(self.outputs)}."]}, status=status.HTTP_400_BAD_REQUEST
+            )
+        export_format, content_type, filename = self.outputs[output]
+
+        # The stream is read after the request's replica routing has ended, so it is pinned to the request's database
+        content = (text.encode() for text in iter_export_text(export_format, using=read_database()))
+        compress = bool(self.accepts_gzip.search(request.META.get("HTTP_ACCEPT_ENCODING", "")))
+        stream = gzip_stream(content) if compress else content
+        if isinstance(request._request, ASGIRequest):
+            stream = aiter_in_thread(stream)
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        if compress:
+            response["Content-Encoding"] = "gzip"
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
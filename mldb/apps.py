@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class MldbConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "mldb"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from mldb import signals  # noqa: F401
+        from mldb.metrics import install_query_recorder
+
+        connection_created.connect(install_query_recorder)
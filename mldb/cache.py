@@ -0,0 +1,129 @@
+"""
+Version counters for cached movie data.
+
+Cached entries embed the version numbers they were built from, so invalidating is a matter of bumping a
+counter: a per-movie version when a movie's data changes, and a catalog version when movies are added or
+their list membership may have changed. A writes version is bumped along with any movie version, so entries
+that can only look up their movies' versions after reading them can tell whether a movie changed in between.
+New counters start from the current time in microseconds, so a counter that was evicted never restarts below a
+value an old entry may still carry.
+"""
+
+import time
+from collections import Counter
+from typing import Dict, Iterable
+
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = "mldb:catalog-version"
+WRITES_VERSION_KEY = "mldb:writes-version"
+
+stats: Counter = Counter()
+
+
+def movie_version_key(movie_id: int) -> str:
+    """Returns the cache key holding the version of one movie."""
+    return f"mldb:movie-version:{movie_id}"
+
+
+def _initial_version() -> int:
+    return time.time_ns() // 1000
+
+
+def _get_version(key: str) -> int:
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def _aget_version(key: str) -> int:
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, _initial_version(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def _bump_version(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), timeout=None)
+
+
+def catalog_version() -> int:
+    """Returns the current catalog version."""
+    return _get_version(CATALOG_VERSION_KEY)
+
+
+def writes_version() -> int:
+    """Returns the current writes version, which changes whenever any movie version does."""
+    return _get_version(WRITES_VERSION_KEY)
+
+
+def movie_version(movie_id: int) -> int:
+    """Returns the current version of one movie."""
+    return _get_version(movie_version_key(movie_id))
+
+
+def movie_versions(movie_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Returns the current versions of several movies with a single cache round-trip when all of them are known.
+
+    Args:
+        movie_ids: The movie ids.
+
+    Returns:
+        Mapping of movie ids to versions.
+    """
+    keys = {movie_version_key(movie_id): movie_id for movie_id in movie_ids}
+    versions = {keys[key]: version for key, version in cache.get_many(keys).items()}
+    for key, movie_id in keys.items():
+        if movie_id not in versions:
+            versions[movie_id] = _get_version(key)
+    return versions
+
+
+async def acatalog_version() -> int:
+    """Async version of ``catalog_version``."""
+    return await _aget_version(CATALOG_VERSION_KEY)
+
+
+async def awrites_version() -> int:
+    """Async version of ``writes_version``."""
+    return await _aget_version(WRITES_VERSION_KEY)
+
+
+async def amovie_version(movie_id: int) -> int:
+    """Async version of ``movie_version``."""
+    return await _aget_version(movie_version_key(movie_id))
+
+
+async def amovie_versions(movie_ids: Iterable[int]) -> Dict[int, int]:
+    """Async version of ``movie_versions``."""
+    keys = {movie_version_key(movie_id): movie_id for movie_id in movie_ids}
+    versions = {keys[key]: version for key, version in (await cache.aget_many(keys)).items()}
+    for key, movie_id in keys.items():
+        if movie_id not in versions:
+            versions[movie_id] = await _aget_version(key)
+    return versions
+
+
+def bump_catalog_version() -> None:
+    """Invalidates every cached movie list once the current transaction commits."""
+    transaction.on_commit(lambda: _bump_version(CATALOG_VERSION_KEY))
+
+
+def bump_movie_versions(*movie_ids: int) -> None:
+    """Invalidates every cached entry containing the given movies once the current transaction commits."""
+
+    def bump() -> None:
+        # Bumped first, so a reader that sees any of the new movie versions also sees the new writes version
+        _bump_version(WRITES_VERSION_KEY)
+        for movie_id in movie_ids:
+            _bump_version(movie_version_key(movie_id))
+
+    transaction.on_commit(bump)
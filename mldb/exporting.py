@@ -0,0 +1,338 @@
+"""
+Streaming catalog export.
+
+Movies are read in id-ordered keyset chunks with their genres and tags prefetched per chunk, so memory use depends
+on the chunk size rather than on the size of the catalog. The same records feed the ``export_movies`` command and
+the streaming HTTP export endpoint.
+"""
+
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import (
+    IO,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from asgiref.sync import sync_to_async
+from django.db import connections, router
+from django.db.models import Prefetch
+
+from mldb.models import Genre, Movie, Tag
+
+FORMATS = ["csv", "jsonl", "parquet"]
+DEFAULT_CHUNK_SIZE = 1000
+
+CSV_HEADERS = ["Movie ID", "Title", "Rating", "Genres", "Tags"]
+
+MovieRecord = Dict[str, Any]
+
+
+def iter_movie_chunks(
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    start_id: Optional[int] = None,
+    end_id: Optional[int] = None,
+    using: Optional[str] = None,
+) -> Iterator[List[MovieRecord]]:
+    """
+    Walks the catalog in id order, one keyset chunk at a time.
+
+    Args:
+        chunk_size: The number of movies read per query.
+        start_id: Only export movies with an id of at least this value.
+        end_id: Only export movies with an id below this value.
+        using: The database alias to read from; the database router picks one by default.
+
+    Yields:
+        Lists of movie records with ``id``, ``title``, ``rating``, ``genres`` and ``tags`` keys.
+    """
+    movies = Movie.objects.using(using).only("id", "title", "rating").order_by("id")
+    if start_id is not None:
+        movies = movies.filter(id__gte=start_id)
+    if end_id is not None:
+        movies = movies.filter(id__lt=end_id)
+
+    last_id = None
+    while True:
+        chunk = movies if last_id is None else movies.filter(id__gt=last_id)
+        chunk = list(
+            chunk.prefetch_related(
+                Prefetch("genres", queryset=Genre.objects.using(using).only("name")),
+                Prefetch("tags", queryset=Tag.objects.using(using).only("name")),
+            )[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield [
+            {
+                "id": movie.id,
+                "title": movie.title,
+                "rating": movie.rating,
+                "genres": [genre.name for genre in movie.genres.all()],
+                "tags": [tag.name for tag in movie.tags.all()],
+            }
+            for movie in chunk
+        ]
+        last_id = chunk[-1].id
+
+
+def csv_row(record: MovieRecord) -> List[Any]:
+    """Flattens a movie record into a CSV row matching ``CSV_HEADERS``."""
+    return [record["id"], record["title"], record["rating"], ", ".join(record["genres"]), ", ".join(record["tags"])]
+
+
+def json_line(record: MovieRecord) -> str:
+    """Serializes a movie record as one line of JSON."""
+    return json.dumps(record, ensure_ascii=False, default=lambda value: float(value)) + "\n"
+
+
+def csv_text(rows: List[List[Any]]) -> str:
+    """Renders rows as CSV text."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def format_records(records: List[MovieRecord], export_format: str) -> str:
+    """Renders movie records as CSV rows or JSON lines."""
+    if export_format == "csv":
+        return csv_text([csv_row(record) for record in records])
+    return "".join(json_line(record) for record in records)
+
+
+def iter_export_text(
+    export_format: str, chunk_size: int = DEFAULT_CHUNK_SIZE, using: Optional[str] = None
+) -> Iterator[str]:
+    """
+    Renders the whole catalog as CSV or JSON Lines text, one chunk at a time.
+
+    The CSV header is yielded before the first query runs.
+
+    Args:
+        export_format: ``csv`` or ``jsonl``.
+        chunk_size: The number of movies read per query.
+        using: The database alias to read from; the database router picks one by default.
+
+    Yields:
+        Pieces of the export.
+    """
+    if export_format == "csv":
+        yield csv_text([CSV_HEADERS])
+    for records in iter_movie_chunks(chunk_size, using=using):
+        yield format_records(records, export_format)
+
+
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Compresses a stream of bytes into a gzip stream, flushing after every chunk so clients receive data promptly.
+
+    Args:
+        chunks: The uncompressed chunks.
+
+    Yields:
+        The compressed chunks.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+T = TypeVar("T")
+
+
+async def aiter_in_thread(items: Iterable[T]) -> AsyncIterator[T]:
+    """
+    Iterates a blocking iterable from async code, advancing it in the sync thread one item at a time.
+
+    Django consumes sync iterators of streaming responses under ASGI in a single thread call, which would buffer a
+    whole export in memory before its first byte is sent.
+
+    Args:
+        items: The iterable, such as an export stream whose items each run a query.
+
+    Yields:
+        The items, each as soon as it is produced.
+    """
+    iterator = iter(items)
+    done = object()
+    while True:
+        item = await sync_to_async(next)(iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+class TextExportWriter:
+    """Writes records as CSV or JSON Lines to a text file, gzip-compressed if requested."""
+
+    def __init__(self, path: str, export_format: str, compress: bool) -> None:
+        self.export_format = export_format
+        self.file: IO[str] = (
+            gzip.open(path, "wt", encoding="utf-8", newline="")
+            if compress
+            else open(path, "w", encoding="utf-8", newline="")
+        )
+        if export_format == "csv":
+            self.file.write(csv_text([CSV_HEADERS]))
+
+    def write(self, records: List[MovieRecord]) -> None:
+        self.file.write(format_records(records, self.export_format))
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class ParquetExportWriter:
+    """Writes records to a Parquet file, one row group per chunk; requires the optional pyarrow package."""
+
+    def __init__(self, path: str, compress: bool) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet exports require the pyarrow package: pip install pyarrow")
+
+        self.pa = pa
+        self.schema = pa.schema(
+            [
+                ("id", pa.int64()),
+                ("title", pa.string()),
+                ("rating", pa.decimal128(5, 1)),
+                ("genres", pa.list_(pa.string())),
+                ("tags", pa.list_(pa.string())),
+            ]
+        )
+        self.writer = pq.ParquetWriter(path, self.schema, compression="gzip" if compress else "snappy")
+
+    def write(self, records: List[MovieRecord]) -> None:
+        self.writer.write_table(self.pa.Table.from_pylist(records, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def export_movies(
+    path: str,
+    export_format: str = "csv",
+    compress: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    start_id: Optional[int] = None,
+    end_id: Optional[int] = None,
+    progress: Optional[Callable[[int], None]] = None,
+    using: Optional[str] = None,
+) -> int:
+    """
+    Exports the movies in an id range to a file.
+
+    Args:
+        path: The output file.
+        export_format: ``csv``, ``jsonl`` or ``parquet``.
+        compress: Whether to gzip the output.
+        chunk_size: The number of movies read per query.
+        start_id: The first id of the range, if any.
+        end_id: The id after the range, if any.
+        progress: Called with the running number of exported movies after each chunk.
+        using: The database alias to read from; the database router picks one by default.
+
+    Returns:
+        The number of exported movies.
+    """
+    writer = (
+        ParquetExportWriter(path, compress)
+        if export_format == "parquet"
+        else TextExportWriter(path, export_format, compress)
+    )
+    exported = 0
+    try:
+        for records in iter_movie_chunks(chunk_size, start_id, end_id, using):
+            writer.write(records)
+            exported += len(records)
+            if progress is not None:
+                progress(exported)
+    finally:
+        writer.close()
+    return exported
+
+
+def shard_bounds(shards: int, using: Optional[str] = None) -> List[Tuple[Optional[int], Optional[int]]]:
+    """
+    Splits the catalog into id ranges holding about the same number of movies, with a single query.
+
+    Args:
+        shards: The number of ranges.
+        using: The database alias to read from; the database router picks one by default.
+
+    Returns:
+        (start id, end id) pairs; the first start and the last end are None, meaning unbounded.
+    """
+    using = using or router.db_for_read(Movie)
+    connection = connections[using]
+    table = connection.ops.quote_name(Movie._meta.db_table)
+    # One windowed scan of the id index; NTILE never makes more buckets than rows, so no range is empty
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT MIN(id) FROM (SELECT id, NTILE(%s) OVER (ORDER BY id) AS part FROM {table}) AS parts "
+            f"GROUP BY part ORDER BY part",
+            [shards],
+        )
+        boundaries = [start for (start,) in cursor.fetchall()[1:]]
+    starts = [None, *boundaries]
+    ends = [*boundaries, None]
+    return list(zip(starts, ends))
+
+
+def shard_path(path: str, shard: int) -> str:
+    """Inserts a part number before the file extensions, e.g. ``movies.part-001.csv.gz``."""
+    directory, name = os.path.split(path)
+    stem, dot, extensions = name.partition(".")
+    return os.path.join(directory, f"{stem}.part-{shard:03d}{dot}{extensions}")
+
+
+def export_sharded(
+    path: str,
+    shards: int,
+    export_format: str = "csv",
+    compress: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    using: Optional[str] = None,
+) -> Iterator[Tuple[str, int]]:
+    """
+    Exports the catalog to one part file per id range, written by parallel worker processes.
+
+    Args:
+        path: The output file name that part numbers are added to.
+        shards: The number of part files and processes.
+        export_format: ``csv``, ``jsonl`` or ``parquet``.
+        compress: Whether to gzip the output.
+        chunk_size: The number of movies read per query.
+        using: The database alias to read from; the database router picks one by default.
+
+    Yields:
+        The path and number of movies of each part as it completes.
+    """
+    bounds = shard_bounds(shards, using)
+    paths = [shard_path(path, shard) for shard in range(len(bounds))]
+    # Forked workers must open their own database connections
+    connections.close_all()
+    with ProcessPoolExecutor(len(bounds), mp_context=multiprocessing.get_context("fork")) as pool:
+        futures = {
+            pool.submit(export_movies, part, export_format, compress, chunk_size, start_id, end_id, None, using): part
+            for part, (start_id, end_id) in zip(paths, bounds)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
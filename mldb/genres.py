@@ -0,0 +1,45 @@
+"""Helpers for ``Movie.genre_mask``, the bitmask of a movie's genres."""
+
+from collections import defaultdict
+from typing import Dict, Iterable, Optional
+
+from mldb.models import Genre, Movie
+
+
+def genre_mask(names: Iterable[str], known_only: bool = False) -> Optional[int]:
+    """
+    Returns the mask of the named genres.
+
+    Args:
+        names: Genre names.
+        known_only: Whether to skip unknown names instead of returning None.
+
+    Returns:
+        The OR of the genres' bits, or None if any name is not a known genre and ``known_only`` is not set.
+    """
+    names = set(names)
+    bits = dict(Genre.objects.filter(name__in=names).values_list("name", "bit"))
+    if len(bits) < len(names) and not known_only:
+        return None
+    mask = 0
+    for bit in bits.values():
+        mask |= 1 << bit
+    return mask
+
+
+def sync_genre_masks(*movie_ids: int) -> None:
+    """
+    Recomputes the genre masks of the given movies from their genre links.
+
+    Args:
+        *movie_ids: The movies whose genres changed.
+    """
+    masks: Dict[int, int] = defaultdict(int)
+    links = Movie.genres.through.objects.filter(movie_id__in=movie_ids).values_list("movie_id", "genre__bit")
+    for movie_id, bit in links:
+        masks[movie_id] |= 1 << bit
+
+    current = Movie.objects.filter(pk__in=movie_ids).values_list("id", "genre_mask")
+    for movie_id, mask in current:
+        if masks[movie_id] != mask:
+            Movie.objects.filter(pk=movie_id).update(genre_mask=masks[movie_id])
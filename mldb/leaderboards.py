@@ -0,0 +1,125 @@
+"""
+Precomputed movie leaderboards, overall and per genre.
+
+Movies are ranked by a Bayesian (damped) mean: their ratings plus ``LEADERBOARD_PRIOR_WEIGHT`` phantom ratings at
+the leaderboard's mean rating, so a movie with a handful of votes stays close to the mean instead of topping the
+board. Full recomputes refresh the prior means; rating writes rescore the rated movies' entries in place.
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast
+
+from mldb.models import LeaderboardEntry, Movie
+
+BATCH_SIZE = 5000
+
+
+def bayesian_score(rating_sum: int, rating_count: int, prior_mean: float) -> float:
+    """
+    Computes a movie's damped mean rating.
+
+    Args:
+        rating_sum: The sum of the movie's ratings, in half stars.
+        rating_count: The number of ratings.
+        prior_mean: The leaderboard's mean rating, in stars.
+
+    Returns:
+        The score, in stars.
+    """
+    weight = settings.LEADERBOARD_PRIOR_WEIGHT
+    return (prior_mean * weight + rating_sum / 2) / (weight + rating_count)
+
+
+def mean_rating(rating_sum: Optional[int], rating_count: Optional[int]) -> float:
+    # Without any ratings every movie scores the prior, so its value doesn't matter
+    return rating_sum / 2 / rating_count if rating_count else 0.0
+
+
+def prior_means() -> Tuple[float, Dict[int, float]]:
+    """
+    Computes the mean rating over all movies and over the movies of each genre.
+
+    Returns:
+        The overall mean and a mapping of genre ids to their means, in stars.
+    """
+    totals = Movie.objects.aggregate(rating_sum=Sum("rating_sum"), rating_count=Sum("rating_count"))
+    genre_totals = (
+        Movie.genres.through.objects.values("genre_id")
+        .annotate(rating_sum=Sum("movie__rating_sum"), rating_count=Sum("movie__rating_count"))
+        .values_list("genre_id", "rating_sum", "rating_count")
+    )
+    return (
+        mean_rating(totals["rating_sum"], totals["rating_count"]),
+        {genre_id: mean_rating(rating_sum, rating_count) for genre_id, rating_sum, rating_count in genre_totals},
+    )
+
+
+def compute_leaderboards(movie_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recomputes the leaderboard entries of all movies or of the given movies.
+
+    The prior means are always recomputed over the whole catalog; entries of movies outside ``movie_ids`` keep
+    the scores computed with their previous priors until the next full recompute.
+
+    Args:
+        movie_ids: The movies to recompute, or None for all movies.
+
+    Returns:
+        The number of written entries.
+    """
+    movies = Movie.objects.all() if movie_ids is None else Movie.objects.filter(id__in=list(movie_ids))
+    overall_mean, genre_means = prior_means()
+
+    aggregates = {
+        movie_id: (rating_sum, rating_count)
+        for movie_id, rating_sum, rating_count in movies.order_by().values_list("id", "rating_sum", "rating_count")
+    }
+    entries = [
+        LeaderboardEntry(
+            movie_id=movie_id,
+            genre=None,
+            score=bayesian_score(rating_sum, rating_count, overall_mean),
+            prior_mean=overall_mean,
+        )
+        for movie_id, (rating_sum, rating_count) in aggregates.items()
+    ]
+    links = Movie.genres.through.objects.filter(movie__in=movies.order_by()).values_list("movie_id", "genre_id")
+    entries += [
+        LeaderboardEntry(
+            movie_id=movie_id,
+            genre_id=genre_id,
+            score=bayesian_score(*aggregates[movie_id], genre_means[genre_id]),
+            prior_mean=genre_means[genre_id],
+        )
+        for movie_id, genre_id in links
+    ]
+
+    with transaction.atomic():
+        stale = (
+            LeaderboardEntry.objects.all() if movie_ids is None else LeaderboardEntry.objects.filter(movie__in=movies)
+        )
+        stale.delete()
+        LeaderboardEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+    return len(entries)
+
+
+def rescore_movies(*movie_ids: int) -> None:
+    """
+    Rescores the leaderboard entries of movies whose rating aggregates changed, in one UPDATE.
+
+    Should run in the same transaction as the aggregate update, after it.
+
+    Args:
+        *movie_ids: The rated movies.
+    """
+    movie = Movie.objects.filter(id=OuterRef("movie_id"))
+    rating_sum = Cast(Subquery(movie.values("rating_sum")[:1]), FloatField())
+    rating_count = Cast(Subquery(movie.values("rating_count")[:1]), FloatField())
+    weight = float(settings.LEADERBOARD_PRIOR_WEIGHT)
+    LeaderboardEntry.objects.filter(movie_id__in=movie_ids).update(
+        score=(F("prior_mean") * weight + rating_sum / 2.0) / (rating_count + weight)
+    )
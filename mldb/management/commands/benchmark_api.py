@@ -0,0 +1,275 @@
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from typing import Any, Dict, List, Tuple
+
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY,
+    HASH_SESSION_KEY,
+    SESSION_KEY,
+    get_user_model,
+)
+from django.contrib.sessions.backends import signed_cookies
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from mldb.models import Movie
+
+DEFAULT_PAGE_SIZES = [10, 100]
+DEFAULT_REQUESTS = 200
+DEFAULT_CONCURRENCY = 50
+WARMUP_REQUESTS = 5
+
+PATHS = {"serializer": False, "fast": True}
+COMPARISONS = ["paths", "servers"]
+
+Target = Tuple[str, str, Dict[str, Any]]
+
+
+def benchmark_settings(fast: bool = True) -> override_settings:
+    """
+    Disables caching so every request does the full work, lets the test clients' host through, and keeps sessions
+    in signed cookies so logging in writes nothing to the database.
+    """
+    return override_settings(
+        MOVIE_FAST_READS=fast,
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}},
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+        SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies",
+    )
+
+
+def session_cookies(user) -> SimpleCookie:
+    """
+    Builds the cookies of a signed cookie session logged in as ``user``.
+
+    Unlike ``Client.force_login``, it neither stores a session nor updates the user's last login time.
+    """
+    session = signed_cookies.SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    cookies = SimpleCookie()
+    cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+    return cookies
+
+
+def p99(latencies: List[float]) -> float:
+    """Returns the 99th percentile of latencies, in milliseconds."""
+    return sorted(latencies)[math.ceil(len(latencies) * 0.99) - 1] * 1000
+
+
+class Command(BaseCommand):
+    """Benchmarks the movie read endpoints: serializer against fast read path, or WSGI against ASGI."""
+
+    help = "Benchmarks the movie list and detail endpoints, comparing read paths or WSGI and ASGI serving"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds arguments to the command.
+
+        Args:
+            parser: The command line argument parser instance.
+        """
+        parser.add_argument(
+            "--compare",
+            choices=COMPARISONS,
+            default="paths",
+            help="Compare the serializer and fast read paths, or the WSGI and ASGI handlers under concurrency",
+        )
+        parser.add_argument(
+            "--page-sizes", type=int, nargs="+", default=DEFAULT_PAGE_SIZES, help="Movie list page sizes to measure"
+        )
+        parser.add_argument(
+            "--requests", type=int, default=DEFAULT_REQUESTS, help="Number of timed requests per measurement"
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=DEFAULT_CONCURRENCY,
+            help="Number of requests in flight when comparing servers",
+        )
+        parser.add_argument(
+            "--username",
+            help="Existing user the requests log in as when comparing servers; it is not modified",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """
+        The main entry point for the command execution.
+
+        Requests run in this process through the full middleware and view stack with caching disabled, so the
+        numbers are those of one worker process. Compared responses must be identical.
+
+        Args:
+            *args: Variable length argument list.
+            **options: Arbitrary keyword arguments.
+        """
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1.")
+        movie_id = Movie.objects.order_by("id").values_list("id", flat=True).first()
+        if movie_id is None:
+            raise CommandError("There are no movies; run load_movielens_data first.")
+
+        targets: List[Target] = [
+            (f"list page_size={page_size}", reverse("movie-list-create"), {"page_size": page_size})
+            for page_size in options["page_sizes"]
+        ]
+        targets.append(("detail", reverse("movie-detail-update", kwargs={"pk": movie_id}), {}))
+
+        if options["compare"] == "servers":
+            if not options["username"]:
+                raise CommandError("--compare servers needs the --username of an existing user to log in as.")
+            try:
+                user = get_user_model().objects.get_by_natural_key(options["username"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"There is no user named {options['username']!r}.")
+            self.compare_servers(targets, user, options["requests"], options["concurrency"])
+        else:
+            self.compare_paths(targets, options["requests"])
+
+    def compare_paths(self, targets: List[Target], requests: int) -> None:
+        """Reports sequential requests per second of the serializer and fast read paths."""
+        client = APIClient()
+        # An unsaved user authenticates the requests without writing to the database
+        client.force_authenticate(user=get_user_model()(username="benchmark"))
+
+        self.stdout.write(f"{'Endpoint':<24}{'serializer req/s':>18}{'fast req/s':>14}{'speedup':>10}")
+        for name, url, params in targets:
+            rates: Dict[str, float] = {}
+            bodies: List[bytes] = []
+            for path, fast in PATHS.items():
+                rate, body = self.measure(client, url, params, fast, requests)
+                rates[path] = rate
+                bodies.append(body)
+            if bodies[0] != bodies[1]:
+                raise CommandError(f"The read paths returned different responses for {name}.")
+            self.stdout.write(
+                f"{name:<24}{rates['serializer']:>18.1f}{rates['fast']:>14.1f}"
+                f"{rates['fast'] / rates['serializer']:>9.2f}x"
+            )
+
+    def compare_servers(self, targets: List[Target], user, requests: int, concurrency: int) -> None:
+        """
+        Reports throughput and p99 latency of the WSGI handler, driven by ``concurrency`` threads like a threaded
+        WSGI worker, and of the ASGI handler, driven by ``concurrency`` tasks on one event loop.
+        """
+        # The async views authenticate session users, so the requests carry a session of an existing user
+        cookies = session_cookies(user)
+
+        self.stdout.write(f"{'Endpoint':<24}{'WSGI req/s':>12}{'WSGI p99 ms':>13}{'ASGI req/s':>12}{'ASGI p99 ms':>13}")
+        for name, url, params in targets:
+            with benchmark_settings():
+                wsgi_rate, wsgi_latencies, wsgi_body = self.load_wsgi(cookies, url, params, requests, concurrency)
+                asgi_rate, asgi_latencies, asgi_body = asyncio.run(
+                    self.load_asgi(cookies, url, params, requests, concurrency)
+                )
+            if wsgi_body != asgi_body:
+                raise CommandError(f"WSGI and ASGI returned different responses for {name}.")
+            self.stdout.write(
+                f"{name:<24}{wsgi_rate:>12.1f}{p99(wsgi_latencies):>13.1f}"
+                f"{asgi_rate:>12.1f}{p99(asgi_latencies):>13.1f}"
+            )
+
+    @staticmethod
+    def measure(client: APIClient, url: str, params: Dict[str, Any], fast: bool, requests: int) -> Tuple[float, bytes]:
+        """
+        Times sequential GET requests to an endpoint.
+
+        Args:
+            client: The authenticated API client.
+            url: The endpoint.
+            params: The query parameters.
+            fast: Whether to use the fast read path.
+            requests: The number of timed requests.
+
+        Returns:
+            The requests per second and the last response body.
+        """
+        with benchmark_settings(fast):
+            for _ in range(WARMUP_REQUESTS):
+                client.get(url, params)
+            start = time.perf_counter()
+            for _ in range(requests):
+                response = client.get(url, params)
+            elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            raise CommandError(f"GET {url} returned {response.status_code}.")
+        return requests / elapsed, response.content
+
+    @staticmethod
+    def load_wsgi(
+        cookies, url: str, params: Dict[str, Any], requests: int, concurrency: int
+    ) -> Tuple[float, List[float], bytes]:
+        """
+        Sends GET requests through the WSGI handler from a pool of threads.
+
+        Args:
+            cookies: The session cookies to send.
+            url: The endpoint.
+            params: The query parameters.
+            requests: The number of timed requests.
+            concurrency: The number of threads.
+
+        Returns:
+            The requests per second, the latency of every request and the last response body.
+        """
+
+        def get() -> Tuple[float, Any]:
+            client = Client()
+            client.cookies = cookies
+            start = time.perf_counter()
+            response = client.get(url, params)
+            return time.perf_counter() - start, response
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(lambda _: get(), range(WARMUP_REQUESTS)))
+            start = time.perf_counter()
+            results = list(pool.map(lambda _: get(), range(requests)))
+            elapsed = time.perf_counter() - start
+        response = results[-1][1]
+        if response.status_code != 200:
+            raise CommandError(f"GET {url} returned {response.status_code} under WSGI.")
+        return requests / elapsed, [latency for latency, _ in results], response.content
+
+    @staticmethod
+    async def load_asgi(
+        cookies, url: str, params: Dict[str, Any], requests: int, concurrency: int
+    ) -> Tuple[float, List[float], bytes]:
+        """
+        Sends GET requests through the ASGI handler from tasks on one event loop.
+
+        Args:
+            cookies: The session cookies to send.
+            url: The endpoint.
+            params: The query parameters.
+            requests: The number of timed requests.
+            concurrency: The maximum number of requests in flight.
+
+        Returns:
+            The requests per second, the latency of every request and the last response body.
+        """
+        client = AsyncClient()
+        client.cookies = cookies
+        in_flight = asyncio.Semaphore(concurrency)
+
+        async def get() -> Tuple[float, Any]:
+            async with in_flight:
+                start = time.perf_counter()
+                response = await client.get(url, params)
+                return time.perf_counter() - start, response
+
+        await asyncio.gather(*(get() for _ in range(WARMUP_REQUESTS)))
+        start = time.perf_counter()
+        results = await asyncio.gather(*(get() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+        response = results[-1][1]
+        if response.status_code != 200:
+            raise CommandError(f"GET {url} returned {response.status_code} under ASGI.")
+        return requests / elapsed, [latency for latency, _ in results], response.content
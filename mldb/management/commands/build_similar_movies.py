@@ -0,0 +1,131 @@
+import os
+from typing import List
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+
+from mldb.management.profiling import stage
+from mldb.models import Movie, MovieNeighbor
+from mldb.similarity import (
+    METRICS,
+    Neighbors,
+    normalize,
+    rating_matrix,
+    top_k_neighbors,
+)
+
+DEFAULT_TOP_K = 20
+DEFAULT_MIN_RATINGS = 20
+DEFAULT_BLOCK_SIZE = 1000
+DEFAULT_CHUNK_SIZE = 1_000_000
+DEFAULT_BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    """Precomputes each movie's most similar movies from the MovieLens ratings."""
+
+    help = "Computes item-item movie similarities from ratings.csv and stores each movie's top-k neighbors"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds arguments to the command.
+
+        Args:
+            parser: The command line argument parser instance.
+        """
+        parser.add_argument(
+            "--ratings-path",
+            default=os.path.join(settings.BASE_DIR, "ml-20m", "ml-20m", "ratings.csv"),
+            help="The ratings CSV file, extracted by load_movielens_data by default",
+        )
+        parser.add_argument("--metric", choices=METRICS, default="cosine", help="The similarity measure")
+        parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="Number of neighbors stored per movie")
+        parser.add_argument(
+            "--min-ratings",
+            type=int,
+            default=DEFAULT_MIN_RATINGS,
+            help="Movies with fewer ratings are left out, since their similarities are mostly noise",
+        )
+        parser.add_argument(
+            "--block-size",
+            type=int,
+            default=DEFAULT_BLOCK_SIZE,
+            help="Number of movies whose similarities are computed at once by each worker",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Number of ratings.csv rows read into memory at a time",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1, help="Number of processes computing similarities"
+        )
+
+    def handle(self, *args, **options) -> None:
+        """
+        The main entry point for the command execution.
+
+        Args:
+            *args: Variable length argument list.
+            **options: Arbitrary keyword arguments.
+        """
+        ratings_path = options["ratings_path"]
+        if not os.path.exists(ratings_path):
+            raise CommandError(f"{ratings_path} does not exist; run load_movielens_data first.")
+
+        movie_ids = np.array(sorted(Movie.objects.values_list("id", flat=True)), dtype=np.int64)
+        with stage(self.stdout, "Reading ratings"):
+            with pd.read_csv(
+                ratings_path,
+                usecols=["userId", "movieId", "rating"],
+                dtype={"userId": "int32", "movieId": "int32", "rating": "float32"},
+                chunksize=options["chunk_size"],
+            ) as reader:
+                ratings = rating_matrix(reader, movie_ids)
+            self.stdout.write(f"Built a {ratings.shape[0]} x {ratings.shape[1]} matrix with {ratings.nnz} ratings.")
+
+        with stage(self.stdout, "Normalizing"):
+            normalized = normalize(ratings, options["metric"], options["min_ratings"])
+            del ratings
+
+        with stage(self.stdout, "Computing similarities"):
+            blocks = list(
+                top_k_neighbors(normalized, options["top_k"], options["block_size"], max(options["workers"], 1))
+            )
+
+        with stage(self.stdout, "Storing neighbors"):
+            count = self.store_neighbors(movie_ids, blocks)
+
+        self.stdout.write(self.style.SUCCESS(f"Successfully stored {count} neighbors."))
+
+    @staticmethod
+    @transaction.atomic
+    def store_neighbors(movie_ids: np.ndarray, blocks: List[Neighbors]) -> int:
+        """
+        Replaces all stored neighbors in one transaction, so readers never see a partial table.
+
+        Args:
+            movie_ids: The movie ids of the matrix rows.
+            blocks: The neighbors computed by ``top_k_neighbors``.
+
+        Returns:
+            The number of stored neighbors.
+        """
+        MovieNeighbor.objects.all().delete()
+        count = 0
+        for movies, neighbors, ranks, similarities in blocks:
+            MovieNeighbor.objects.bulk_create(
+                [
+                    MovieNeighbor(movie_id=movie_id, neighbor_id=neighbor_id, rank=rank, similarity=similarity)
+                    for movie_id, neighbor_id, rank, similarity in zip(
+                        movie_ids[movies].tolist(), movie_ids[neighbors].tolist(), ranks.tolist(), similarities.tolist()
+                    )
+                ],
+                batch_size=DEFAULT_BATCH_SIZE,
+            )
+            count += len(movies)
+        return count
@@ -1,14 +1,20 @@
-import csv
+import time
 
-from django.core.management.base import BaseCommand, CommandParser
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
 
+from mldb.exporting import DEFAULT_CHUNK_SIZE, FORMATS, export_movies, export_sharded
+from mldb.management.profiling import stage, write_metrics
 from mldb.models import Movie
+from mldb.routers import replica_database
+
+COMMAND = "export_movies"
 
 
 class Command(BaseCommand):
-    """Exports movies list to a CSV file."""
+    """Exports the movie catalog to CSV, JSON Lines or Parquet files."""
 
-    help = "Exports movies list to a CSV file"
+    help = "Exports the movie catalog to a CSV, JSON Lines or Parquet file"
 
     def add_arguments(self, parser: CommandParser) -> None:
         """
@@ -17,7 +23,28 @@ class Command(BaseCommand):
         Args:
             parser: The command line argument parser instance.
         """
-        parser.add_argument("output_file", type=str, help="The CSV file to write movies to")
+        parser.add_argument("output_file", type=str, help="The file to write movies to")
+        parser.add_argument("--format", choices=FORMATS, default="csv", help="The output format")
+        parser.add_argument("--gzip", action="store_true", help="Compress the output with gzip")
+        parser.add_argument(
+            "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Number of movies read per query"
+        )
+        parser.add_argument(
+            "--shards",
+            type=int,
+            default=1,
+            help="Split the catalog by id range into this many part files, written by parallel processes",
+        )
+        parser.add_argument(
+            "--database",
+            type=str,
+            help="Database alias to read from; defaults to a read replica if any are configured, else the primary",
+        )
+        parser.add_argument(
+            "--metrics-file",
+            type=str,
+            help="Write the stage timing and throughput metrics to this file in the Prometheus text format",
+        )
 
     def handle(self, *args, **options) -> None:
         """
@@ -28,31 +55,46 @@ class Command(BaseCommand):
             **options: Arbitrary keyword arguments.
         """
         output_file_path = options["output_file"]
-        self.export_movies_to_csv(output_file_path)
-
-    def export_movies_to_csv(self, file_path: str) -> None:
-        """
-        Exports movie data from the database to a CSV file.
-
-        Args:
-            file_path: The path to the output CSV file.
-        """
-        # Query the database for movies with related genres and tags
-        movies = Movie.objects.all().prefetch_related("genres", "tags")
-
-        # Define the CSV file's headers
-        headers = ["Movie ID", "Title", "Rating", "Genres", "Tags"]
-
-        with open(file_path, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            writer.writerow(headers)
-
-            for movie in movies:
-                # Extract genres and tags as comma-separated strings
-                genres = ", ".join([genre.name for genre in movie.genres.all()])
-                tags = ", ".join([tag.name for tag in movie.tags.all()])
-
-                # Write the movie data to the CSV file
-                writer.writerow([movie.id, movie.title, movie.rating, genres, tags])
-
-        self.stdout.write(self.style.SUCCESS(f"Successfully exported movies to {file_path}"))
+        export_format = options["format"]
+        if options["shards"] < 1:
+            raise CommandError("--shards must be at least 1.")
+        using = options["database"] or replica_database()
+        if using not in settings.DATABASES:
+            raise CommandError(f"Unknown database alias: {using}.")
+        start = time.perf_counter()
+
+        try:
+            with stage(self.stdout, "Exporting movies", COMMAND) as exporting:
+                if options["shards"] == 1:
+                    total = Movie.objects.using(using).count()
+                    exported = export_movies(
+                        output_file_path,
+                        export_format,
+                        options["gzip"],
+                        options["chunk_size"],
+                        progress=lambda done: self.stdout.write(f"Exported {done}/{total} movies..."),
+                        using=using,
+                    )
+                else:
+                    exported = 0
+                    for part_path, count in export_sharded(
+                        output_file_path,
+                        options["shards"],
+                        export_format,
+                        options["gzip"],
+                        options["chunk_size"],
+                        using,
+                    ):
+                        exported += count
+                        self.stdout.write(f"Exported {count} movies to {part_path}.")
+                exporting.rows = exported
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully exported {exported} movies to {output_file_path} in {time.perf_counter() - start:.1f}s"
+            )
+        )
+        if options["metrics_file"]:
+            write_metrics(options["metrics_file"])
@@ -2,15 +2,44 @@ import hashlib
 import os
 import re
 import zipfile
-from typing import Optional
+from functools import partial
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type
 
+import numpy as np
 import pandas as pd
 import requests
 from django.conf import settings
-from django.core.management.base import BaseCommand
-from django.db import transaction
-
-from mldb.models import Genre, Movie, Tag
+from django.core.management.base import BaseCommand, CommandParser
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Count, Model, Sum
+
+from mldb.cache import bump_catalog_version
+from mldb.leaderboards import compute_leaderboards
+from mldb.management.copy_loader import (
+    copy_frame,
+    create_staging_table,
+    drop_table,
+    merge_into,
+    quote_name,
+)
+from mldb.management.profiling import peak_memory_mb, stage, write_metrics
+from mldb.models import (
+    Genre,
+    Movie,
+    MovieLensRating,
+    MovieRatingBucket,
+    Tag,
+    UserRating,
+)
+from mldb.search import rebuild_search_index
+from mldb.tags import TAG_SEPARATOR
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_CHUNK_SIZE = 1_000_000
+ENGINES = ["orm", "copy"]
+COMMAND = "load_movielens_data"
 
 
 class Command(BaseCommand):
@@ -18,8 +47,53 @@ class Command(BaseCommand):
 
     help = "Downloads the Movielens 20M dataset, verifies it, and loads it into the database."
 
+    batch_size = DEFAULT_BATCH_SIZE
+    chunk_size = DEFAULT_CHUNK_SIZE
+    engine = "orm"
+    skip_ratings = False
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds arguments to the command.
+
+        Args:
+            parser: The command line argument parser instance.
+        """
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of rows written per bulk insert and per tag-link transaction",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Number of ratings.csv rows read into memory at a time",
+        )
+        parser.add_argument(
+            "--engine",
+            choices=ENGINES,
+            default="orm",
+            help="How rows are written: ORM bulk inserts, or PostgreSQL COPY into staging tables",
+        )
+        parser.add_argument(
+            "--skip-ratings",
+            action="store_true",
+            help="Only use ratings.csv for averages instead of also storing every raw rating",
+        )
+        parser.add_argument(
+            "--metrics-file",
+            type=str,
+            help="Write the stage timing and throughput metrics to this file in the Prometheus text format",
+        )
+
     def handle(self, *args, **kwargs) -> None:
         """Entry point for the command."""
+        self.batch_size = kwargs["batch_size"]
+        self.chunk_size = kwargs["chunk_size"]
+        self.engine = kwargs["engine"]
+        self.skip_ratings = kwargs["skip_ratings"]
         self.stdout.write("Starting to download the Movielens 20M dataset...")
 
         # Define URLs and paths
@@ -41,6 +115,8 @@ class Command(BaseCommand):
 
         # Extract and load data
         self.extract_and_load_data(dataset_path)
+        if kwargs["metrics_file"]:
+            write_metrics(kwargs["metrics_file"])
 
     def download_file(self, url: str, path: str) -> None:
         """
@@ -137,72 +213,603 @@ class Command(BaseCommand):
         ratings_path = os.path.join(extract_path, "ml-20m", "ratings.csv")
         tags_path = os.path.join(extract_path, "ml-20m", "tags.csv")
 
-        self.populate_genres(movies_path)
-        self.populate_movies(movies_path, ratings_path)
-        self.populate_tags(tags_path)
+        if self.engine == "copy" and connection.vendor != "postgresql":
+            self.stdout.write(self.style.WARNING("The copy engine requires PostgreSQL, falling back to the ORM."))
+            self.engine = "orm"
+
+        if self.engine == "copy":
+            self.load_with_copy(movies_path, ratings_path, tags_path)
+        else:
+            with stage(self.stdout, "Loading genres", COMMAND) as loading:
+                loading.rows = self.populate_genres(movies_path)
+            with stage(self.stdout, "Loading movies", COMMAND) as loading:
+                loading.rows = self.populate_movies(movies_path)
+            with stage(self.stdout, "Loading tags", COMMAND) as loading:
+                loading.rows = self.populate_tags(tags_path)
+            with stage(self.stdout, "Loading ratings", COMMAND) as loading:
+                loading.rows = self.populate_ratings(ratings_path)
+
+        with stage(self.stdout, "Computing leaderboards", COMMAND) as computing:
+            computing.rows = compute_leaderboards()
+        self.stdout.write(self.style.SUCCESS(f"Successfully computed {computing.rows} leaderboard entries."))
+
+        # Bulk writes bypass the model signals, so the search index and cached movie lists are refreshed explicitly
+        with stage(self.stdout, "Rebuilding search index", COMMAND):
+            rebuild_search_index()
+        bump_catalog_version()
+
+    def load_with_copy(self, movies_path: str, ratings_path: str, tags_path: str) -> None:
+        """
+        Loads the dataset with PostgreSQL COPY.
+
+        Prepared rows, including the raw ratings unless ``skip_ratings`` is set, are streamed into unlogged staging
+        tables, then merged into the real tables in a single transaction. Raw ratings are staged during the single
+        pass over the ratings CSV file that also adds up the rating aggregates and daily buckets. Genre and tag links
+        are staged by name and resolved to ids with a join during the merge.
 
-    def populate_genres(self, movies_path: str) -> None:
+        Args:
+            movies_path: The path to the movies CSV file.
+            ratings_path: The path to the ratings CSV file.
+            tags_path: The path to the tags CSV file.
+        """
+        self.stdout.write("Loading data with COPY...")
+        df_movies = self.read_movies(movies_path)
+        df_movie_genres = (
+            df_movies[["movieId", "genres"]].assign(name=df_movies["genres"].str.split("|")).explode("name")
+        )
+        movie_ids = set(df_movies["movieId"]) | set(Movie.objects.values_list("id", flat=True))
+        df_tags = self.read_tags(tags_path, movie_ids)
+        df_tag_summaries = self.tag_summaries(df_tags, settings.TAG_SUMMARY_SIZE)
+        df_tags = df_tags.drop_duplicates()
+
+        genre_table = Genre._meta.db_table
+        movie_table = Movie._meta.db_table
+        movie_genres_table = Movie.genres.through._meta.db_table
+        tag_table = Tag._meta.db_table
+        movie_tags_table = Movie.tags.through._meta.db_table
+        tag_summary_table = f"{movie_table}_tag_summary"
+        rating_table = MovieLensRating._meta.db_table
+        bucket_table = MovieRatingBucket._meta.db_table
+        rating_columns = [
+            ("ml_user_id", "integer"),
+            ("movie_id", "bigint"),
+            ("rating", "smallint"),
+            ("timestamp", "integer"),
+        ]
+
+        with stage(self.stdout, "Copying into staging tables", COMMAND) as copying, connection.cursor() as cursor:
+            copying.rows = 0
+            store = None
+            if not self.skip_ratings:
+                create_staging_table(cursor, f"{rating_table}_staging", rating_columns)
+                store = partial(
+                    copy_frame, cursor, f"{rating_table}_staging", columns=[column for column, _ in rating_columns]
+                )
+            totals, df_buckets, rows = self.scan_ratings(ratings_path, movie_ids, store)
+            if not self.skip_ratings:
+                copying.rows += rows
+                self.stdout.write(f"Staged {rows} rows for {rating_table}.")
+
+            df_movies = df_movies.join(self.movie_aggregates(df_movies["movieId"], totals), on="movieId")
+            staged = {
+                genre_table: ([("name", "text")], pd.DataFrame({"name": self.read_genre_names(movies_path)})),
+                movie_table: (
+                    [
+                        ("id", "bigint"),
+                        ("title", "text"),
+                        ("rating", "numeric"),
+                        ("rating_sum", "integer"),
+                        ("rating_count", "integer"),
+                    ],
+                    df_movies[["movieId", "title", "avg_rating", "rating_sum", "rating_count"]],
+                ),
+                movie_genres_table: ([("movie_id", "bigint"), ("name", "text")], df_movie_genres[["movieId", "name"]]),
+                tag_table: ([("name", "text")], df_tags[["tag"]].drop_duplicates()),
+                movie_tags_table: ([("movie_id", "bigint"), ("name", "text")], df_tags[["movieId", "tag"]]),
+                tag_summary_table: (
+                    [("movie_id", "bigint"), ("tag_summary", "text"), ("tag_count", "integer")],
+                    df_tag_summaries,
+                ),
+                bucket_table: (
+                    [("movie_id", "bigint"), ("day", "date"), ("rating_count", "integer"), ("rating_sum", "integer")],
+                    df_buckets,
+                ),
+            }
+            for table, (columns, frame) in staged.items():
+                create_staging_table(cursor, f"{table}_staging", columns)
+                copy_frame(cursor, f"{table}_staging", frame, [column for column, _ in columns])
+                copying.rows += len(frame)
+                self.stdout.write(f"Staged {len(frame)} rows for {table}.")
+        staging = {table: quote_name(f"{table}_staging") for table in staged}
+
+        with stage(self.stdout, "Merging staging tables", COMMAND), transaction.atomic(), connection.cursor() as cursor:
+            # New genres take the next free mask bits, in name order
+            merge_into(
+                cursor,
+                genre_table,
+                ["name", "bit"],
+                f"SELECT name, (SELECT COALESCE(MAX(bit), -1) FROM {quote_name(genre_table)}) "
+                f"+ ROW_NUMBER() OVER (ORDER BY name) FROM (SELECT DISTINCT name FROM {staging[genre_table]} "
+                f"WHERE name NOT IN (SELECT name FROM {quote_name(genre_table)})) s",
+                ["name"],
+            )
+            merge_into(
+                cursor,
+                movie_table,
+                [
+                    "id",
+                    "title",
+                    "rating",
+                    "rating_sum",
+                    "rating_count",
+                    "version",
+                    "updated_at",
+                    "genre_mask",
+                    "tag_summary",
+                    "tag_count",
+                ],
+                f"SELECT s.*, 1, now(), 0, '', 0 FROM {staging[movie_table]} s",
+                ["id"],
+            )
+            # Reloaded movies get the recomputed rating aggregates, like in the ORM path
+            cursor.execute(
+                f"UPDATE {quote_name(movie_table)} m SET rating = s.rating, rating_sum = s.rating_sum, "
+                f"rating_count = s.rating_count FROM {staging[movie_table]} s WHERE m.id = s.id"
+            )
+            # Genre links of reloaded movies are replaced, like in the ORM path
+            cursor.execute(
+                f"DELETE FROM {quote_name(movie_genres_table)} "
+                f"WHERE movie_id IN (SELECT id FROM {staging[movie_table]})"
+            )
+            merge_into(
+                cursor,
+                movie_genres_table,
+                ["movie_id", "genre_id"],
+                f"SELECT s.movie_id, g.id FROM {staging[movie_genres_table]} s "
+                f"JOIN {quote_name(genre_table)} g ON g.name = s.name",
+                ["movie_id", "genre_id"],
+            )
+            cursor.execute(
+                f"UPDATE {quote_name(movie_table)} m SET genre_mask = COALESCE(("
+                f"SELECT SUM(1::bigint << g.bit) FROM {quote_name(movie_genres_table)} mg "
+                f"JOIN {quote_name(genre_table)} g ON g.id = mg.genre_id WHERE mg.movie_id = m.id), 0) "
+                f"WHERE m.id IN (SELECT id FROM {staging[movie_table]})"
+            )
+            merge_into(cursor, tag_table, ["name"], f"SELECT DISTINCT name FROM {staging[tag_table]}", ["name"])
+            merge_into(
+                cursor,
+                movie_tags_table,
+                ["movie_id", "tag_id"],
+                f"SELECT DISTINCT s.movie_id, t.id FROM {staging[movie_tags_table]} s "
+                f"JOIN {quote_name(tag_table)} t ON t.name = s.name",
+                ["movie_id", "tag_id"],
+            )
+            cursor.execute(
+                f"UPDATE {quote_name(movie_table)} m SET tag_summary = s.tag_summary, tag_count = s.tag_count "
+                f"FROM {staging[tag_summary_table]} s WHERE m.id = s.movie_id"
+            )
+            merge_into(
+                cursor,
+                bucket_table,
+                ["movie_id", "day", "rating_count", "rating_sum"],
+                f"SELECT * FROM {staging[bucket_table]}",
+                ["day", "movie_id"],
+            )
+            if not self.skip_ratings:
+                merge_into(
+                    cursor,
+                    rating_table,
+                    [column for column, _ in rating_columns],
+                    f"SELECT * FROM {quote_name(f'{rating_table}_staging')}",
+                    ["ml_user_id", "movie_id"],
+                )
+            for table in [*staged, rating_table]:
+                drop_table(cursor, f"{table}_staging")
+            self.reset_sequences(Movie)
+
+        self.stdout.write(self.style.SUCCESS("Successfully loaded movies, genres and tags with COPY."))
+
+    def populate_genres(self, movies_path: str) -> int:
         """
         Populates genres data into the database from the movies CSV file.
 
         Args:
             movies_path: The path to the movies CSV file.
+
+        Returns:
+            The number of genres created.
         """
         self.stdout.write("Loading genres data...")
-        df_movies = pd.read_csv(movies_path)
-        genres = set(df_movies["genres"].str.split("|").explode().unique())
-        Genre.objects.bulk_create(
-            [Genre(name=genre) for genre in genres if genre != "(no genres listed)"], ignore_conflicts=True
-        )
+        existing = set(Genre.objects.values_list("name", flat=True))
+        names = [name for name in self.read_genre_names(movies_path) if name not in existing]
+        Genre.objects.bulk_create([Genre(name=name, bit=bit) for name, bit in zip(names, Genre.next_bits(len(names)))])
         self.stdout.write(self.style.SUCCESS("Successfully populated genres."))
+        return len(names)
 
     @transaction.atomic
-    def populate_movies(self, movies_path: str, ratings_path: str) -> None:
+    def populate_movies(self, movies_path: str) -> int:
         """
-        Loads movie data from CSV files into the database.
+        Loads movie data from the movies CSV file into the database.
+
+        Movies are inserted with one ``bulk_create`` and genre links are written straight into the through-table.
+        Their rating aggregates are filled in by ``populate_ratings``.
 
         Args:
             movies_path: The path to the movies CSV file.
-            ratings_path: The path to the ratings CSV file.
+
+        Returns:
+            The number of movies loaded.
+        """
+        df_movies = self.read_movies(movies_path)
+        masks = self.genre_masks(df_movies, dict(Genre.objects.values_list("name", "bit")))
+
+        # Existing movies are left untouched, matching the previous get_or_create behaviour, except for their genre
+        # masks, since their genre links are replaced below
+        Movie.objects.bulk_create(
+            [
+                Movie(id=row.movieId, title=row.title, genre_mask=mask)
+                for row, mask in zip(df_movies.itertuples(index=False), masks)
+            ],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=["genre_mask"],
+        )
+        self.reset_sequences(Movie)
+
+        self.link_movie_genres(df_movies)
+
+        self.stdout.write(self.style.SUCCESS("Successfully populated movies."))
+        return len(df_movies)
+
+    @staticmethod
+    def read_genre_names(movies_path: str) -> List[str]:
+        """
+        Reads the distinct genre names used in the movies CSV file.
+
+        Args:
+            movies_path: The path to the movies CSV file.
+
+        Returns:
+            The genre names, without the "(no genres listed)" placeholder.
         """
         df_movies = pd.read_csv(movies_path)
-        df_ratings = pd.read_csv(ratings_path)
-
-        # Calculating average rating
-        avg_ratings = df_ratings.groupby("movieId")["rating"].mean().reset_index()
-
-        for _, row in df_movies.iterrows():
-            movie_genres = row["genres"].split("|")
-            avg_rating = avg_ratings[avg_ratings["movieId"] == row["movieId"]]["rating"]
-            avg_rating_value = 5.0 if avg_rating.empty else avg_rating.iloc[0]
-
-            movie, created = Movie.objects.get_or_create(
-                id=row["movieId"],
-                defaults={
-                    "title": row["title"],
-                    "rating": avg_rating_value,
-                },
-            )
+        genres = set(df_movies["genres"].str.split("|").explode().unique())
+        return sorted(genre for genre in genres if genre != "(no genres listed)")
 
-            # Linking genres
-            genre_objs = Genre.objects.filter(name__in=movie_genres)
-            movie.genres.set(genre_objs)
+    @staticmethod
+    def read_movies(movies_path: str) -> pd.DataFrame:
+        """
+        Reads the movies CSV file.
 
-        self.stdout.write(self.style.SUCCESS("Successfully populated movies and calculated ratings."))
+        Args:
+            movies_path: The path to the movies CSV file.
 
-    @transaction.atomic
-    def populate_tags(self, tags_path: str) -> None:
+        Returns:
+            A frame with ``movieId``, ``title`` and pipe-separated ``genres`` columns.
+        """
+        return pd.read_csv(movies_path)
+
+    def movie_aggregates(self, movie_ids: Iterable[int], totals: pd.DataFrame) -> pd.DataFrame:
+        """
+        Combines the dataset rating totals with the ratings stored by users into each movie's rating aggregates.
+
+        Ratings users already made are folded in, so reloading into an existing database keeps them counted.
+
+        Args:
+            movie_ids: The movies to compute aggregates for.
+            totals: The dataset rating totals, as returned by ``scan_ratings``.
+
+        Returns:
+            A frame indexed by movie id with ``rating_sum`` (in half stars), ``rating_count`` and ``avg_rating``
+            (5.0 for unrated movies) columns.
+        """
+        index = pd.Index(list(movie_ids), name="movieId")
+        aggregates = totals.reindex(index, fill_value=0) + self.user_rating_totals().reindex(index, fill_value=0)
+        aggregates["avg_rating"] = (aggregates["rating_sum"] / (aggregates["rating_count"] * 2)).fillna(5.0)
+        return aggregates
+
+    @staticmethod
+    def user_rating_totals() -> pd.DataFrame:
+        """
+        Computes per-movie sums (in half stars) and counts of the ratings stored by users.
+
+        Returns:
+            A frame indexed by movie id with ``rating_sum`` and ``rating_count`` columns.
+        """
+        rows = UserRating.objects.order_by().values("movie_id").annotate(total=Sum("rating"), n=Count("id"))
+        totals = pd.DataFrame(list(rows.values_list("movie_id", "total", "n")), columns=["movieId", "total", "n"])
+        totals = totals.set_index("movieId").astype("int64")
+        return pd.DataFrame({"rating_sum": totals["total"] * 2, "rating_count": totals["n"]})
+
+    def link_movie_genres(self, df_movies: pd.DataFrame) -> None:
         """
-        Populates tags data into the database from the movies CSV file.
+        Replaces the genre links of the given movies using an in-memory genre name to id map.
+
+        Args:
+            df_movies: The movies frame with ``movieId`` and pipe-separated ``genres`` columns.
+        """
+        links = self.genre_links(df_movies, dict(Genre.objects.values_list("name", "id")))
+
+        through = Movie.genres.through
+        movie_ids = df_movies["movieId"].tolist()
+        for start in range(0, len(movie_ids), self.batch_size):
+            through.objects.filter(movie_id__in=movie_ids[start : start + self.batch_size]).delete()
+        through.objects.bulk_create(
+            [through(movie_id=movie_id, genre_id=genre_id) for movie_id, genre_id in links.itertuples(index=False)],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    def genre_links(df_movies: pd.DataFrame, genre_ids: Dict[str, int]) -> pd.DataFrame:
+        """
+        Explodes the pipe-separated genres of each movie into (movie id, genre id) pairs.
+
+        Args:
+            df_movies: The movies frame with ``movieId`` and ``genres`` columns.
+            genre_ids: Mapping of genre names to their database ids.
+
+        Returns:
+            A frame with ``movieId`` and ``genre_id`` columns; unknown genres are dropped.
+        """
+        links = df_movies[["movieId", "genres"]].assign(genre=df_movies["genres"].str.split("|")).explode("genre")
+        links["genre_id"] = links["genre"].map(genre_ids)
+        return links.dropna(subset=["genre_id"]).astype({"genre_id": "int64"})[["movieId", "genre_id"]]
+
+    @staticmethod
+    def genre_masks(df_movies: pd.DataFrame, genre_bits: Dict[str, int]) -> List[int]:
+        """
+        Computes the genre mask of each movie from its pipe-separated genres.
+
+        Args:
+            df_movies: The movies frame with ``movieId`` and ``genres`` columns.
+            genre_bits: Mapping of genre names to their mask bits.
+
+        Returns:
+            The masks, in the order of the frame's rows; unknown genres are ignored.
+        """
+        genres = df_movies["genres"].str.split("|").explode()
+        bits = genres.map(genre_bits).dropna().astype("int64")
+        masks = pd.Series(np.left_shift(1, bits.to_numpy()), index=bits.index).groupby(level=0).sum()
+        return masks.reindex(df_movies.index, fill_value=0).tolist()
+
+    @staticmethod
+    def reset_sequences(*models: Type[Model]) -> None:
+        """
+        Moves primary key sequences past the explicitly inserted ids so later inserts don't collide.
+
+        Args:
+            *models: The models whose sequences should be reset.
+        """
+        statements = connection.ops.sequence_reset_sql(no_style(), list(models))
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def populate_tags(self, tags_path: str) -> int:
+        """
+        Populates tags data into the database from the tags CSV file.
+
+        Tag names are deduplicated in pandas and only the missing ones are created. Movie-tag pairs are then
+        inserted into the through-table in ``batch_size`` chunks, each in its own short transaction. Tags that
+        reference movies missing from the catalog are skipped. Finally every tagged movie's tag summary and count
+        are stored in ``batch_size`` updates.
 
         Args:
             tags_path: The path to the tags CSV file.
+
+        Returns:
+            The number of movie-tag links loaded.
         """
-        df_tags = pd.read_csv(tags_path)
-        Tag.objects.all().delete()
-        for _, row in df_tags.iterrows():
-            tag, _ = Tag.objects.get_or_create(name=row["tag"])
-            movie = Movie.objects.get(id=row["movieId"])
-            movie.tags.add(tag)
+        df_tags = self.read_tags(tags_path, Movie.objects.values_list("id", flat=True))
+
+        Tag.objects.bulk_create(
+            [Tag(name=name) for name in df_tags["tag"].unique()], batch_size=self.batch_size, ignore_conflicts=True
+        )
+        links = self.tag_links(df_tags, dict(Tag.objects.values_list("name", "id")))
+
+        through = Movie.tags.through
+        for start in range(0, len(links), self.batch_size):
+            chunk = links.iloc[start : start + self.batch_size]
+            with transaction.atomic():
+                through.objects.bulk_create(
+                    [through(movie_id=movie_id, tag_id=tag_id) for movie_id, tag_id in chunk.itertuples(index=False)],
+                    ignore_conflicts=True,
+                )
+
+        summaries = self.tag_summaries(df_tags, settings.TAG_SUMMARY_SIZE)
+        Movie.objects.bulk_update(
+            [
+                Movie(id=movie_id, tag_summary=tag_summary, tag_count=tag_count)
+                for movie_id, tag_summary, tag_count in summaries.itertuples(index=False)
+            ],
+            ["tag_summary", "tag_count"],
+            batch_size=self.batch_size,
+        )
 
         self.stdout.write(self.style.SUCCESS("Successfully populated tags."))
+        return len(links)
+
+    def populate_ratings(self, ratings_path: str) -> int:
+        """
+        Loads everything derived from the ratings CSV file in a single streamed pass over it.
+
+        Each chunk is stored in the MovieLens ratings table, unless ``skip_ratings`` is set, while the movies' rating
+        aggregates and daily rating buckets are added up. Ratings of movies missing from the catalog, and raw ratings
+        and buckets that are already stored, are skipped, so reloading the dataset doesn't count ratings twice.
+
+        Args:
+            ratings_path: The path to the ratings CSV file.
+
+        Returns:
+            The number of ratings read.
+        """
+        self.stdout.write("Loading ratings...")
+        movie_ids = list(Movie.objects.values_list("id", flat=True))
+        store = None if self.skip_ratings else self.insert_ratings
+        totals, df_buckets, rows = self.scan_ratings(ratings_path, movie_ids, store)
+
+        MovieRatingBucket.objects.bulk_create(
+            [
+                MovieRatingBucket(movie_id=movie_id, day=day, rating_count=rating_count, rating_sum=rating_sum)
+                for movie_id, day, rating_count, rating_sum in df_buckets.itertuples(index=False)
+            ],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        aggregates = self.movie_aggregates(movie_ids, totals)
+        Movie.objects.bulk_update(
+            [
+                Movie(id=movie_id, rating=avg_rating, rating_sum=rating_sum, rating_count=rating_count)
+                for movie_id, rating_sum, rating_count, avg_rating in aggregates.itertuples()
+            ],
+            ["rating", "rating_sum", "rating_count"],
+            batch_size=self.batch_size,
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Successfully loaded {rows} ratings and {len(df_buckets)} daily rating buckets.")
+        )
+        return rows
+
+    def insert_ratings(self, chunk: pd.DataFrame) -> None:
+        """
+        Inserts a chunk of raw ratings, skipping ratings that are already stored.
+
+        Model instances are built lazily and inserted ``batch_size`` at a time, so only one batch of them is held in
+        memory rather than the whole chunk.
+
+        Args:
+            chunk: A frame shaped like the MovieLens ratings table, as yielded by ``read_rating_chunks``.
+        """
+        ratings = (
+            MovieLensRating(ml_user_id=user_id, movie_id=movie_id, rating=rating, timestamp=timestamp)
+            for user_id, movie_id, rating, timestamp in chunk.itertuples(index=False)
+        )
+        while batch := list(islice(ratings, self.batch_size)):
+            MovieLensRating.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def scan_ratings(
+        self, ratings_path: str, movie_ids: Iterable[int], store: Optional[Callable[[pd.DataFrame], None]] = None
+    ) -> Tuple[pd.DataFrame, pd.DataFrame, int]:
+        """
+        Streams the ratings CSV file once, adding up per-movie rating totals and daily rating buckets.
+
+        Only running totals are kept between chunks, so peak memory depends on the chunk size and the number of
+        buckets rather than on the size of the file.
+
+        Args:
+            ratings_path: The path to the ratings CSV file.
+            movie_ids: The ids of the movies ratings may refer to; other ratings are dropped.
+            store: If given, called with every chunk, as yielded by ``read_rating_chunks``, to store the raw ratings.
+
+        Returns:
+            The per-movie totals, indexed by movie id with ``rating_sum`` (in half stars) and ``rating_count``
+            columns; the daily buckets, with ``movie_id``, ``day`` (UTC), ``rating_count`` and ``rating_sum``
+            columns; and the number of ratings read.
+        """
+        totals = pd.DataFrame({"rating_sum": pd.Series(dtype="int64"), "rating_count": pd.Series(dtype="int64")})
+        buckets = None
+        rows = 0
+        for chunk in self.read_rating_chunks(ratings_path, movie_ids):
+            ratings = chunk.assign(rating=chunk["rating"].astype("int64"), day=chunk["timestamp"] // 86400)
+            totals = totals.add(
+                ratings.groupby("movie_id")["rating"].agg(rating_sum="sum", rating_count="count"), fill_value=0
+            )
+            part = ratings.groupby(["movie_id", "day"])["rating"].agg(rating_count="count", rating_sum="sum")
+            # Folding each chunk into the running totals merges groups split across chunk boundaries, and keeps
+            # memory bounded by the number of buckets rather than the number of chunks
+            buckets = part if buckets is None else pd.concat([buckets, part]).groupby(level=["movie_id", "day"]).sum()
+            if store is not None:
+                store(chunk)
+            rows += len(chunk)
+
+        self.stdout.write(f"Read {rows} ratings of {len(totals)} movies (peak memory {peak_memory_mb():.0f} MB).")
+        if buckets is None:
+            return totals, pd.DataFrame(columns=["movie_id", "day", "rating_count", "rating_sum"]), rows
+
+        buckets = buckets.reset_index()
+        buckets["day"] = pd.to_datetime(buckets["day"], unit="D").dt.date
+        return totals.astype("int64"), buckets[["movie_id", "day", "rating_count", "rating_sum"]], rows
+
+    def read_rating_chunks(self, ratings_path: str, movie_ids: Iterable[int]) -> Iterator[pd.DataFrame]:
+        """
+        Streams the ratings CSV file as frames shaped like the MovieLens ratings table.
+
+        Args:
+            ratings_path: The path to the ratings CSV file.
+            movie_ids: The ids of the movies ratings may refer to; other ratings are dropped.
+
+        Yields:
+            Frames with ``ml_user_id``, ``movie_id``, ``rating`` (doubled, as int16) and ``timestamp`` columns.
+        """
+        known_ids = list(movie_ids)
+        with pd.read_csv(
+            ratings_path,
+            dtype={"userId": "int32", "movieId": "int32", "rating": "float32", "timestamp": "int32"},
+            chunksize=self.chunk_size,
+        ) as reader:
+            for chunk in reader:
+                chunk = chunk[chunk["movieId"].isin(known_ids)]
+                yield pd.DataFrame(
+                    {
+                        "ml_user_id": chunk["userId"],
+                        "movie_id": chunk["movieId"],
+                        "rating": (chunk["rating"] * 2).round().astype("int16"),
+                        "timestamp": chunk["timestamp"],
+                    }
+                )
+
+    def read_tags(self, tags_path: str, movie_ids: Iterable[int]) -> pd.DataFrame:
+        """
+        Reads the tags CSV file, dropping empty tags and tags of movies missing from the catalog.
+
+        Args:
+            tags_path: The path to the tags CSV file.
+            movie_ids: The ids of the movies tags may be attached to.
+
+        Returns:
+            A frame with ``movieId`` and ``tag`` columns.
+        """
+        df_tags = pd.read_csv(tags_path, usecols=["movieId", "tag"], dtype={"tag": str}).dropna(subset=["tag"])
+
+        known_movies = df_tags["movieId"].isin(list(movie_ids))
+        skipped = int((~known_movies).sum())
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"Skipped {skipped} tags referencing unknown movies."))
+        return df_tags[known_movies]
+
+    @staticmethod
+    def tag_links(df_tags: pd.DataFrame, tag_ids: Dict[str, int]) -> pd.DataFrame:
+        """
+        Resolves tag names to ids and deduplicates the (movie id, tag id) pairs.
+
+        Args:
+            df_tags: The tags frame with ``movieId`` and ``tag`` columns.
+            tag_ids: Mapping of tag names to their database ids.
+
+        Returns:
+            A frame with ``movieId`` and ``tag_id`` columns.
+        """
+        return df_tags.assign(tag_id=df_tags["tag"].map(tag_ids))[["movieId", "tag_id"]].drop_duplicates()
+
+    @staticmethod
+    def tag_summaries(df_tags: pd.DataFrame, size: int) -> pd.DataFrame:
+        """
+        Computes each movie's tag summary: its ``size`` most applied tags, ties broken by name.
+
+        Args:
+            df_tags: The tags frame with ``movieId`` and ``tag`` columns, one row per time a tag was applied.
+            size: The number of tags kept in a summary.
+
+        Returns:
+            A frame with ``movieId``, ``tag_summary`` and ``tag_count`` (the number of distinct tags) columns.
+        """
+        uses = df_tags.groupby(["movieId", "tag"]).size().rename("uses").reset_index()
+        uses = uses.sort_values(["movieId", "uses", "tag"], ascending=[True, False, True])
+        return (
+            uses.groupby("movieId")
+            .agg(tag_summary=("tag", lambda tags: TAG_SEPARATOR.join(tags.iloc[:size])), tag_count=("tag", "size"))
+            .reset_index()
+        )
@@ -0,0 +1,73 @@
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from mldb.leaderboards import compute_leaderboards
+from mldb.models import Movie
+
+DURATION_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+
+def parse_since(value: str) -> Optional[datetime]:
+    """
+    Parses a ``--since`` value.
+
+    Args:
+        value: An ISO 8601 date or datetime, or a duration ago such as ``30m``, ``12h`` or ``7d``.
+
+    Returns:
+        The aware datetime, or None if the value can't be parsed.
+    """
+    match = re.fullmatch(r"(\d+)([mhd])", value)
+    if match:
+        return timezone.now() - timedelta(**{DURATION_UNITS[match[2]]: int(match[1])})
+
+    moment = parse_datetime(value)
+    if moment is None:
+        date = parse_date(value)
+        if date is None:
+            return None
+        moment = datetime.combine(date, datetime.min.time())
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class Command(BaseCommand):
+    """Recomputes the precomputed movie leaderboards."""
+
+    help = "Recomputes the overall and per-genre movie leaderboards"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds arguments to the command.
+
+        Args:
+            parser: The command line argument parser instance.
+        """
+        parser.add_argument(
+            "--since",
+            help="Only recompute movies changed since this ISO date or datetime, or duration ago such as 12h or 7d",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """
+        The main entry point for the command execution.
+
+        Args:
+            *args: Variable length argument list.
+            **options: Arbitrary keyword arguments.
+        """
+        movie_ids = None
+        if options["since"]:
+            since = parse_since(options["since"])
+            if since is None:
+                raise CommandError(f"Invalid --since value: {options['since']}")
+            # New movies, genre changes and ratings all bump updated_at
+            movie_ids = list(Movie.objects.filter(updated_at__gte=since).values_list("id", flat=True))
+            self.stdout.write(f"Found {len(movie_ids)} movies changed since {since.isoformat()}.")
+
+        entries = compute_leaderboards(movie_ids)
+        self.stdout.write(self.style.SUCCESS(f"Successfully computed {entries} leaderboard entries."))
@@ -0,0 +1,102 @@
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from mldb.cache import bump_movie_versions
+from mldb.leaderboards import rescore_movies
+from mldb.models import Movie, MovieLensRating, UserRating
+from mldb.ratings import aggregate_fields
+
+
+class Command(BaseCommand):
+    """Recomputes the movies' running rating aggregates from the stored ratings and fixes drifted movies."""
+
+    help = "Recomputes movie rating sums and counts from the stored ratings and fixes any drift"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds arguments to the command.
+
+        Args:
+            parser: The command line argument parser instance.
+        """
+        parser.add_argument("--dry-run", action="store_true", help="Only report drifted movies")
+
+    def handle(self, *args, **options) -> None:
+        """
+        The main entry point for the command execution.
+
+        Args:
+            *args: Variable length argument list.
+            **options: Arbitrary keyword arguments.
+        """
+        if not MovieLensRating.objects.exists():
+            raise CommandError("No raw MovieLens ratings are stored; reload the dataset without --skip-ratings.")
+
+        drifted = self.find_drifted_movies()
+        self.stdout.write(f"Found {len(drifted)} movies with drifted rating aggregates.")
+        if options["dry_run"]:
+            return
+
+        for movie_id in drifted:
+            self.reconcile_movie(movie_id)
+
+        self.stdout.write(self.style.SUCCESS(f"Successfully reconciled {len(drifted)} movies."))
+
+    def find_drifted_movies(self) -> List[int]:
+        """
+        Compares every movie's stored aggregates with totals computed from the ratings tables.
+
+        Returns:
+            The ids of the movies whose aggregates differ.
+        """
+        expected: Dict[int, Tuple[int, int]] = defaultdict(lambda: (0, 0))
+        for movie_id, rating_sum, rating_count in self.grouped_totals():
+            expected[movie_id] = rating_sum, rating_count
+
+        return [
+            movie_id
+            for movie_id, rating_sum, rating_count in Movie.objects.values_list(
+                "id", "rating_sum", "rating_count"
+            ).iterator()
+            if expected[movie_id] != (rating_sum, rating_count)
+        ]
+
+    @staticmethod
+    def grouped_totals() -> List[Tuple[int, int, int]]:
+        """
+        Computes per-movie rating sums (in half stars) and counts over dataset and user ratings.
+
+        Returns:
+            (movie id, rating sum, rating count) tuples.
+        """
+        totals: Dict[int, List[int]] = defaultdict(lambda: [0, 0])
+        dataset = MovieLensRating.objects.order_by().values("movie_id").annotate(total=Sum("rating"), n=Count("id"))
+        users = UserRating.objects.order_by().values("movie_id").annotate(total=Sum("rating"), n=Count("id"))
+        for row in dataset.values_list("movie_id", "total", "n"):
+            totals[row[0]][0] += row[1]
+            totals[row[0]][1] += row[2]
+        for row in users.values_list("movie_id", "total", "n"):
+            totals[row[0]][0] += row[1] * 2
+            totals[row[0]][1] += row[2]
+        return [(movie_id, rating_sum, rating_count) for movie_id, (rating_sum, rating_count) in totals.items()]
+
+    @staticmethod
+    @transaction.atomic
+    def reconcile_movie(movie_id: int) -> None:
+        """
+        Recomputes one movie's aggregates while holding its row lock, so concurrent rating writes are not lost.
+
+        Args:
+            movie_id: The movie to reconcile.
+        """
+        list(Movie.objects.select_for_update().filter(id=movie_id).values_list("id"))
+        dataset = MovieLensRating.objects.filter(movie_id=movie_id).aggregate(total=Sum("rating"), n=Count("id"))
+        users = UserRating.objects.filter(movie_id=movie_id).aggregate(total=Sum("rating"), n=Count("id"))
+        rating_sum = (dataset["total"] or 0) + (users["total"] or 0) * 2
+        Movie.objects.filter(id=movie_id).update(**aggregate_fields(rating_sum, dataset["n"] + users["n"]))
+        rescore_movies(movie_id)
+        bump_movie_versions(movie_id)
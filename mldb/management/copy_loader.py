@@ -0,0 +1,127 @@
+"""
+PostgreSQL ``COPY FROM STDIN`` helpers used by ``load_movielens_data --engine=copy``.
+
+Rows are streamed into unlogged staging tables that carry no indexes or constraints, then merged into the real
+tables in a single transaction. Secondary indexes of empty target tables are dropped before the merge and
+recreated afterwards, so a fresh load builds each index once instead of maintaining it row by row.
+"""
+
+import io
+from contextlib import contextmanager
+from typing import Iterator, List, Sequence, Tuple
+
+import pandas as pd
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+
+COPY_CHUNK_ROWS = 100_000
+
+
+def quote_name(name: str) -> str:
+    """Quotes a table or column name for PostgreSQL."""
+    return connection.ops.quote_name(name)
+
+
+def create_staging_table(cursor: CursorWrapper, name: str, columns: Sequence[Tuple[str, str]]) -> None:
+    """
+    Creates an empty, unlogged staging table without indexes or constraints.
+
+    Args:
+        cursor: The database cursor.
+        name: The staging table name.
+        columns: (column name, column type) pairs.
+    """
+    cursor.execute(f"DROP TABLE IF EXISTS {quote_name(name)}")
+    cursor.execute(
+        f"CREATE UNLOGGED TABLE {quote_name(name)} "
+        f"({', '.join(f'{quote_name(column)} {column_type}' for column, column_type in columns)})"
+    )
+
+
+def copy_frame(cursor: CursorWrapper, table: str, frame: pd.DataFrame, columns: Sequence[str]) -> None:
+    """
+    Streams the given frame columns into ``table`` with ``COPY FROM STDIN``.
+
+    The frame is serialized to CSV in chunks of ``COPY_CHUNK_ROWS`` rows so the buffer stays small.
+
+    Args:
+        cursor: The database cursor, backed by psycopg2.
+        table: The table to copy into.
+        frame: The rows to copy.
+        columns: The table columns, in the same order as the frame columns.
+    """
+    statement = (
+        f"COPY {quote_name(table)} ({', '.join(quote_name(column) for column in columns)}) "
+        "FROM STDIN WITH (FORMAT csv)"
+    )
+    for start in range(0, len(frame), COPY_CHUNK_ROWS):
+        buffer = io.StringIO()
+        frame.iloc[start : start + COPY_CHUNK_ROWS].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+
+
+@contextmanager
+def deferred_indexes(cursor: CursorWrapper, table: str) -> Iterator[None]:
+    """
+    Drops the secondary indexes of an empty table for the duration of the block and recreates them afterwards.
+
+    Indexes backing primary key or unique constraints are kept, since the merge relies on them for
+    ``ON CONFLICT``. Tables that already hold rows are left alone.
+
+    Args:
+        cursor: The database cursor.
+        table: The table name.
+    """
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {quote_name(table)})")
+    if cursor.fetchone()[0]:
+        yield
+        return
+
+    cursor.execute(
+        """
+        SELECT i.indexname, i.indexdef
+        FROM pg_indexes i
+        WHERE i.schemaname = current_schema()
+          AND i.tablename = %s
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)
+        """,
+        [table],
+    )
+    indexes: List[Tuple[str, str]] = cursor.fetchall()
+    for name, _ in indexes:
+        cursor.execute(f"DROP INDEX {quote_name(name)}")
+    yield
+    for _, definition in indexes:
+        cursor.execute(definition)
+
+
+def merge_into(
+    cursor: CursorWrapper, table: str, columns: Sequence[str], select: str, conflict_columns: Sequence[str]
+) -> int:
+    """
+    Inserts the rows produced by ``select`` into ``table``, skipping rows that conflict with existing ones.
+
+    Args:
+        cursor: The database cursor.
+        table: The target table name.
+        columns: The target columns, in the order ``select`` produces them.
+        select: A SELECT statement reading from the staging tables.
+        conflict_columns: The columns of the unique constraint used to detect existing rows.
+
+    Returns:
+        The number of inserted rows.
+    """
+    with deferred_indexes(cursor, table):
+        cursor.execute(
+            f"INSERT INTO {quote_name(table)} ({', '.join(quote_name(column) for column in columns)}) {select} "
+            f"ON CONFLICT ({', '.join(quote_name(column) for column in conflict_columns)}) DO NOTHING"
+        )
+        inserted = cursor.rowcount
+    cursor.execute(f"ANALYZE {quote_name(table)}")
+    return inserted
+
+
+def drop_table(cursor: CursorWrapper, name: str) -> None:
+    """Drops a staging table if it exists."""
+    cursor.execute(f"DROP TABLE IF EXISTS {quote_name(name)}")
@@ -0,0 +1,72 @@
+"""Time, throughput and memory reporting for long-running management commands."""
+
+import os
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from django.core.management.base import OutputWrapper
+
+from mldb.metrics import record_stage, render_metrics
+
+
+def peak_memory_mb() -> float:
+    """
+    Returns the peak resident set size of the current process.
+
+    Returns:
+        The peak RSS in megabytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+class Stage:
+    """A running command stage; set ``rows`` to the number of rows it processed to report its throughput."""
+
+    def __init__(self) -> None:
+        self.rows: Optional[int] = None
+
+
+@contextmanager
+def stage(stdout: OutputWrapper, name: str, command: Optional[str] = None) -> Iterator[Stage]:
+    """
+    Reports the wall time and row throughput of a command stage and the process's peak memory once it finishes.
+
+    Args:
+        stdout: The command's output stream.
+        name: The stage name.
+        command: The command name; if given, the stage is also recorded in the command stage metrics.
+
+    Yields:
+        The stage, for the block to set its row count.
+    """
+    current = Stage()
+    start = time.perf_counter()
+    yield current
+    elapsed = time.perf_counter() - start
+    throughput = ""
+    if current.rows is not None:
+        throughput = f", {current.rows} rows at {current.rows / elapsed if elapsed > 0 else 0:.0f} rows/s"
+    stdout.write(f"{name} took {elapsed:.1f}s{throughput} (peak memory {peak_memory_mb():.0f} MB).")
+    if command is not None:
+        record_stage(command, name, elapsed, current.rows)
+
+
+def write_metrics(path: str) -> None:
+    """
+    Writes the metrics of this process to a file in the Prometheus text format, for a node exporter textfile
+    collector. The file is replaced atomically, so the collector never reads a partial file.
+
+    Args:
+        path: The metrics file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as file:
+        file.write(render_metrics())
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, path)
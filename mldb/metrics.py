@@ -0,0 +1,325 @@
+"""
+Request, database and command metrics, exposed in the Prometheus text format.
+
+Values live in the process that records them, like the cache statistics in ``mldb.cache``, so every worker is
+scraped on its own, by clients in ``METRICS_ALLOWED_IPS``. Requests are timed by ``RequestMetricsMiddleware``.
+Their database queries are counted and timed by ``record_query``, which wraps the queries of every connection and
+logs slow ones, and the time spent building and rendering response data is added up by ``serialization``. With
+``METRICS_SAMPLE_RATE`` below 1, only that share of requests has its queries and serialization accounted for; every
+request is still counted and timed, and its slow queries logged.
+"""
+
+import bisect
+import ipaddress
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, HttpResponseForbidden
+
+from mldb.cache import stats
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+
+REGISTRY: List["Metric"] = []
+
+LabelValues = Tuple[str, ...]
+
+
+def escape(value: str) -> str:
+    """Escapes a label value for the text format."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    """A named metric family with a fixed set of labels, registered for exposition."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def label_values(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def format_labels(self, values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, values)) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            return [f"{self.name}{self.format_labels(key)} {value}" for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """A value that is set to the latest measurement."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    """Counts observations in cumulative buckets, with their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label values: the count of each bucket plus one for +Inf, then the sum
+        self.values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.label_values(labels)
+        with self.lock:
+            counts, total = self.values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self.lock:
+            for key, (counts, total) in self.values.items():
+                cumulative = 0
+                for bound, count in zip([*map(str, self.buckets), "+Inf"], counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{self.format_labels(key, ('le', bound))} {cumulative}")
+                lines.append(f"{self.name}_sum{self.format_labels(key)} {total[0]}")
+                lines.append(f"{self.name}_count{self.format_labels(key)} {cumulative}")
+        return lines
+
+
+requests_total = Counter(
+    "mldb_http_requests_total", "HTTP requests by view, method and status.", ["view", "method", "status"]
+)
+request_seconds = Histogram(
+    "mldb_http_request_duration_seconds", "Time to produce a response, by view.", ["view", "method"], LATENCY_BUCKETS
+)
+request_queries = Histogram(
+    "mldb_http_request_db_queries", "Database queries per sampled request, by view.", ["view"], QUERY_COUNT_BUCKETS
+)
+request_db_seconds = Histogram(
+    "mldb_http_request_db_duration_seconds", "Database time per sampled request, by view.", ["view"], LATENCY_BUCKETS
+)
+request_serialization_seconds = Histogram(
+    "mldb_http_request_serialization_duration_seconds",
+    "Time building and rendering response data per sampled request, by view.",
+    ["view"],
+    LATENCY_BUCKETS,
+)
+slow_queries_total = Counter("mldb_db_slow_queries_total", "Queries slower than SLOW_QUERY_SECONDS, by view.", ["view"])
+cache_requests_total = Counter(
+    "mldb_cache_requests_total", "Response cache lookups by cache and result.", ["cache", "result"]
+)
+command_stage_seconds = Gauge(
+    "mldb_command_stage_duration_seconds", "Wall time of the last run of a command stage.", ["command", "stage"]
+)
+command_stage_rows = Gauge(
+    "mldb_command_stage_rows", "Rows processed by the last run of a command stage.", ["command", "stage"]
+)
+command_stage_rows_per_second = Gauge(
+    "mldb_command_stage_rows_per_second", "Row throughput of the last run of a command stage.", ["command", "stage"]
+)
+
+
+def render_metrics() -> str:
+    """Renders every registered metric in the Prometheus text format."""
+    with cache_requests_total.lock:
+        # The cache statistics are kept as plain counts, named <cache>_hits and <cache>_misses
+        cache_requests_total.values = {tuple(key.rsplit("_", 1)): count for key, count in stats.items()}
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+class RequestMetrics:
+    """What one request spent in the database and in serialization, and whether that goes into the histograms."""
+
+    def __init__(self, request: HttpRequest, sampled: bool) -> None:
+        self.request = request
+        self.sampled = sampled
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialization_seconds = 0.0
+
+    @property
+    def view(self) -> str:
+        return view_name(self.request)
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("mldb_request_metrics", default=None)
+
+
+def view_name(request: HttpRequest) -> str:
+    """Returns the URL name of the view serving the request, which keeps label values few and stable."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    return match.view_name or match.route
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper that counts and times the queries of sampled requests and logs slow queries."""
+    current = _current.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        if current is not None and current.sampled:
+            current.queries += 1
+            current.db_seconds += elapsed
+        if elapsed >= settings.SLOW_QUERY_SECONDS:
+            # Queries outside requests, such as those of management commands, have no view
+            view = "none" if current is None else current.view
+            slow_queries_total.inc(view=view)
+            logger.warning("Slow query in %s took %.3fs: %s", view, elapsed, sql)
+
+
+def install_query_recorder(sender, connection, **kwargs) -> None:
+    """Adds ``record_query`` to a new database connection; connected to ``connection_created``."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def serialization() -> Iterator[None]:
+    """Adds the time spent in the block to the serialization time of the current request, if it is sampled."""
+    current = _current.get()
+    if current is None or not current.sampled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.serialization_seconds += time.perf_counter() - start
+
+
+def record_stage(command: str, stage: str, seconds: float, rows: Optional[int] = None) -> None:
+    """Records the duration and, if known, the row count and throughput of a management command stage."""
+    command_stage_seconds.set(seconds, command=command, stage=stage)
+    if rows is not None:
+        command_stage_rows.set(rows, command=command, stage=stage)
+        command_stage_rows_per_second.set(rows / seconds if seconds > 0 else 0, command=command, stage=stage)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the latency of every request by view, and the database queries, database time and serialization time
+    of sampled requests. Unsampled requests only have each query checked against ``SLOW_QUERY_SECONDS``.
+
+    Place it first in ``MIDDLEWARE`` so that the other middleware's work counts towards the request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        current, start = self.sample(request), time.perf_counter()
+        token = _current.set(current)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, current, start)
+
+    async def __acall__(self, request):
+        current, start = self.sample(request), time.perf_counter()
+        token = _current.set(current)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, current, start)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns, so rendering is timed with a post-render callback
+        current = _current.get()
+        if current is not None and current.sampled:
+            start = time.perf_counter()
+
+            def rendered(response) -> None:
+                current.serialization_seconds += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def sample(request: HttpRequest) -> RequestMetrics:
+        return RequestMetrics(request, sampled=random.random() < settings.METRICS_SAMPLE_RATE)
+
+    @staticmethod
+    def record(request: HttpRequest, response, current: RequestMetrics, start: float):
+        elapsed = time.perf_counter() - start
+        view = view_name(request)
+        requests_total.inc(view=view, method=request.method, status=str(response.status_code))
+        request_seconds.observe(elapsed, view=view, method=request.method)
+        if current.sampled:
+            request_queries.observe(current.queries, view=view)
+            request_db_seconds.observe(current.db_seconds, view=view)
+            request_serialization_seconds.observe(current.serialization_seconds, view=view)
+        return response
+
+
+def scraper_allowed(request: HttpRequest) -> bool:
+    """Whether the request comes from an address in ``METRICS_ALLOWED_IPS``."""
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_IPS)
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """Serves the metrics of this process to Prometheus scrapes from ``METRICS_ALLOWED_IPS``."""
+    if not scraper_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
@@ -0,0 +1,77 @@
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpRequest, HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+
+from mldb.routers import replica_reads, wrote_to_primary
+
+# Cookie that keeps a client's reads on the primary for READ_YOUR_WRITES_WINDOW seconds after it writes
+PRIMARY_COOKIE = "mldb_primary"
+
+
+def route(request: HttpRequest) -> None:
+    # The async views only authenticate session users, so requests with credentials in the Authorization
+    # header stay on the DRF views and their authentication classes
+    if isinstance(request, ASGIRequest) and "HTTP_AUTHORIZATION" not in request.META:
+        request.urlconf = settings.ASGI_URLCONF
+
+
+@sync_and_async_middleware
+def asgi_routing_middleware(get_response):
+    """Routes requests served under ASGI to ``ASGI_URLCONF``, which maps the movie endpoints to async views."""
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            route(request)
+            return await get_response(request)
+
+    else:
+
+        def middleware(request):
+            route(request)
+            return get_response(request)
+
+    return middleware
+
+
+def reads_replicas(request: HttpRequest) -> bool:
+    # Requests that write read from the primary, since what they write can depend on what they read
+    return (
+        bool(settings.REPLICA_DATABASES) and request.method in ("GET", "HEAD") and PRIMARY_COOKIE not in request.COOKIES
+    )
+
+
+def pinned_to_primary(request: HttpRequest) -> bool:
+    """Whether the client wrote recently and reads from the primary, so that shared caches could hide its write."""
+    return bool(settings.REPLICA_DATABASES) and PRIMARY_COOKIE in request.COOKIES
+
+
+def pin_writer(response: HttpResponse) -> HttpResponse:
+    # The cookie outlives the request, so the client's next reads don't race replication of its write
+    if settings.REPLICA_DATABASES and wrote_to_primary():
+        response.set_cookie(
+            PRIMARY_COOKIE, "1", max_age=settings.READ_YOUR_WRITES_WINDOW, httponly=True, samesite="Lax"
+        )
+    return response
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    """
+    Reads ``mldb`` models from a replica during GET and HEAD requests, and keeps clients that wrote reading from
+    the primary for ``READ_YOUR_WRITES_WINDOW`` seconds.
+    """
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            with replica_reads(reads_replicas(request)):
+                return pin_writer(await get_response(request))
+
+    else:
+
+        def middleware(request):
+            with replica_reads(reads_replicas(request)):
+                return pin_writer(get_response(request))
+
+    return middleware
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.3 on 2026-10-17 01:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mldb", "0003_alter_tag_name"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="movie",
+            options={"ordering": ["id"]},
+        ),
+        migrations.CreateModel(
+            name="MovieLensRating",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("ml_user_id", models.IntegerField()),
+                ("rating", models.PositiveSmallIntegerField()),
+                ("timestamp", models.IntegerField()),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="movielens_ratings",
+                        to="mldb.movie",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["movie", "rating"],
+                        name="mldb_mlrating_movie_rating_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="movielensrating",
+            constraint=models.UniqueConstraint(fields=("ml_user_id", "movie"), name="mldb_mlrating_user_movie_uniq"),
+        ),
+    ]
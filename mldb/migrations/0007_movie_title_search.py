@@ -0,0 +1,41 @@
+from django.db import migrations
+
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX mldb_movie_title_fts_idx ON mldb_movie USING GIN (to_tsvector('english'::regconfig, title))",
+    "CREATE INDEX mldb_movie_title_trgm_idx ON mldb_movie USING GIN (title gin_trgm_ops)",
+]
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS mldb_movie_title_trgm_idx",
+    "DROP INDEX IF EXISTS mldb_movie_title_fts_idx",
+]
+
+# A standalone FTS5 table rather than an external-content one with triggers: SQLite migrations rebuild tables,
+# which drops their triggers, so the index is kept in sync by mldb.search instead.
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE mldb_movie_fts USING fts5(title, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "INSERT INTO mldb_movie_fts (rowid, title) SELECT id, title FROM mldb_movie",
+]
+SQLITE_BACKWARD = ["DROP TABLE IF EXISTS mldb_movie_fts"]
+
+
+def run_for_vendor(postgresql, sqlite):
+    def run(apps, schema_editor):
+        statements = {"postgresql": postgresql, "sqlite": sqlite}.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("mldb", "0006_movie_version_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRESQL_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRESQL_BACKWARD, SQLITE_BACKWARD),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def assign_genre_bits(apps, schema_editor):
+    Genre = apps.get_model("mldb", "Genre")
+    genres = list(Genre.objects.order_by("id"))
+    if len(genres) > 63:
+        raise RuntimeError("Movie.genre_mask has room for at most 63 genres.")
+    for bit, genre in enumerate(genres):
+        genre.bit = bit
+    Genre.objects.bulk_update(genres, ["bit"])
+
+
+def compute_genre_masks(apps, schema_editor):
+    Movie = apps.get_model("mldb", "Movie")
+    masks = defaultdict(int)
+    for movie_id, bit in Movie.genres.through.objects.values_list("movie_id", "genre__bit").iterator():
+        masks[movie_id] |= 1 << bit
+    Movie.objects.bulk_update(
+        [Movie(id=movie_id, genre_mask=mask) for movie_id, mask in masks.items()], ["genre_mask"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("mldb", "0007_movie_title_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="genre",
+            name="bit",
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.RunPython(assign_genre_bits, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="genre",
+            name="bit",
+            field=models.PositiveSmallIntegerField(unique=True),
+        ),
+        migrations.AddField(
+            model_name="movie",
+            name="genre_mask",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(compute_genre_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.3 on 2026-10-17 01:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mldb", "0008_genre_bit_movie_genre_mask"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MovieNeighbor",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField()),
+                ("similarity", models.FloatField()),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="neighbors",
+                        to="mldb.movie",
+                    ),
+                ),
+                (
+                    "neighbor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="mldb.movie",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="movieneighbor",
+            constraint=models.UniqueConstraint(fields=("movie", "rank"), name="mldb_neighbor_movie_rank_uniq"),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.3 on 2026-10-17 01:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mldb", "0010_leaderboardentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MovieRatingBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("rating_count", models.IntegerField(default=0)),
+                ("rating_sum", models.IntegerField(default=0)),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rating_buckets",
+                        to="mldb.movie",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="movieratingbucket",
+            constraint=models.UniqueConstraint(fields=("day", "movie"), name="mldb_bucket_day_movie_uniq"),
+        ),
+    ]
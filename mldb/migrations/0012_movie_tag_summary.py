@@ -0,0 +1,40 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def compute_tag_summaries(apps, schema_editor):
+    Movie = apps.get_model("mldb", "Movie")
+    names = defaultdict(list)
+    links = Movie.tags.through.objects.order_by("movie_id", "tag__name").values_list("movie_id", "tag__name")
+    for movie_id, name in links.iterator():
+        names[movie_id].append(name)
+    Movie.objects.bulk_update(
+        [
+            Movie(id=movie_id, tag_summary=", ".join(tags[: settings.TAG_SUMMARY_SIZE]), tag_count=len(tags))
+            for movie_id, tags in names.items()
+        ],
+        ["tag_summary", "tag_count"],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("mldb", "0011_movieratingbucket"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="tag_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="movie",
+            name="tag_summary",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.RunPython(compute_tag_summaries, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,5 @@
+from typing import List
+
 from django.conf import settings
 from django.db import models
 
@@ -7,6 +9,21 @@ class Movie(models.Model):
     genres = models.ManyToManyField("Genre", related_name="movie_genres")
     tags = models.ManyToManyField("Tag", related_name="movie_tags")
     rating = models.DecimalField(max_digits=5, decimal_places=1, default=5.0)
+    # Running totals over dataset and user ratings that ``rating`` is derived from; the sum is in half stars
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    # Bumped by every change to the movie's representation; used for ETags and Last-Modified headers
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # OR of the bits of the movie's genres, kept in sync with ``genres`` for join-free genre filtering
+    genre_mask = models.BigIntegerField(default=0)
+    # The most applied tag names joined with ", " and the number of tags, kept in sync with ``tags`` so reads
+    # don't join the tag tables
+    tag_summary = models.TextField(blank=True, default="")
+    tag_count = models.IntegerField(default=0)
+
+    # Fields maintained only by F() updates and signal handlers, which a full save would overwrite with stale copies
+    DERIVED_FIELDS = ("rating", "rating_sum", "rating_count", "genre_mask", "tag_summary", "tag_count")
 
     class Meta:
         ordering = ["id"]
@@ -14,6 +31,22 @@ class Movie(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            update_fields = [
+                field.attname
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in self.DERIVED_FIELDS
+            ]
+        kwargs["update_fields"] = {*update_fields, "version", "updated_at"}
+        self.version = models.F("version") + 1
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=["version"])
+
 
 class UserRating(models.Model):
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
@@ -27,13 +60,131 @@ class UserRating(models.Model):
         return f"{self.user} rated {self.movie} as {self.rating}"
 
 
+class MovieLensRating(models.Model):
+    """A raw rating from the MovieLens dataset, keyed by the dataset's own user ids."""
+
+    ml_user_id = models.IntegerField()
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, db_index=False, related_name="movielens_ratings")
+    # Stored as twice the star rating so half stars fit in a smallint
+    rating = models.PositiveSmallIntegerField()
+    timestamp = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["ml_user_id", "movie"], name="mldb_mlrating_user_movie_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["movie", "rating"], name="mldb_mlrating_movie_rating_idx"),
+        ]
+
+    def __str__(self):
+        return f"MovieLens user {self.ml_user_id} rated {self.movie_id} as {self.rating / 2}"
+
+
+class MovieRatingBucket(models.Model):
+    """The ratings of one movie made on one day (UTC), for activity over time windows such as trending."""
+
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name="rating_buckets")
+    day = models.DateField()
+    rating_count = models.IntegerField(default=0)
+    # In half stars, like Movie.rating_sum
+    rating_sum = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "movie"], name="mldb_bucket_day_movie_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.movie_id} got {self.rating_count} ratings on {self.day}"
+
+
+class MovieNeighbor(models.Model):
+    """One of a movie's precomputed most similar movies, built by the ``build_similar_movies`` command."""
+
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, db_index=False, related_name="neighbors")
+    neighbor = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name="+")
+    # 0 for the most similar movie
+    rank = models.PositiveSmallIntegerField()
+    similarity = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["movie", "rank"], name="mldb_neighbor_movie_rank_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.neighbor_id} is similar to {self.movie_id} ({self.similarity:.2f})"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    A movie's score on the overall leaderboard (without a genre) or on one genre's leaderboard.
+
+    ``prior_mean`` is the leaderboard's mean rating when the entry was computed, stored so rating writes can
+    rescore the movie's entries without recomputing it.
+    """
+
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name="leaderboard_entries")
+    genre = models.ForeignKey(
+        "Genre", on_delete=models.CASCADE, null=True, blank=True, db_index=False, related_name="+"
+    )
+    score = models.FloatField()
+    prior_mean = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["genre", "movie"], name="mldb_leaderboard_genre_movie_uniq"),
+            models.UniqueConstraint(
+                fields=["movie"], condition=models.Q(genre__isnull=True), name="mldb_leaderboard_overall_movie_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["genre", "-score", "movie"], name="mldb_leaderboard_rank_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.movie_id} scores {self.score:.2f} in {self.genre_id or 'all genres'}"
+
+
+# Genre bits are positions in the signed 64-bit ``Movie.genre_mask``, so the sign bit is left unused
+GENRE_MASK_BITS = 63
+
+
 class Genre(models.Model):
     name = models.CharField(max_length=100, unique=True)
     movies = models.ManyToManyField(Movie, related_name="movie_genres")
+    bit = models.PositiveSmallIntegerField(unique=True)
 
     def __str__(self):
         return self.name
 
+    @property
+    def mask(self) -> int:
+        return 1 << self.bit
+
+    @staticmethod
+    def next_bits(count: int) -> List[int]:
+        """
+        Returns the bits to assign to new genres.
+
+        Args:
+            count: The number of genres to be created.
+
+        Returns:
+            The next ``count`` unused bits.
+        """
+        start = Genre.objects.aggregate(last=models.Max("bit"))["last"]
+        start = 0 if start is None else start + 1
+        if start + count > GENRE_MASK_BITS:
+            raise ValueError(f"Movie.genre_mask has room for at most {GENRE_MASK_BITS} genres.")
+        return list(range(start, start + count))
+
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            self.bit = self.next_bits(1)[0]
+        super().save(*args, **kwargs)
+
 
 class Tag(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -0,0 +1,193 @@
+from typing import Any, Dict, Set
+
+from django.contrib.auth.models import AbstractBaseUser
+from django.db import transaction
+from django.db.models import Case, Expression, F, FloatField, Value, When
+from django.db.models.functions import Cast, Now
+from django.db.models.lookups import GreaterThan
+
+from mldb.cache import bump_movie_versions
+from mldb.leaderboards import rescore_movies
+from mldb.models import Movie, UserRating
+from mldb.trending import record_ratings
+
+DEFAULT_RATING = 5.0
+
+
+def aggregate_fields(rating_sum: Any, rating_count: Any) -> Dict[str, Expression]:
+    """
+    Builds the update kwargs that set a movie's running rating aggregates and the average derived from them.
+
+    The movie's version and modification time are bumped as well, since its representation changes.
+
+    Args:
+        rating_sum: Expression for the new sum of ratings, in half stars.
+        rating_count: Expression for the new number of ratings.
+
+    Returns:
+        Keyword arguments for ``QuerySet.update``.
+    """
+    rating_sum = rating_sum if hasattr(rating_sum, "resolve_expression") else Value(rating_sum)
+    rating_count = rating_count if hasattr(rating_count, "resolve_expression") else Value(rating_count)
+    return {
+        "rating_sum": rating_sum,
+        "rating_count": rating_count,
+        "rating": Case(
+            When(
+                GreaterThan(rating_count, 0),
+                then=Cast(rating_sum, FloatField()) / Cast(rating_count * 2, FloatField()),
+            ),
+            default=Value(DEFAULT_RATING),
+            output_field=FloatField(),
+        ),
+        "version": F("version") + 1,
+        "updated_at": Now(),
+    }
+
+
+def apply_rating_delta(movie_id: int, sum_delta: int, count_delta: int) -> int:
+    """
+    Adjusts a movie's running rating aggregates in a single UPDATE.
+
+    The row lock taken by the UPDATE serializes concurrent writers to the same movie without locking the table,
+    so callers should run it in the same transaction as the ``UserRating`` write it accounts for.
+
+    Args:
+        movie_id: The movie to update.
+        sum_delta: The change to the sum of ratings, in half stars.
+        count_delta: The change to the number of ratings.
+
+    Returns:
+        The number of updated rows, 0 if the movie does not exist.
+    """
+    bump_movie_versions(movie_id)
+    updated = Movie.objects.filter(id=movie_id).update(
+        **aggregate_fields(F("rating_sum") + sum_delta, F("rating_count") + count_delta)
+    )
+    if updated:
+        rescore_movies(movie_id)
+    return updated
+
+
+def add_rating(movie_id: int, rating: int) -> int:
+    """Accounts for a new user rating of ``rating`` stars."""
+    return apply_rating_delta(movie_id, rating * 2, 1)
+
+
+def change_rating(movie_id: int, old_rating: int, new_rating: int) -> int:
+    """Accounts for a user changing their rating from ``old_rating`` to ``new_rating`` stars."""
+    return apply_rating_delta(movie_id, (new_rating - old_rating) * 2, 0)
+
+
+def remove_rating(movie_id: int, rating: int) -> int:
+    """Accounts for a deleted user rating of ``rating`` stars."""
+    return apply_rating_delta(movie_id, -rating * 2, -1)
+
+
+def create_user_rating(user: AbstractBaseUser, movie_id: int, rating: int) -> UserRating:
+    """
+    Records a user's first rating of a movie with one aggregate UPDATE and one INSERT.
+
+    The rating also counts as today's activity for trending. The UPDATE doubles as the existence check for the
+    movie, so no separate lookup is needed.
+
+    Args:
+        user: The rating user.
+        movie_id: The rated movie.
+        rating: The rating, in stars.
+
+    Returns:
+        The created rating.
+
+    Raises:
+        Movie.DoesNotExist: If the movie does not exist.
+        IntegrityError: If the user has already rated the movie.
+    """
+    with transaction.atomic():
+        if not add_rating(movie_id, rating):
+            raise Movie.DoesNotExist
+        user_rating = UserRating.objects.create(user=user, movie_id=movie_id, rating=rating)
+        record_ratings({movie_id: rating})
+    return user_rating
+
+
+def upsert_user_rating(user: AbstractBaseUser, movie_id: int, rating: int) -> UserRating:
+    """
+    Creates or replaces a user's rating of a movie.
+
+    The movie row is locked before the previous rating is read, so concurrent upserts of the same rating are
+    serialized and each one sees the rating committed by the other. The aggregates are then adjusted by the delta
+    and the rating is written with a single ``INSERT ... ON CONFLICT (movie, user) DO UPDATE``.
+
+    Args:
+        user: The rating user.
+        movie_id: The rated movie.
+        rating: The rating, in stars.
+
+    Returns:
+        The created or updated rating.
+
+    Raises:
+        Movie.DoesNotExist: If the movie does not exist.
+    """
+    with transaction.atomic():
+        if not Movie.objects.select_for_update().filter(id=movie_id).values_list("id", flat=True):
+            raise Movie.DoesNotExist
+        previous = UserRating.objects.filter(movie_id=movie_id, user=user).values_list("rating", flat=True).first()
+        if previous is None:
+            add_rating(movie_id, rating)
+        else:
+            change_rating(movie_id, previous, rating)
+        (user_rating,) = UserRating.objects.bulk_create(
+            [UserRating(user=user, movie_id=movie_id, rating=rating)],
+            update_conflicts=True,
+            unique_fields=["movie", "user"],
+            update_fields=["rating"],
+        )
+        if previous is None:
+            record_ratings({movie_id: rating})
+    return user_rating
+
+
+def upsert_user_ratings(user: AbstractBaseUser, ratings: Dict[int, int]) -> Set[int]:
+    """
+    Creates or replaces many ratings of one user in a single transaction.
+
+    The rated movies are locked in id order with one ``id__in`` query, their aggregates are adjusted with one
+    UPDATE using per-movie CASE deltas, and the ratings are written with one bulk upsert.
+
+    Args:
+        user: The rating user.
+        ratings: Mapping of movie ids to ratings, in stars.
+
+    Returns:
+        The ids of the movies that exist and were rated; ratings of other movies are ignored.
+    """
+    with transaction.atomic():
+        movie_ids = set(
+            Movie.objects.select_for_update().filter(id__in=ratings).order_by("id").values_list("id", flat=True)
+        )
+        if not movie_ids:
+            return movie_ids
+        previous = dict(UserRating.objects.filter(user=user, movie_id__in=movie_ids).values_list("movie_id", "rating"))
+
+        sum_deltas = [
+            When(id=movie_id, then=Value((ratings[movie_id] - previous.get(movie_id, 0)) * 2)) for movie_id in movie_ids
+        ]
+        count_deltas = [When(id=movie_id, then=Value(1)) for movie_id in movie_ids if movie_id not in previous]
+        Movie.objects.filter(id__in=movie_ids).update(
+            **aggregate_fields(
+                F("rating_sum") + Case(*sum_deltas, default=Value(0)),
+                F("rating_count") + Case(*count_deltas, default=Value(0)),
+            )
+        )
+        rescore_movies(*movie_ids)
+        UserRating.objects.bulk_create(
+            [UserRating(user=user, movie_id=movie_id, rating=ratings[movie_id]) for movie_id in movie_ids],
+            update_conflicts=True,
+            unique_fields=["movie", "user"],
+            update_fields=["rating"],
+        )
+        record_ratings({movie_id: ratings[movie_id] for movie_id in movie_ids if movie_id not in previous})
+        bump_movie_versions(*movie_ids)
+    return movie_ids
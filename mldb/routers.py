@@ -0,0 +1,84 @@
+"""
+Read/write routing between the primary database and its read replicas.
+
+Reads of ``mldb`` models go to a replica only inside ``replica_reads``, which ``replica_routing_middleware`` opens
+around GET and HEAD requests, so the reads that writes depend on, such as those of rating upserts, always see the
+primary. One replica is chosen per request, so all of a response is read from the same snapshot. Once anything is
+written in a ``replica_reads`` block, its later reads go back to the primary, and the middleware keeps the client's
+requests on the primary for ``READ_YOUR_WRITES_WINDOW`` seconds so they don't read from a lagging replica.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+ROUTED_APP_LABELS = {"mldb"}
+
+_read_alias: ContextVar[Optional[str]] = ContextVar("mldb_read_alias", default=None)
+_wrote: ContextVar[bool] = ContextVar("mldb_wrote", default=False)
+
+
+def replica_database() -> str:
+    """Returns a randomly chosen replica alias, or the primary's if no replicas are configured."""
+    return random.choice(settings.REPLICA_DATABASES) if settings.REPLICA_DATABASES else DEFAULT_DB_ALIAS
+
+
+def read_database() -> str:
+    """Returns the alias that ``mldb`` reads in the current context go to."""
+    alias = _read_alias.get()
+    return DEFAULT_DB_ALIAS if alias is None or _wrote.get() else alias
+
+
+def wrote_to_primary() -> bool:
+    """Whether ``mldb`` models were written in the current ``replica_reads`` block."""
+    return _wrote.get()
+
+
+@contextmanager
+def replica_reads(enabled: bool = True) -> Iterator[str]:
+    """
+    Sends the ``mldb`` reads in the block to one replica, until something is written.
+
+    Args:
+        enabled: Whether to read from a replica; if False, reads go to the primary and only writes are tracked.
+
+    Yields:
+        The alias reads go to at the start of the block.
+    """
+    alias_token = _read_alias.set(replica_database() if enabled else None)
+    wrote_token = _wrote.set(False)
+    try:
+        yield read_database()
+    finally:
+        _wrote.reset(wrote_token)
+        _read_alias.reset(alias_token)
+
+
+class ReplicaRouter:
+    """Routes ``mldb`` writes to the primary and its reads as ``replica_reads`` directs."""
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        if model._meta.app_label not in ROUTED_APP_LABELS:
+            return None
+        return read_database()
+
+    def db_for_write(self, model, **hints) -> Optional[str]:
+        if model._meta.app_label not in ROUTED_APP_LABELS:
+            return None
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        # Replicas hold the primary's rows, so instances read from any of them can be related
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints) -> Optional[bool]:
+        # Replicas receive the schema through replication
+        return False if db in settings.REPLICA_DATABASES else None
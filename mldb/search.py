@@ -0,0 +1,107 @@
+"""
+Ranked movie title search.
+
+On PostgreSQL titles are matched with full-text search backed by a GIN index on ``to_tsvector('english', title)``,
+plus trigram word similarity backed by a ``gin_trgm_ops`` index for typo tolerance. On SQLite they are matched
+against an FTS5 table kept in sync with the movies table by ``index_movie`` and ``rebuild_search_index``.
+Every query term is matched as a prefix, so partial input works for search-as-you-type.
+"""
+
+import re
+from typing import List, Optional
+
+from django.db import connection, connections
+
+from mldb.routers import read_database
+
+FTS_TABLE = "mldb_movie_fts"
+
+GENRE_FILTER = """
+    AND EXISTS (
+        SELECT 1 FROM mldb_movie_genres mg JOIN mldb_genre g ON g.id = mg.genre_id
+        WHERE mg.movie_id = m.id AND g.name = %s
+    )
+"""
+
+POSTGRESQL_SEARCH = """
+    SELECT m.id FROM mldb_movie m
+    WHERE (to_tsvector('english'::regconfig, m.title) @@ to_tsquery('english'::regconfig, %s) OR %s <%% m.title)
+    {genre_filter}
+    ORDER BY ts_rank(to_tsvector('english'::regconfig, m.title), to_tsquery('english'::regconfig, %s))
+        + word_similarity(%s, m.title) DESC, m.id
+    LIMIT %s OFFSET %s
+"""
+
+SQLITE_SEARCH = """
+    SELECT m.id FROM mldb_movie_fts JOIN mldb_movie m ON m.id = mldb_movie_fts.rowid
+    WHERE mldb_movie_fts MATCH %s
+    {genre_filter}
+    ORDER BY mldb_movie_fts.rank, m.id
+    LIMIT %s OFFSET %s
+"""
+
+
+def search_terms(query: str) -> List[str]:
+    """Splits a search query into lowercase word terms, dropping punctuation and operators."""
+    return re.findall(r"\w+", query.lower())
+
+
+def search_movie_ids(query: str, genre: Optional[str] = None, limit: int = 10, offset: int = 0) -> List[int]:
+    """
+    Returns the ids of the movies whose titles best match the query, best match first.
+
+    Args:
+        query: The user's search input.
+        genre: Only return movies with this genre name, if given.
+        limit: The maximum number of ids to return.
+        offset: The number of best matches to skip.
+
+    Returns:
+        The matching movie ids, ordered by rank.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    genre_filter = GENRE_FILTER if genre else ""
+    genre_params = [genre] if genre else []
+    # Raw SQL bypasses the database router, so the search runs where ORM reads would
+    database = connections[read_database()]
+    if database.vendor == "postgresql":
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        text = " ".join(terms)
+        sql = POSTGRESQL_SEARCH.format(genre_filter=genre_filter)
+        params = [tsquery, text, *genre_params, tsquery, text, limit, offset]
+    else:
+        match = " ".join(f'"{term}"*' for term in terms)
+        sql = SQLITE_SEARCH.format(genre_filter=genre_filter)
+        params = [match, *genre_params, limit, offset]
+
+    with database.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def index_movie(movie_id: int, title: Optional[str]) -> None:
+    """
+    Updates the SQLite search index entry of one movie; PostgreSQL indexes are maintained by the database.
+
+    Args:
+        movie_id: The movie id.
+        title: The movie's title, or None to remove it from the index.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [movie_id])
+        if title is not None:
+            cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, title) VALUES (%s, %s)", [movie_id, title])
+
+
+def rebuild_search_index() -> None:
+    """Repopulates the SQLite search index from the movies table, for use after bulk loads."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, title) SELECT id, title FROM mldb_movie")
@@ -0,0 +1,124 @@
+from typing import List
+
+from django.db.models import F
+from django.db.models.functions import Now
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from mldb.cache import bump_catalog_version, bump_movie_versions
+from mldb.genres import sync_genre_masks
+from mldb.models import Genre, Movie, Tag
+from mldb.search import index_movie
+from mldb.tags import sync_tag_summaries
+
+
+@receiver(post_save, sender=Movie)
+def invalidate_saved_movie(sender, instance, **kwargs):
+    # New movies and title changes can move movies between list pages, so lists are invalidated too
+    bump_movie_versions(instance.pk)
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Movie)
+def index_saved_movie(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "title" in update_fields:
+        index_movie(instance.pk, instance.title)
+
+
+@receiver(post_delete, sender=Movie)
+def invalidate_deleted_movie(sender, instance, **kwargs):
+    bump_movie_versions(instance.pk)
+    bump_catalog_version()
+
+
+@receiver(post_delete, sender=Movie)
+def unindex_deleted_movie(sender, instance, **kwargs):
+    index_movie(instance.pk, None)
+
+
+def relinked_movie_ids(instance, reverse, pk_set) -> List[int]:
+    """Returns the ids of the movies whose genre or tag links an ``m2m_changed`` signal reports."""
+    if not reverse:
+        return [instance.pk]
+    return list(pk_set) if pk_set is not None else getattr(instance, "_cleared_movie_ids", [])
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+@receiver(m2m_changed, sender=Movie.tags.through)
+def collect_cleared_movies(sender, instance, action, reverse, **kwargs):
+    if action == "pre_clear" and reverse:
+        # Clearing a genre's or tag's movies doesn't report them, so they are collected before the links go
+        links = sender.objects.filter(**{instance._meta.model_name: instance})
+        instance._cleared_movie_ids = list(links.values_list("movie_id", flat=True))
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def sync_relinked_genre_masks(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith("post_"):
+        sync_genre_masks(*relinked_movie_ids(instance, reverse, pk_set))
+
+
+@receiver(m2m_changed, sender=Movie.tags.through)
+def sync_relinked_tag_summaries(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith("post_"):
+        sync_tag_summaries(*relinked_movie_ids(instance, reverse, pk_set))
+
+
+@receiver(post_save, sender=Tag)
+def resummarize_renamed_tag(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and "name" not in update_fields):
+        return
+    movie_ids = list(instance.movie_tags.values_list("id", flat=True))
+    sync_tag_summaries(*movie_ids)
+    Movie.objects.filter(pk__in=movie_ids).update(version=F("version") + 1, updated_at=Now())
+    bump_movie_versions(*movie_ids)
+    bump_catalog_version()
+
+
+@receiver(pre_delete, sender=Tag)
+def collect_deleted_tag_movies(sender, instance, **kwargs):
+    # Deleting a tag cascades to its links without m2m signals
+    instance._tagged_movie_ids = list(instance.movie_tags.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def resummarize_deleted_tag(sender, instance, **kwargs):
+    movie_ids = getattr(instance, "_tagged_movie_ids", [])
+    sync_tag_summaries(*movie_ids)
+    Movie.objects.filter(pk__in=movie_ids).update(version=F("version") + 1, updated_at=Now())
+    bump_movie_versions(*movie_ids)
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Genre)
+def invalidate_renamed_genre(sender, instance, created, update_fields=None, **kwargs):
+    # Genre names are rendered in every linked movie, while their bits and masks stay the same
+    if created or (update_fields is not None and "name" not in update_fields):
+        return
+    movie_ids = list(instance.movie_genres.values_list("id", flat=True))
+    Movie.objects.filter(pk__in=movie_ids).update(version=F("version") + 1, updated_at=Now())
+    bump_movie_versions(*movie_ids)
+    bump_catalog_version()
+
+
+@receiver(post_delete, sender=Genre)
+def unmask_deleted_genre(sender, instance, **kwargs):
+    # Deleting a genre cascades to its links without m2m signals, and its bit may be reused by a later genre
+    masked = Movie.objects.alias(masked=F("genre_mask").bitand(instance.mask)).filter(masked__gt=0)
+    movie_ids = list(masked.values_list("id", flat=True))
+    Movie.objects.filter(pk__in=movie_ids).update(
+        genre_mask=F("genre_mask") - instance.mask, version=F("version") + 1, updated_at=Now()
+    )
+    bump_movie_versions(*movie_ids)
+    bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+@receiver(m2m_changed, sender=Movie.tags.through)
+def invalidate_relinked_movie(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    movie_ids = relinked_movie_ids(instance, reverse, pk_set)
+    Movie.objects.filter(pk__in=movie_ids).update(version=F("version") + 1, updated_at=Now())
+    bump_movie_versions(*movie_ids)
+    bump_catalog_version()
@@ -0,0 +1,142 @@
+"""
+Item-item movie similarity over the MovieLens ratings.
+
+Ratings are collected into a sparse movie × user CSR matrix whose rows are L2-normalized, so the cosine similarity
+of two movies is the dot product of their rows. Similarities are computed for one block of movies at a time, which
+bounds memory by the block size instead of by the squared number of movies, and blocks can be spread over worker
+processes. With adjusted cosine each rating is first centered on its user's mean rating, which removes the bias of
+generous and harsh raters.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+METRICS = ["cosine", "adjusted-cosine"]
+
+# (movie rows, neighbor rows, ranks, similarities) of a block of movies, as parallel arrays
+Neighbors = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+# The normalized matrix and its transpose, set once per worker process by ``init_worker``
+matrix: Optional[sparse.csr_matrix] = None
+transposed: Optional[sparse.csr_matrix] = None
+
+
+def rating_matrix(chunks: Iterable[pd.DataFrame], movie_ids: np.ndarray) -> sparse.csr_matrix:
+    """
+    Collects streamed ratings into a sparse movie × user matrix.
+
+    Args:
+        chunks: Frames with ``userId``, ``movieId`` and ``rating`` columns.
+        movie_ids: The sorted ids of the movies that become the matrix rows; ratings of other movies are dropped.
+
+    Returns:
+        A float32 CSR matrix with one row per movie id and one column per user id.
+    """
+    rows, columns, values = [], [], []
+    for chunk in chunks:
+        chunk_movie_ids = chunk["movieId"].to_numpy()
+        positions = np.minimum(np.searchsorted(movie_ids, chunk_movie_ids), max(len(movie_ids) - 1, 0))
+        known = movie_ids[positions] == chunk_movie_ids if len(movie_ids) else np.zeros(len(chunk), dtype=bool)
+        rows.append(positions[known].astype(np.int32))
+        columns.append(chunk["userId"].to_numpy()[known].astype(np.int32))
+        values.append(chunk["rating"].to_numpy()[known].astype(np.float32))
+
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int32)
+    columns = np.concatenate(columns) if columns else np.empty(0, dtype=np.int32)
+    values = np.concatenate(values) if values else np.empty(0, dtype=np.float32)
+    n_users = int(columns.max()) + 1 if len(columns) else 0
+    return sparse.csr_matrix((values, (rows, columns)), shape=(len(movie_ids), n_users), dtype=np.float32)
+
+
+def normalize(ratings: sparse.csr_matrix, metric: str = "cosine", min_ratings: int = 1) -> sparse.csr_matrix:
+    """
+    Prepares a rating matrix for similarity computation.
+
+    Args:
+        ratings: The movie × user rating matrix.
+        metric: ``cosine`` or ``adjusted-cosine``.
+        min_ratings: Movies with fewer ratings get empty rows, so they have no neighbors and are nobody's neighbor.
+
+    Returns:
+        A matrix with unit-length rows, centered on user means for adjusted cosine.
+    """
+    ratings = ratings.copy()
+    if metric == "adjusted-cosine":
+        sums = np.bincount(ratings.indices, weights=ratings.data, minlength=ratings.shape[1])
+        counts = np.bincount(ratings.indices, minlength=ratings.shape[1])
+        ratings.data -= (sums / np.maximum(counts, 1)).astype(np.float32)[ratings.indices]
+
+    norms = np.sqrt(np.asarray(ratings.multiply(ratings).sum(axis=1)).ravel())
+    scale = np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)
+    scale[np.diff(ratings.indptr) < min_ratings] = 0
+    normalized = sparse.diags(scale.astype(np.float32)) @ ratings
+    normalized.eliminate_zeros()
+    return normalized.tocsr()
+
+
+def init_worker(normalized: sparse.csr_matrix) -> None:
+    global matrix, transposed
+    matrix = normalized
+    transposed = normalized.T.tocsr()
+
+
+def block_neighbors(start: int, end: int, k: int) -> Neighbors:
+    """
+    Finds the ``k`` most similar movies of the movies in rows ``start`` to ``end`` of the worker's matrix.
+
+    Args:
+        start: The first row of the block.
+        end: The row after the last row of the block.
+        k: The number of neighbors to keep per movie.
+
+    Returns:
+        The neighbors with a positive similarity, best first for each movie.
+    """
+    scores = (matrix[start:end] @ transposed).toarray()
+    block_rows = np.arange(end - start)
+    # A movie is not its own neighbor
+    scores[block_rows, block_rows + start] = 0
+
+    k = min(k, scores.shape[1] - 1)
+    if k < 1:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, np.empty(0, dtype=np.float32)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    keep = top_scores > 0
+    movies = np.broadcast_to((block_rows + start)[:, None], top.shape)
+    ranks = np.broadcast_to(np.arange(k)[None, :], top.shape)
+    return movies[keep], top[keep], ranks[keep], top_scores[keep]
+
+
+def top_k_neighbors(normalized: sparse.csr_matrix, k: int, block_size: int, workers: int = 1) -> Iterator[Neighbors]:
+    """
+    Computes the top ``k`` neighbors of every movie, block by block.
+
+    Args:
+        normalized: The matrix returned by ``normalize``.
+        k: The number of neighbors to keep per movie.
+        block_size: The number of movies whose similarities are held in memory at once, per worker.
+        workers: The number of worker processes; 1 computes in the current process.
+
+    Yields:
+        The neighbors of each block of movies.
+    """
+    starts = range(0, normalized.shape[0], block_size)
+    ends = [min(start + block_size, normalized.shape[0]) for start in starts]
+    if workers == 1:
+        init_worker(normalized)
+        yield from map(block_neighbors, starts, ends, repeat(k))
+        return
+
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(normalized,)) as pool:
+        yield from pool.map(block_neighbors, starts, ends, repeat(k))
@@ -0,0 +1,40 @@
+"""Helpers for ``Movie.tag_summary`` and ``Movie.tag_count``, the denormalized view of a movie's tags."""
+
+from collections import defaultdict
+from typing import Dict, List, Set
+
+from django.conf import settings
+
+from mldb.models import Movie
+
+TAG_SEPARATOR = ", "
+
+
+def summarize(names: List[str]) -> str:
+    """Joins the first ``TAG_SUMMARY_SIZE`` tag names into a summary."""
+    return TAG_SEPARATOR.join(names[: settings.TAG_SUMMARY_SIZE])
+
+
+def sync_tag_summaries(*movie_ids: int) -> None:
+    """
+    Recomputes the tag summaries and counts of the given movies from their tag links.
+
+    Tags that stay linked keep their place in the summary, which the loader orders by how often each tag was
+    applied; newly linked tags follow in name order.
+
+    Args:
+        *movie_ids: The movies whose tags changed.
+    """
+    linked: Dict[int, Set[str]] = defaultdict(set)
+    for movie_id, name in Movie.tags.through.objects.filter(movie_id__in=movie_ids).values_list(
+        "movie_id", "tag__name"
+    ):
+        linked[movie_id].add(name)
+
+    current = Movie.objects.filter(pk__in=movie_ids).values_list("id", "tag_summary", "tag_count")
+    for movie_id, tag_summary, tag_count in current:
+        names = linked[movie_id]
+        kept = list(dict.fromkeys(name for name in tag_summary.split(TAG_SEPARATOR) if name in names))
+        summary = summarize(kept + sorted(names.difference(kept)))
+        if (summary, len(names)) != (tag_summary, tag_count):
+            Movie.objects.filter(pk=movie_id).update(tag_summary=summary, tag_count=len(names))
@@ -1,9 +1,46 @@
+import base64
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import tempfile
+from typing import Any, Dict
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+from asgiref.sync import async_to_sync
 from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 
-from mldb.models import Genre, Movie, UserRating
+from mldb.api.views import MovieListCreateView
+from mldb.cache import bump_movie_versions, movie_versions
+from mldb.exporting import export_movies, shard_bounds, shard_path
+from mldb.management.commands.benchmark_api import benchmark_settings, session_cookies
+from mldb.management.commands.load_movielens_data import (
+    Command as LoadMovielensDataCommand,
+)
+from mldb.metrics import RequestMetricsMiddleware
+from mldb.middleware import PRIMARY_COOKIE, replica_routing_middleware
+from mldb.models import (
+    Genre,
+    LeaderboardEntry,
+    Movie,
+    MovieLensRating,
+    MovieRatingBucket,
+    Tag,
+    UserRating,
+)
+from mldb.routers import ReplicaRouter, replica_reads
 
 User = get_user_model()
 
@@ -24,6 +61,87 @@ class MovieRatingViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(UserRating.objects.filter(user=self.user, movie=self.movie).exists())
 
+    def test_post_rating_updates_aggregates(self) -> None:
+        Movie.objects.filter(id=self.movie.id).update(rating_sum=7, rating_count=1)
+        url = reverse("movie-rate", kwargs={"movie_id": self.movie.id})
+        response = self.client.post(url, {"movie_id": self.movie.id, "rating": 4}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.movie.refresh_from_db()
+        self.assertEqual((self.movie.rating_sum, self.movie.rating_count), (15, 2))
+        self.assertEqual(float(self.movie.rating), 3.8)
+
+    def test_post_rating_twice(self) -> None:
+        url = reverse("movie-rate", kwargs={"movie_id": self.movie.id})
+        self.client.post(url, {"rating": 5}, format="json")
+        response = self.client.post(url, {"rating": 3}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.movie.refresh_from_db()
+        self.assertEqual((self.movie.rating_sum, self.movie.rating_count), (10, 1))
+
+    def test_post_rating_unknown_movie(self) -> None:
+        url = reverse("movie-rate", kwargs={"movie_id": self.movie.id + 1})
+        response = self.client.post(url, {"rating": 5}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(UserRating.objects.exists())
+
+    def test_put_rating_upserts(self) -> None:
+        url = reverse("movie-rate", kwargs={"movie_id": self.movie.id})
+        response = self.client.put(url, {"rating": 2}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(url, {"rating": 4}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["rating"], 4)
+        self.assertEqual(UserRating.objects.get(user=self.user, movie=self.movie).rating, 4)
+        self.movie.refresh_from_db()
+        self.assertEqual((self.movie.rating_sum, self.movie.rating_count), (8, 1))
+
+
+class RatingBatchViewTests(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.movies = [Movie.objects.create(title=f"Movie {i}") for i in range(3)]
+        UserRating.objects.create(user=self.user, movie=self.movies[0], rating=1)
+        Movie.objects.filter(id=self.movies[0].id).update(rating_sum=2, rating_count=1)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("rating-batch")
+
+    def test_post_batch(self) -> None:
+        data = [
+            {"movie_id": self.movies[0].id, "rating": 3},
+            {"movie_id": self.movies[1].id, "rating": 4},
+            {"movie_id": 999, "rating": 5},
+        ]
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["status"] for item in response.data["results"]], ["saved", "saved", "not_found"])
+        self.assertEqual(
+            list(UserRating.objects.order_by("movie_id").values_list("movie_id", "rating")),
+            [(self.movies[0].id, 3), (self.movies[1].id, 4)],
+        )
+        self.assertEqual(
+            list(Movie.objects.values_list("rating_sum", "rating_count")),
+            [(6, 1), (8, 1), (0, 0)],
+        )
+
+    def test_post_batch_rejects_repeated_movies(self) -> None:
+        data = [
+            {"movie_id": self.movies[1].id, "rating": 3},
+            {"movie_id": self.movies[2].id, "rating": 3},
+            {"movie_id": self.movies[1].id, "rating": 4},
+        ]
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(self.movies[1].id), response.data["non_field_errors"][0])
+        self.assertEqual(UserRating.objects.count(), 1)
+
+    @override_settings(RATING_BATCH_MAX_SIZE=2)
+    def test_post_batch_too_large(self) -> None:
+        data = [{"movie_id": movie.id, "rating": 3} for movie in self.movies]
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(UserRating.objects.count(), 1)
+
 
 class MovieListCreateViewTests(APITestCase):
     def setUp(self) -> None:
@@ -41,12 +159,744 @@ class MovieListCreateViewTests(APITestCase):
         results = response.data.get("results")
         self.assertEqual(len(results), 1)
 
+    def test_list_movies_not_modified(self) -> None:
+        etag = self.client.get(self.url, format="json")["ETag"]
+        response = self.client.get(self.url, format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(self.url, {"page_size": 5}, format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_movies_with_cursor(self) -> None:
+        for title in ["C", "A", "B"]:
+            Movie.objects.create(title=title)
+        titles = []
+        url = self.url + "?pagination=cursor&ordering=title&page_size=2"
+        while url:
+            # Last modification time, movies and genres; no COUNT query
+            with self.assertNumQueries(3):
+                response = self.client.get(url, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            titles += [movie["title"] for movie in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(titles, ["A", "B", "C", "Initial Movie"])
+
+    def test_cursor_pages_through_tied_titles(self) -> None:
+        Movie.objects.all().delete()
+        for title in ["B", "A", "B", "B", "C"]:
+            Movie.objects.create(title=title)
+        expected = list(Movie.objects.order_by("-title", "-id").values_list("id", flat=True))
+        pages = []
+        url = self.url + "?pagination=cursor&ordering=-title&page_size=2"
+        while url:
+            response = self.client.get(url, format="json")
+            pages.append([movie["id"] for movie in response.data["results"]])
+            url = response.data["next"]
+        self.assertEqual(sum(pages, []), expected)
+
+        cursor = parse_qs(urlparse(response.data["previous"]).query)["cursor"][0]
+        params = parse_qs(base64.b64decode(cursor).decode())
+        self.assertEqual(params["p"], ["A", str(expected[4])])
+        response = self.client.get(response.data["previous"], format="json")
+        self.assertEqual([movie["id"] for movie in response.data["results"]], pages[-2])
+        # A cursor holding only an id doesn't resume a title ordering
+        params = {"pagination": "cursor", "ordering": "title", "cursor": base64.b64encode(b"p=1").decode()}
+        self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_movies_with_estimated_count(self) -> None:
+        response = self.client.get(self.url, {"count": "estimated"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 1)
+
     def test_create_movie(self) -> None:
         data = {"title": "New Movie", "genres": [self.genre.name], "tags": "", "rating": 4}
         response = self.client.post(self.url, data, format="json")
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(Movie.objects.filter(title="New Movie").exists())
 
+    def test_list_movies_by_genre_mask(self) -> None:
+        drama = Genre.objects.create(name="Drama")
+        both = Movie.objects.create(title="Both")
+        both.genres.add(self.genre, drama)
+        Movie.objects.create(title="Neither")
+
+        def titles(**params):
+            return sorted(movie["title"] for movie in self.client.get(self.url, params).data["results"])
+
+        self.assertEqual(titles(genres_all="Comedy,Drama"), ["Both"])
+        self.assertEqual(titles(genres_any="Drama,Comedy"), ["Both", "Initial Movie"])
+        self.assertEqual(titles(genres_none="Drama"), ["Initial Movie", "Neither"])
+        self.assertEqual(titles(genres_all="Comedy,Western"), [])
+
+        response = self.client.patch(
+            reverse("movie-detail-update", kwargs={"pk": both.id}), {"genres": ["Drama"]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(titles(genres_any="Comedy"), ["Initial Movie"])
+        drama.delete()
+        self.assertEqual(Movie.objects.get(id=both.id).genre_mask, 0)
+
+
+class GenreAdminTests(TestCase):
+    def test_add_genre_assigns_bit(self) -> None:
+        Genre.objects.create(name="Drama")
+        self.client.force_login(User.objects.create_superuser(username="admin", password="12345"))
+        movie = Movie.objects.create(title="Clue")
+        response = self.client.post(reverse("admin:mldb_genre_add"), {"name": "Comedy", "movies": [movie.id]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Genre.objects.get(name="Comedy").bit, Genre.objects.get(name="Drama").bit + 1)
+
+    def test_rename_genre_updates_movies(self) -> None:
+        genre = Genre.objects.create(name="Drama")
+        movie = Movie.objects.create(title="Clue")
+        movie.genres.add(genre)
+        version = Movie.objects.get(pk=movie.pk).version
+        self.client.force_login(User.objects.create_superuser(username="admin", password="12345"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("admin:mldb_genre_change", args=[genre.id]), {"name": "Mystery", "movies": [movie.id]}
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Movie.objects.get(pk=movie.pk).version, version + 1)
+
+
+class MovieAdminTests(TestCase):
+    def test_derived_fields_are_read_only(self) -> None:
+        movie = Movie.objects.create(title="Clue")
+        Movie.objects.filter(pk=movie.pk).update(rating=3, rating_sum=6, rating_count=1)
+        genre, tag = Genre.objects.create(name="Mystery"), Tag.objects.create(name="board game")
+        self.client.force_login(User.objects.create_superuser(username="admin", password="12345"))
+
+        response = self.client.post(
+            reverse("admin:mldb_movie_change", args=[movie.id]),
+            {
+                "title": "Clue (1985)",
+                "genres": [genre.id],
+                "tags": [tag.id],
+                "rating": 1,
+                "rating_sum": 0,
+                "rating_count": 9,
+                "version": 99,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        movie = Movie.objects.get(pk=movie.pk)
+        self.assertEqual((movie.title, movie.rating, movie.rating_sum, movie.rating_count), ("Clue (1985)", 3, 6, 1))
+        self.assertNotEqual(movie.version, 99)
+
+
+class MovieSearchViewTests(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        comedy = Genre.objects.create(name="Comedy")
+        self.star_wars = Movie.objects.create(title="Star Wars (1977)")
+        self.stardust = Movie.objects.create(title="Stardust (2007)")
+        self.stardust.genres.add(comedy)
+        Movie.objects.create(title="Heat (1995)")
+        self.url = reverse("movie-search")
+
+    def test_search_matches_prefixes(self) -> None:
+        response = self.client.get(self.url, {"q": "sta"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({movie["id"] for movie in response.data["results"]}, {self.star_wars.id, self.stardust.id})
+
+        response = self.client.get(self.url, {"q": "star war"})
+        self.assertEqual([movie["id"] for movie in response.data["results"]], [self.star_wars.id])
+
+    def test_search_by_genre_and_page(self) -> None:
+        response = self.client.get(self.url, {"q": "sta", "genre": "Comedy"})
+        self.assertEqual([movie["id"] for movie in response.data["results"]], [self.stardust.id])
+
+        response = self.client.get(self.url, {"q": "sta", "page_size": 1})
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNotNone(response.data["next"])
+        self.assertIsNone(self.client.get(response.data["next"]).data["next"])
+
+    def test_search_follows_title_changes(self) -> None:
+        self.star_wars.title = "Star Wars: Episode IV - A New Hope (1977)"
+        self.star_wars.save()
+        response = self.client.get(self.url, {"q": "new hope"})
+        self.assertEqual([movie["id"] for movie in response.data["results"]], [self.star_wars.id])
+
+        self.star_wars.delete()
+        self.assertEqual(self.client.get(self.url, {"q": "new hope"}).data["results"], [])
+
+    def test_search_requires_query(self) -> None:
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MovieBatchViewTests(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        genre = Genre.objects.create(name="Drama")
+        self.movies = [Movie.objects.create(title=f"Movie {i}") for i in range(3)]
+        for movie in self.movies:
+            movie.genres.add(genre)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("movie-batch")
+
+    def test_batch_preserves_order_and_reports_missing(self) -> None:
+        ids = [self.movies[2].id, 0, self.movies[0].id, self.movies[2].id]
+        for fast in (True, False):
+            with self.subTest(fast=fast), self.settings(MOVIE_FAST_READS=fast):
+                # Movies and genres
+                with self.assertNumQueries(2):
+                    response = self.client.get(self.url, {"ids": ",".join(map(str, ids))})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual([movie["id"] for movie in response.data["results"]], [ids[0], ids[2]])
+                self.assertEqual(response.data["results"][0]["genres"], ["Drama"])
+                self.assertEqual(response.data["missing"], [0])
+
+    @override_settings(MOVIE_BATCH_MAX_SIZE=2)
+    def test_batch_rejects_invalid_ids(self) -> None:
+        for ids in ["", "1,x", "1,2,3", f"1,{2**63}"]:
+            with self.subTest(ids=ids):
+                response = self.client.get(self.url, {"ids": ids})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn("ids", response.data)
+
+
+class SimilarMoviesTests(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        for movie_id, title in [(1, "Toy Story"), (2, "Toy Story 2"), (3, "Heat"), (4, "Unrated")]:
+            Movie.objects.create(id=movie_id, title=title)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.ratings_path = os.path.join(self.tmp_dir.name, "ratings.csv")
+        with open(self.ratings_path, "w") as f:
+            f.write(
+                "userId,movieId,rating,timestamp\n"
+                "1,1,5.0,0\n1,2,4.5,0\n2,1,4.0,0\n2,2,4.0,0\n3,3,5.0,0\n3,1,1.0,0\n4,9,3.0,0\n"
+            )
+
+    def test_build_and_serve_neighbors(self) -> None:
+        call_command(
+            "build_similar_movies",
+            ratings_path=self.ratings_path,
+            min_ratings=1,
+            block_size=2,
+            chunk_size=3,
+            workers=1,
+            stdout=io.StringIO(),
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("movie-similar", kwargs={"pk": 1}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([movie["id"] for movie in response.data], [2, 3])
+        self.assertGreater(response.data[0]["similarity"], response.data[1]["similarity"])
+        self.assertEqual(response.data[0]["title"], "Toy Story 2")
+
+        self.assertEqual(self.client.get(reverse("movie-similar", kwargs={"pk": 4})).data, [])
+        response = self.client.get(reverse("movie-similar", kwargs={"pk": 5}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(LEADERBOARD_PRIOR_WEIGHT=2)
+class LeaderboardViewTests(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        drama = Genre.objects.create(name="Drama")
+        # One perfect vote, many good votes, many poor votes; ratings are stored in half stars
+        self.single_vote = Movie.objects.create(title="Single Vote", rating_sum=10, rating_count=1)
+        self.acclaimed = Movie.objects.create(title="Acclaimed", rating_sum=90, rating_count=10)
+        self.panned = Movie.objects.create(title="Panned", rating_sum=30, rating_count=10)
+        self.acclaimed.genres.add(drama)
+        self.panned.genres.add(drama)
+        call_command("recompute_leaderboards", stdout=io.StringIO())
+        self.url = reverse("movie-leaderboard")
+
+    def test_leaderboard_damps_few_votes(self) -> None:
+        # Overall leaderboard and its entries, with the movies joined in
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [movie["id"] for movie in response.data], [self.acclaimed.id, self.single_vote.id, self.panned.id]
+        )
+
+        response = self.client.get(self.url, {"genre": "Drama", "limit": 1})
+        self.assertEqual([movie["id"] for movie in response.data], [self.acclaimed.id])
+        self.assertEqual(self.client.get(self.url, {"genre": "Western"}).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_ratings_rescore_entries(self) -> None:
+        self.client.post(reverse("movie-rate", kwargs={"movie_id": self.panned.id}), {"rating": 5}, format="json")
+        self.client.post(reverse("rating-batch"), [{"movie_id": self.panned.id, "rating": 4}], format="json")
+
+        self.panned.refresh_from_db()
+        self.assertEqual(self.panned.rating_count, 11)
+        for entry in LeaderboardEntry.objects.filter(movie=self.panned):
+            self.assertAlmostEqual(entry.score, (entry.prior_mean * 2 + 19) / 13)
+
+    def test_recompute_since(self) -> None:
+        new_movie = Movie.objects.create(title="New Movie", rating_sum=100, rating_count=10)
+        call_command("recompute_leaderboards", since="1h", stdout=io.StringIO())
+        self.assertEqual(self.client.get(self.url).data[0]["id"], new_movie.id)
+        self.assertEqual(LeaderboardEntry.objects.filter(genre__isnull=True).count(), 4)
+
+
+class TrendingMoviesViewTests(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.old_hit = Movie.objects.create(title="Old Hit")
+        self.recent_hit = Movie.objects.create(title="Recent Hit")
+        end = datetime.date(2015, 3, 31)
+        MovieRatingBucket.objects.bulk_create(
+            [
+                MovieRatingBucket(
+                    movie=self.old_hit, day=end - datetime.timedelta(days=20), rating_count=50, rating_sum=400
+                ),
+                MovieRatingBucket(
+                    movie=self.recent_hit, day=end - datetime.timedelta(days=6), rating_count=3, rating_sum=24
+                ),
+                MovieRatingBucket(movie=self.recent_hit, day=end, rating_count=2, rating_sum=10),
+            ]
+        )
+        self.url = reverse("movie-trending")
+
+    def test_trending_windows(self) -> None:
+        response = self.client.get(self.url, {"window": "7d"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["window_end"], datetime.date(2015, 3, 31))
+        self.assertEqual([movie["id"] for movie in response.data["results"]], [self.recent_hit.id])
+        self.assertEqual(response.data["results"][0]["window_rating_count"], 5)
+        self.assertEqual(response.data["results"][0]["window_rating"], 3.4)
+
+        response = self.client.get(self.url, {"window": "4w"})
+        self.assertEqual([movie["id"] for movie in response.data["results"]], [self.old_hit.id, self.recent_hit.id])
+        self.assertEqual(self.client.get(self.url, {"window": "7y"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ratings_count_as_todays_activity(self) -> None:
+        self.client.post(reverse("movie-rate", kwargs={"movie_id": self.old_hit.id}), {"rating": 4}, format="json")
+        self.client.put(reverse("movie-rate", kwargs={"movie_id": self.old_hit.id}), {"rating": 5}, format="json")
+
+        response = self.client.get(self.url, {"window": "1d"})
+        self.assertEqual(response.data["window_end"], datetime.datetime.now(datetime.timezone.utc).date())
+        # Changed ratings are left out of the window, so it keeps the first rating
+        self.assertEqual(response.data["results"][0]["window_rating_count"], 1)
+        self.assertEqual(response.data["results"][0]["window_rating"], 4.0)
+
+    def test_batch_rerating_is_left_out_of_the_window(self) -> None:
+        url = reverse("rating-batch")
+        self.client.post(url, [{"movie_id": self.old_hit.id, "rating": 2}], format="json")
+        self.client.post(url, [{"movie_id": self.old_hit.id, "rating": 5}], format="json")
+
+        response = self.client.get(self.url, {"window": "1d"})
+        self.assertEqual(response.data["results"][0]["window_rating_count"], 1)
+        self.assertEqual(response.data["results"][0]["window_rating"], 2.0)
+
+
+class MovieQueryBudgetTests(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        genres = [Genre.objects.create(name=f"Genre {i}") for i in range(3)]
+        tags = [Tag.objects.create(name=f"Tag {i}") for i in range(5)]
+        for i in range(20):
+            movie = Movie.objects.create(title=f"Movie {i}")
+            movie.genres.set(genres)
+            movie.tags.set(tags)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_query_count_does_not_grow_with_page_size(self) -> None:
+        url = reverse("movie-list-create")
+        for page_size in (1, 20):
+            # Last modification time, COUNT, movies, genres; tags come from the stored summary
+            with self.assertNumQueries(4):
+                response = self.client.get(url, {"page_size": page_size}, format="json")
+            self.assertEqual(len(response.data["results"]), page_size)
+            self.assertEqual(response.data["results"][0]["tags"], "Tag 0, Tag 1, Tag 2, Tag 3, Tag 4")
+
+    def test_full_tags_list_query_count(self) -> None:
+        url = reverse("movie-list-create")
+        # Last modification time, COUNT, movies, genres, tags
+        with self.assertNumQueries(5):
+            response = self.client.get(url, {"page_size": 20, "tags": "full"}, format="json")
+        self.assertEqual(response.data["results"][0]["tags"], "Tag 0, Tag 1, Tag 2, Tag 3, Tag 4")
+
+    def test_detail_query_count(self) -> None:
+        url = reverse("movie-detail-update", kwargs={"pk": Movie.objects.first().id})
+        # Version, movie, genres
+        with self.assertNumQueries(3):
+            response = self.client.get(url, format="json")
+        self.assertEqual(len(response.data["genres"]), 3)
+        self.assertEqual(response.data["tag_count"], 5)
+
+
+class FastReadTests(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        drama, comedy = Genre.objects.create(name="Drama"), Genre.objects.create(name="Comedy")
+        tags = [Tag.objects.create(name=name) for name in ["witty", "dark", "line\u2028break"]]
+        for i, title in enumerate(["Amélie", "Heat", "Clue"]):
+            movie = Movie.objects.create(title=title, rating=i + 2.5)
+            movie.genres.set([drama, comedy][: i + 1])
+            movie.tags.set(tags[i:])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def assert_paths_match(self, url: str, params: Dict[str, Any]) -> None:
+        with self.settings(MOVIE_FAST_READS=False):
+            expected = self.client.get(url, params)
+        with self.settings(MOVIE_FAST_READS=True):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+
+    def test_list_matches_serializer(self) -> None:
+        url = reverse("movie-list-create")
+        for params in [
+            {},
+            {"page_size": 2, "page": 2},
+            {"pagination": "cursor", "ordering": "-title", "page_size": 2},
+            {"genres_any": "Comedy", "tags": "full"},
+            {"tags__name": "dark", "count": "estimated"},
+        ]:
+            with self.subTest(params=params):
+                self.assert_paths_match(url, params)
+
+    def test_detail_and_search_match_serializer(self) -> None:
+        movie = Movie.objects.get(title="Amélie")
+        self.assert_paths_match(reverse("movie-detail-update", kwargs={"pk": movie.id}), {})
+        self.assert_paths_match(reverse("movie-detail-update", kwargs={"pk": movie.id}), {"tags": "full"})
+        self.assert_paths_match(reverse("movie-detail-update", kwargs={"pk": 0}), {})
+        self.assert_paths_match(reverse("movie-search"), {"q": "he"})
+
+    def test_benchmark_api(self) -> None:
+        out = io.StringIO()
+        call_command("benchmark_api", page_sizes=[2], requests=1, stdout=out)
+        self.assertIn("list page_size=2", out.getvalue())
+        self.assertIn("detail", out.getvalue())
+
+    def test_benchmark_servers_logs_in_without_writes(self) -> None:
+        with self.assertRaises(CommandError):
+            call_command("benchmark_api", compare="servers", username="benchmark", stdout=io.StringIO())
+        self.assertFalse(User.objects.filter(username="benchmark").exists())
+
+        user = User.objects.create_user(username="benchmark", password="12345")
+        client = APIClient()
+        client.cookies = session_cookies(user)
+        with benchmark_settings():
+            self.assertEqual(client.get(reverse("movie-list-create")).status_code, status.HTTP_200_OK)
+        self.assertIsNone(User.objects.get(pk=user.pk).last_login)
+        self.assertFalse(Session.objects.exists())
+
+
+class AsyncMovieViewTests(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        drama, comedy = Genre.objects.create(name="Drama"), Genre.objects.create(name="Comedy")
+        self.movies = []
+        for i, title in enumerate(["Heat", "Amélie", "Clue"]):
+            movie = Movie.objects.create(title=title, rating=i + 2.5)
+            movie.genres.set([drama, comedy][: i + 1])
+            movie.tags.set([Tag.objects.get_or_create(name=f"tag {j}")[0] for j in range(i + 1)])
+            self.movies.append(movie)
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def aget(self, *args, **kwargs):
+        return async_to_sync(self.async_client.get)(*args, **kwargs)
+
+    def test_list_matches_wsgi(self) -> None:
+        url = reverse("movie-list-create")
+        for params in [{}, {"page": 2, "page_size": 2}, {"ordering": "-title", "tags": "full"}, {"page": 9}]:
+            with self.subTest(params=params):
+                expected = self.client.get(url, params)
+                response = self.aget(url, params)
+                self.assertEqual(response.resolver_match.func.__module__, "mldb.api.async_views")
+                self.assertEqual((response.status_code, response.content), (expected.status_code, expected.content))
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_list_shares_cache_with_drf_view(self) -> None:
+        cache.clear()
+        url = reverse("movie-list-create")
+        self.assertEqual(self.aget(url)["X-Cache"], "MISS")
+        response = self.aget(url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT="application/json").content, response.content)
+
+    def test_list_falls_back_to_drf_view(self) -> None:
+        url = reverse("movie-list-create")
+        for params in [{"genres_any": "Comedy"}, {"pagination": "cursor"}, {"format": "json"}]:
+            with self.subTest(params=params):
+                expected = self.client.get(url, params)
+                response = self.aget(url, params)
+                self.assertEqual((response.status_code, response.content), (expected.status_code, expected.content))
+
+    def test_detail_matches_wsgi(self) -> None:
+        for pk, params in [(self.movies[2].id, {}), (self.movies[2].id, {"tags": "full"}), (0, {})]:
+            url = reverse("movie-detail-update", kwargs={"pk": pk})
+            with self.subTest(pk=pk, params=params):
+                expected = self.client.get(url, params)
+                response = self.aget(url, params)
+                self.assertEqual((response.status_code, response.content), (expected.status_code, expected.content))
+
+        url = reverse("movie-detail-update", kwargs={"pk": self.movies[0].id})
+        response = self.aget(url, headers={"If-None-Match": self.aget(url)["ETag"]})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_export_streams_chunks(self) -> None:
+        response = self.aget(reverse("movie-export"), {"output": "ndjson"})
+        self.assertTrue(response.is_async)
+
+        async def read() -> bytes:
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        lines = async_to_sync(read)().decode().splitlines()
+        self.assertEqual([json.loads(line)["title"] for line in lines], ["Heat", "Amélie", "Clue"])
+
+    def test_rate_movie(self) -> None:
+        url = reverse("movie-rate", kwargs={"movie_id": self.movies[0].id})
+        response = async_to_sync(self.async_client.put)(url, {"rating": 4}, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["rating"], 4)
+        self.assertEqual(UserRating.objects.get(user=self.user).rating, 4)
+
+        response = async_to_sync(self.async_client.post)(url, {"rating": 3}, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), ["You have already rated this movie."])
+        missing = reverse("movie-rate", kwargs={"movie_id": 0})
+        response = async_to_sync(self.async_client.put)(missing, {"rating": 3}, content_type="application/json")
+        self.assertEqual((response.status_code, response.json()), (404, {"detail": "Movie not found."}))
+        response = async_to_sync(self.async_client.put)(url, {"rating": -1}, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_requires_authentication(self) -> None:
+        async_to_sync(self.async_client.alogout)()
+        response = self.aget(reverse("movie-list-create"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_authorization_header_uses_drf_views(self) -> None:
+        credentials = base64.b64encode(b"testuser:12345").decode()
+        response = self.aget(reverse("movie-list-create"), headers={"Authorization": f"Basic {credentials}"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIs(response.resolver_match.func.view_class, MovieListCreateView)
+
+
+@override_settings(REPLICA_DATABASES=["replica1"], READ_YOUR_WRITES_WINDOW=5)
+class ReplicaRoutingTests(APITestCase):
+    def setUp(self) -> None:
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, write: bool = False):
+        """Runs a request through the middleware, returning the alias its view reads from and the response."""
+        aliases = []
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Movie)
+            aliases.append(self.router.db_for_read(Movie))
+            return HttpResponse()
+
+        response = replica_routing_middleware(view)(request)
+        return aliases[0], response
+
+    def test_reads_outside_requests_use_primary(self) -> None:
+        self.assertEqual(self.router.db_for_read(Movie), "default")
+        self.assertEqual(self.router.db_for_write(Movie), "default")
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_replica_reads_until_write(self) -> None:
+        with replica_reads() as alias:
+            self.assertEqual(alias, "replica1")
+            self.assertEqual(self.router.db_for_read(Movie), "replica1")
+            self.router.db_for_write(Movie)
+            self.assertEqual(self.router.db_for_read(Movie), "default")
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Movie), "replica1")
+
+    def test_get_reads_from_replica(self) -> None:
+        alias, response = self.route(self.factory.get("/api/movies/"))
+        self.assertEqual(alias, "replica1")
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_writes_read_from_primary(self) -> None:
+        alias, response = self.route(self.factory.post("/api/movies/"), write=True)
+        self.assertEqual(alias, "default")
+        self.assertEqual(response.cookies[PRIMARY_COOKIE]["max-age"], 5)
+
+    def test_reads_after_write_use_primary(self) -> None:
+        request = self.factory.get("/api/movies/")
+        request.COOKIES[PRIMARY_COOKIE] = "1"
+        alias, _ = self.route(request)
+        self.assertEqual(alias, "default")
+
+    def test_rating_pins_client_to_primary(self) -> None:
+        user = User.objects.create_user(username="testuser", password="12345")
+        movie = Movie.objects.create(title="Test Movie", rating=5)
+        self.client.force_authenticate(user=user)
+        url = reverse("movie-rate", kwargs={"movie_id": movie.id})
+        response = self.client.post(url, {"rating": 4}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class MovieCacheTests(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.movie = Movie.objects.create(title="Cached Movie")
+        self.other_movie = Movie.objects.create(title="Other Movie")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def rate(self, movie: Movie, rating: int) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse("movie-rate", kwargs={"movie_id": movie.id}), {"rating": rating}, format="json")
+
+    def test_detail_is_cached_until_rated(self) -> None:
+        url = reverse("movie-detail-update", kwargs={"pk": self.movie.id})
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        # Only the version lookup for the ETag
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+        self.rate(self.movie, 1)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["rating"], "1.0")
+
+    def test_list_is_only_invalidated_by_movies_on_the_page(self) -> None:
+        url = reverse("movie-list-create")
+        params = {"page_size": 1}
+        self.assertEqual(self.client.get(url, params)["X-Cache"], "MISS")
+
+        self.rate(self.other_movie, 1)
+        self.assertEqual(self.client.get(url, params)["X-Cache"], "HIT")
+
+        self.rate(self.movie, 1)
+        self.assertEqual(self.client.get(url, params)["X-Cache"], "MISS")
+
+    @override_settings(REPLICA_DATABASES=["replica1"])
+    def test_pinned_clients_skip_the_cache(self) -> None:
+        url = reverse("movie-detail-update", kwargs={"pk": self.movie.id})
+        self.client.cookies[PRIMARY_COOKIE] = "1"
+        for _ in range(2):
+            self.assertNotIn("X-Cache", self.client.get(url))
+            self.assertNotIn("X-Cache", self.client.get(reverse("movie-list-create")))
+
+    def test_create_invalidates_lists(self) -> None:
+        url = reverse("movie-list-create")
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {"title": "New Movie", "genres": [], "tags": "", "rating": 4}, format="json")
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["count"], 3)
+
+    def test_delete_invalidates_lists(self) -> None:
+        url = reverse("movie-list-create")
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_movie.delete()
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["count"], 1)
+
+    def test_list_etag_follows_deletes(self) -> None:
+        url = reverse("movie-list-create")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Deleting the movie modified first leaves the latest modification time as it was
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 1)
+
+    def test_list_is_not_stored_if_a_movie_changes_while_it_is_read(self) -> None:
+        def versions_after_a_write(movie_ids):
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_movie_versions(self.movie.id)
+            return movie_versions(movie_ids)
+
+        url = reverse("movie-list-create")
+        with mock.patch("mldb.api.cache.movie_versions", versions_after_a_write):
+            self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+
+class MetricsTests(APITestCase):
+    list_duration = 'mldb_http_request_duration_seconds_count{view="movie-list-create",method="GET"}'
+    list_queries = 'mldb_http_request_db_queries_count{view="movie-list-create"}'
+    list_query_total = 'mldb_http_request_db_queries_sum{view="movie-list-create"}'
+    list_serialization = 'mldb_http_request_serialization_duration_seconds_count{view="movie-list-create"}'
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.movie = Movie.objects.create(title="Heat", rating=4)
+        self.movie.genres.add(Genre.objects.create(name="Drama"))
+        self.client.force_authenticate(user=self.user)
+
+    def metrics(self) -> Dict[str, float]:
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith("#"):
+                sample, _, value = line.rpartition(" ")
+                samples[sample] = float(value)
+        return samples
+
+    def test_records_latency_queries_and_serialization(self) -> None:
+        before = self.metrics()
+        self.client.get(reverse("movie-list-create"))
+        after = self.metrics()
+        self.assertEqual(after[self.list_duration] - before.get(self.list_duration, 0), 1)
+        self.assertEqual(after[self.list_queries] - before.get(self.list_queries, 0), 1)
+        self.assertGreaterEqual(after[self.list_query_total] - before.get(self.list_query_total, 0), 3)
+        self.assertEqual(after[self.list_serialization] - before.get(self.list_serialization, 0), 1)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_only_timed(self) -> None:
+        sampled = []
+        sample = RequestMetricsMiddleware.sample
+
+        def recorded_sample(request):
+            sampled.append(sample(request))
+            return sampled[-1]
+
+        before = self.metrics()
+        with mock.patch.object(RequestMetricsMiddleware, "sample", staticmethod(recorded_sample)):
+            self.client.get(reverse("movie-list-create"))
+        after = self.metrics()
+        self.assertEqual(after[self.list_duration] - before.get(self.list_duration, 0), 1)
+        self.assertEqual(after.get(self.list_queries, 0), before.get(self.list_queries, 0))
+        self.assertEqual((sampled[0].queries, sampled[0].serialization_seconds), (0, 0))
+
+    @override_settings(SLOW_QUERY_SECONDS=0)
+    def test_logs_slow_queries_with_view_name(self) -> None:
+        with self.assertLogs("mldb.metrics", "WARNING") as logs:
+            self.client.get(reverse("movie-detail-update", kwargs={"pk": self.movie.id}))
+        self.assertIn("Slow query in movie-detail-update", logs.output[-1])
+
+    @override_settings(METRICS_SAMPLE_RATE=0, SLOW_QUERY_SECONDS=0)
+    def test_logs_slow_queries_of_unsampled_requests(self) -> None:
+        with self.assertLogs("mldb.metrics", "WARNING") as logs:
+            self.client.get(reverse("movie-detail-update", kwargs={"pk": self.movie.id}))
+        self.assertIn("Slow query in movie-detail-update", logs.output[-1])
+
+    def test_metrics_are_only_served_to_allowed_ips(self) -> None:
+        self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.7").status_code, 403)
+        with self.settings(METRICS_ALLOWED_IPS=["203.0.113.0/24"]):
+            self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.7").status_code, 200)
+
 
 class MovieDetailUpdateViewTests(APITestCase):
     def setUp(self) -> None:
@@ -63,9 +913,323 @@ class MovieDetailUpdateViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["title"], "Updateable Movie")
 
+    def test_retrieve_movie_not_modified(self) -> None:
+        response = self.client.get(self.url, format="json")
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.put(reverse("movie-rate", kwargs={"movie_id": self.movie.id}), {"rating": 2}, format="json")
+        response = self.client.get(self.url, format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_tag_summary_follows_tag_changes(self) -> None:
+        pixar, funny, heist = (Tag.objects.create(name=name) for name in ["pixar", "funny", "heist"])
+        Movie.objects.filter(pk=self.movie.pk).update(tag_summary="pixar, funny", tag_count=2)
+        self.movie.tags.add(pixar, funny)
+
+        self.movie.tags.add(heist)
+        self.assertEqual(self.client.get(self.url, format="json").data["tags"], "pixar, funny, heist")
+        funny.delete()
+        self.assertEqual(self.client.get(self.url, format="json").data["tags"], "pixar, heist")
+        pixar.name = "animated"
+        pixar.save()
+        heist.movie_tags.clear()
+        response = self.client.get(self.url, format="json")
+        self.assertEqual((response.data["tags"], response.data["tag_count"]), ("animated", 1))
+
+    def test_clearing_links_updates_movies(self) -> None:
+        heist = Tag.objects.create(name="heist")
+        self.movie.tags.add(heist)
+        version = Movie.objects.get(pk=self.movie.pk).version
+
+        heist.movie_tags.clear()
+        self.genre.movie_genres.clear()
+        movie = Movie.objects.get(pk=self.movie.pk)
+        self.assertEqual((movie.tag_count, movie.genre_mask), (0, 0))
+        self.assertEqual(movie.version, version + 2)
+
+    def test_retrieve_full_tags(self) -> None:
+        tags = [Tag.objects.create(name=f"Tag {i}") for i in range(3)]
+        self.movie.tags.set(tags)
+
+        with self.settings(TAG_SUMMARY_SIZE=2):
+            self.movie.tags.add(Tag.objects.create(name="Tag 3"))
+        summary = self.client.get(self.url, format="json")
+        full = self.client.get(self.url, {"tags": "full"}, format="json")
+
+        self.assertEqual((summary.data["tags"], summary.data["tag_count"]), ("Tag 0, Tag 1", 4))
+        self.assertEqual(full.data["tags"], "Tag 0, Tag 1, Tag 2, Tag 3")
+        self.assertNotEqual(summary["ETag"], full["ETag"])
+
+    def test_update_movie_if_match(self) -> None:
+        etag = self.client.get(self.url, format="json")["ETag"]
+        updated_data = {"title": "First Update", "genres": [self.genre.name], "tags": "", "rating": 4}
+        response = self.client.put(self.url, updated_data, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+        updated_data["title"] = "Second Update"
+        response = self.client.put(self.url, updated_data, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.title, "First Update")
+
     def test_update_movie(self) -> None:
         updated_data = {"title": "Updated Movie Title", "genres": [self.genre.name], "tags": "", "rating": 4}
         response = self.client.put(self.url, updated_data, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.movie.refresh_from_db()
         self.assertEqual(self.movie.title, "Updated Movie Title")
+
+    def test_update_keeps_derived_fields(self) -> None:
+        stale = Movie.objects.get(pk=self.movie.pk)
+        Movie.objects.filter(pk=self.movie.pk).update(rating=2, tag_summary="heist", tag_count=1, genre_mask=6)
+
+        stale.title = "Renamed Movie"
+        stale.save()
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.title, "Renamed Movie")
+        self.assertEqual(
+            (self.movie.rating, self.movie.tag_summary, self.movie.tag_count, self.movie.genre_mask), (2, "heist", 1, 6)
+        )
+
+    def test_update_movie_ignores_rating(self) -> None:
+        updated_data = {"title": "Updateable Movie", "genres": [self.genre.name], "tags": "", "rating": 1}
+        response = self.client.put(self.url, updated_data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["rating"], "3.0")
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.rating, 3)
+
+
+class ExportMoviesTests(TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        drama = Genre.objects.create(name="Drama")
+        tag = Tag.objects.create(name="classic")
+        for title in ["Heat", "Casino", "Ronin"]:
+            movie = Movie.objects.create(title=title)
+            movie.genres.add(drama)
+            movie.tags.add(tag)
+        self.ids = list(Movie.objects.values_list("id", flat=True))
+
+    def test_export_writes_stage_metrics(self) -> None:
+        path = os.path.join(self.tmp_dir.name, "movies.csv")
+        metrics_path = os.path.join(self.tmp_dir.name, "export.prom")
+        call_command("export_movies", path, metrics_file=metrics_path, stdout=io.StringIO())
+
+        with open(metrics_path) as f:
+            metrics = f.read()
+        self.assertIn('mldb_command_stage_rows{command="export_movies",stage="Exporting movies"} 3\n', metrics)
+        self.assertIn('mldb_command_stage_rows_per_second{command="export_movies",stage="Exporting movies"}', metrics)
+
+    def test_export_csv_gzip(self) -> None:
+        path = os.path.join(self.tmp_dir.name, "movies.csv.gz")
+        call_command("export_movies", path, gzip=True, chunk_size=2, stdout=io.StringIO())
+
+        with gzip.open(path, "rt", newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["Movie ID", "Title", "Rating", "Genres", "Tags"])
+        self.assertEqual(
+            rows[1:],
+            [
+                [str(movie_id), title, "5.0", "Drama", "classic"]
+                for movie_id, title in zip(self.ids, ["Heat", "Casino", "Ronin"])
+            ],
+        )
+
+    def test_export_jsonl_query_count(self) -> None:
+        path = os.path.join(self.tmp_dir.name, "movies.jsonl")
+        # Two full chunks and an empty one, each with a movie, genre and tag query
+        with self.assertNumQueries(7):
+            self.assertEqual(export_movies(path, "jsonl", chunk_size=2), 3)
+
+        with open(path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(
+            records[0], {"id": self.ids[0], "title": "Heat", "rating": 5.0, "genres": ["Drama"], "tags": ["classic"]}
+        )
+
+    def test_export_shards_cover_catalog(self) -> None:
+        with self.assertNumQueries(1):
+            bounds = shard_bounds(2)
+        self.assertEqual(bounds, [(None, self.ids[2]), (self.ids[2], None)])
+        self.assertEqual(shard_bounds(5), [(None, self.ids[1]), (self.ids[1], self.ids[2]), (self.ids[2], None)])
+        path = os.path.join(self.tmp_dir.name, "movies.jsonl")
+        self.assertEqual(shard_path(path, 1), os.path.join(self.tmp_dir.name, "movies.part-001.jsonl"))
+        self.assertEqual([export_movies(path, "jsonl", start_id=start, end_id=end) for start, end in bounds], [2, 1])
+
+
+class MovieExportViewTests(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        drama = Genre.objects.create(name="Drama")
+        for title in ["Heat", "Casino"]:
+            Movie.objects.create(title=title).genres.add(drama)
+        self.url = reverse("movie-export")
+
+    def test_export_csv_stream(self) -> None:
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], ["Movie ID", "Title", "Rating", "Genres", "Tags"])
+        self.assertEqual([row[1] for row in rows[1:]], ["Heat", "Casino"])
+
+    def test_export_ndjson_gzip_stream(self) -> None:
+        response = self.client.get(self.url, {"output": "ndjson"}, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        lines = gzip.decompress(b"".join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(line)["title"] for line in lines], ["Heat", "Casino"])
+
+    def test_export_requires_authentication(self) -> None:
+        self.client.force_authenticate(user=None)
+        self.assertIn(self.client.get(self.url).status_code, [status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN])
+
+
+class LoadMovielensDataTests(TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.movies_path = self.write_csv(
+            "movies.csv",
+            "movieId,title,genres\n"
+            "1,Toy Story (1995),Adventure|Animation|Children\n"
+            "2,Jumanji (1995),Adventure|Children\n"
+            "3,Heat (1995),(no genres listed)\n",
+        )
+        self.ratings_path = self.write_csv(
+            "ratings.csv",
+            "userId,movieId,rating,timestamp\n" "1,1,4.0,1112486027\n" "2,1,3.0,1112484676\n" "1,2,3.5,1112484819\n",
+        )
+        self.command = LoadMovielensDataCommand(stdout=io.StringIO())
+
+    def write_csv(self, name: str, content: str) -> str:
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_populate_movies(self) -> None:
+        self.command.populate_genres(self.movies_path)
+        self.command.populate_movies(self.movies_path)
+
+        self.assertEqual(Movie.objects.count(), 3)
+        self.assertEqual(
+            sorted(Movie.objects.get(id=1).genres.values_list("name", flat=True)),
+            ["Adventure", "Animation", "Children"],
+        )
+        self.assertFalse(Movie.objects.get(id=3).genres.exists())
+        bits = dict(Genre.objects.values_list("name", "bit"))
+        self.assertEqual(Movie.objects.get(id=2).genre_mask, (1 << bits["Adventure"]) | (1 << bits["Children"]))
+        self.assertEqual(Movie.objects.get(id=3).genre_mask, 0)
+        self.assertEqual(Movie.objects.create(title="New Movie").id, 4)
+
+    def test_reload_fills_existing_rating_aggregates(self) -> None:
+        self.command.populate_genres(self.movies_path)
+        self.command.populate_movies(self.movies_path)
+        self.command.populate_ratings(self.ratings_path)
+        Movie.objects.update(rating=5, rating_sum=0, rating_count=0)
+        user = User.objects.create_user(username="testuser", password="12345")
+        UserRating.objects.create(user=user, movie_id=2, rating=5)
+
+        self.command.populate_movies(self.movies_path)
+        self.command.populate_ratings(self.ratings_path)
+
+        self.assertEqual(
+            list(Movie.objects.order_by("id").values_list("rating_sum", "rating_count")), [(14, 2), (17, 2), (0, 0)]
+        )
+        self.assertEqual(float(Movie.objects.get(id=2).rating), 4.2)
+        self.assertEqual(float(Movie.objects.get(id=3).rating), 5.0)
+
+    def test_scan_ratings_in_chunks(self) -> None:
+        self.command.chunk_size = 2
+        chunks = []
+        totals, buckets, rows = self.command.scan_ratings(self.ratings_path, [1, 2, 3], chunks.append)
+        self.assertEqual(totals.loc[1].tolist(), [14, 2])
+        self.assertEqual(totals.loc[2].tolist(), [7, 1])
+        self.assertEqual(buckets["rating_count"].tolist(), [2, 1])
+        self.assertEqual((rows, [len(chunk) for chunk in chunks]), (3, [2, 1]))
+
+    def test_populate_ratings(self) -> None:
+        self.command.batch_size = 2
+        self.command.populate_genres(self.movies_path)
+        self.command.populate_movies(self.movies_path)
+        self.command.populate_ratings(self.ratings_path)
+        self.command.populate_ratings(self.ratings_path)
+
+        self.assertEqual(MovieLensRating.objects.count(), 3)
+        rating = MovieLensRating.objects.get(ml_user_id=1, movie_id=2)
+        self.assertEqual(rating.rating, 7)
+        self.assertEqual(rating.timestamp, 1112484819)
+        self.assertEqual(float(Movie.objects.get(id=1).rating), 3.5)
+        self.assertEqual(float(Movie.objects.get(id=3).rating), 5.0)
+
+    def test_populate_rating_buckets(self) -> None:
+        self.command.chunk_size = 1
+        self.command.skip_ratings = True
+        self.command.populate_genres(self.movies_path)
+        self.command.populate_movies(self.movies_path)
+        self.command.populate_ratings(self.ratings_path)
+        self.command.populate_ratings(self.ratings_path)
+
+        self.assertFalse(MovieLensRating.objects.exists())
+        self.assertEqual(list(Movie.objects.values_list("rating_sum", "rating_count")), [(14, 2), (7, 1), (0, 0)])
+
+        buckets = MovieRatingBucket.objects.order_by("movie_id", "day")
+        self.assertEqual(
+            list(buckets.values_list("movie_id", "day", "rating_count", "rating_sum")),
+            [(1, datetime.date(2005, 4, 2), 2, 14), (2, datetime.date(2005, 4, 2), 1, 7)],
+        )
+
+    def test_reconcile_ratings(self) -> None:
+        self.command.populate_genres(self.movies_path)
+        self.command.populate_movies(self.movies_path)
+        self.command.populate_ratings(self.ratings_path)
+        user = User.objects.create_user(username="testuser", password="12345")
+        UserRating.objects.create(user=user, movie_id=2, rating=5)
+        Movie.objects.filter(id=1).update(rating_sum=3, rating_count=9)
+
+        call_command("reconcile_ratings", stdout=io.StringIO())
+
+        self.assertEqual(list(Movie.objects.values_list("rating_sum", "rating_count")), [(14, 2), (17, 2), (0, 0)])
+        self.assertEqual(float(Movie.objects.get(id=2).rating), 4.2)
+
+    def test_populate_tags_skips_unknown_movies(self) -> None:
+        tags_path = self.write_csv(
+            "tags.csv",
+            "userId,movieId,tag,timestamp\n"
+            "18,1,pixar,1240597180\n"
+            "65,1,pixar,1368150078\n"
+            "65,2,board game,1368150079\n"
+            "65,99,orphan,1368150080\n",
+        )
+        self.command.populate_genres(self.movies_path)
+        self.command.populate_movies(self.movies_path)
+        self.command.batch_size = 1
+        self.command.populate_tags(tags_path)
+
+        self.assertEqual(sorted(Tag.objects.values_list("name", flat=True)), ["board game", "pixar"])
+        self.assertEqual(list(Movie.objects.get(id=1).tags.values_list("name", flat=True)), ["pixar"])
+        self.assertEqual(Movie.tags.through.objects.count(), 2)
+        self.assertEqual(
+            list(Movie.objects.order_by("id").values_list("tag_summary", "tag_count")),
+            [("pixar", 1), ("board game", 1), ("", 0)],
+        )
+
+    def test_tag_summaries_rank_tags_by_use(self) -> None:
+        df_tags = pd.DataFrame(
+            {"movieId": [1, 1, 1, 1, 1, 2], "tag": ["quirky", "pixar", "pixar", "funny", "pixar", "heist"]}
+        )
+
+        summaries = LoadMovielensDataCommand.tag_summaries(df_tags, size=2)
+
+        self.assertEqual(summaries.values.tolist(), [[1, "pixar, funny", 3], [2, "heist", 1]])
@@ -0,0 +1,89 @@
+"""
+Trending movies from daily rating buckets.
+
+Every movie's ratings are counted and summed per UTC day in ``MovieRatingBucket``: the loader builds the buckets
+from the dataset's rating timestamps and user rating writes add to the current day's bucket. A window of ``n``
+days is answered by summing at most ``n`` buckets per movie with a range scan on the ``(day, movie)`` index, so
+its cost doesn't grow with the length of the history. Windows end at the latest bucket, which keeps a catalog
+that only holds historical data browsable.
+"""
+
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from django.db import connection
+from django.db.models import Max, Sum
+
+from mldb.models import MovieRatingBucket
+
+MAX_WINDOW_DAYS = 366
+
+WINDOW_UNITS = {"d": 1, "w": 7}
+
+
+def parse_window(value: str) -> Optional[int]:
+    """
+    Parses a window such as ``7d`` or ``4w``.
+
+    Args:
+        value: The window.
+
+    Returns:
+        The window in days, or None if it isn't valid or is longer than ``MAX_WINDOW_DAYS``.
+    """
+    match = re.fullmatch(r"(\d+)([dw])", value)
+    if not match:
+        return None
+    days = int(match[1]) * WINDOW_UNITS[match[2]]
+    return days if 0 < days <= MAX_WINDOW_DAYS else None
+
+
+def record_ratings(ratings: Dict[int, int]) -> None:
+    """
+    Adds user ratings made now to their movies' buckets for today, with one upsert.
+
+    Only first ratings belong here: a changed rating isn't another rating for the day, and adding its difference to
+    the sum without counting it would skew the window means.
+
+    Args:
+        ratings: Mapping of movie ids to ratings, in stars.
+    """
+    if not ratings:
+        return
+    table = connection.ops.quote_name(MovieRatingBucket._meta.db_table)
+    today = datetime.now(timezone.utc).date().isoformat()
+    rows = ", ".join(["(%s, %s, 1, %s)"] * len(ratings))
+    params = [value for movie_id, rating in ratings.items() for value in (movie_id, today, rating * 2)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (movie_id, day, rating_count, rating_sum) VALUES {rows} "
+            f"ON CONFLICT (day, movie_id) DO UPDATE SET "
+            f"rating_count = {table}.rating_count + EXCLUDED.rating_count, "
+            f"rating_sum = {table}.rating_sum + EXCLUDED.rating_sum",
+            params,
+        )
+
+
+def trending_movies(days: int, limit: int) -> Tuple[Optional[date], List[Dict[str, int]]]:
+    """
+    Ranks movies by the number of ratings they got in a window of days.
+
+    Args:
+        days: The window length.
+        limit: The maximum number of movies to return.
+
+    Returns:
+        The last day of the window, or None if there are no buckets, and the movies' ``movie_id``,
+        ``rating_count`` and ``rating_sum`` (in half stars) over the window, most rated first.
+    """
+    end = MovieRatingBucket.objects.aggregate(end=Max("day"))["end"]
+    if end is None:
+        return None, []
+    ranking = (
+        MovieRatingBucket.objects.filter(day__gt=end - timedelta(days=days), day__lte=end)
+        .values("movie_id")
+        .annotate(rating_count=Sum("rating_count"), rating_sum=Sum("rating_sum"))
+        .order_by("-rating_count", "movie_id")[:limit]
+    )
+    return end, list(ranking)
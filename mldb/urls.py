@@ -1,5 +1,8 @@
 from django.urls import include, path
 
+from mldb.metrics import metrics_view
+
 urlpatterns = [
     path("api/", include("mldb.api.urls")),
+    path("metrics", metrics_view, name="metrics"),
 ]
@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "movielens_api.settings")
+# Async views run their queries in threads that don't outlive the request, so persistent connections would never
+# be reused and would pile up until the server runs out of connection slots
+os.environ.setdefault("DATABASE_CONN_MAX_AGE", "0")
 
 application = get_asgi_application()
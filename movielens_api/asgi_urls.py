@@ -0,0 +1,15 @@
+"""
+URL configuration for requests served under ASGI, selected by ``mldb.middleware.asgi_routing_middleware``.
+
+The movie list, detail and rating endpoints map to native async views; every other URL is routed as in
+``movielens_api.urls``.
+"""
+
+from django.urls import include, path
+
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path("api/", include("mldb.api.async_urls")),
+    *wsgi_urlpatterns,
+]
@@ -27,6 +27,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "mldb.metrics.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -34,10 +35,15 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "mldb.middleware.asgi_routing_middleware",
+    "mldb.middleware.replica_routing_middleware",
 ]
 
 ROOT_URLCONF = "movielens_api.urls"
 
+# Routes of requests served under ASGI, where the movie list, detail and rating endpoints are native async views
+ASGI_URLCONF = "movielens_api.asgi_urls"
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -67,6 +73,16 @@ DATABASES = {
     }
 }
 
+# Local memory evicts the least recently used entries beyond MAX_ENTRIES; point CACHE_BACKEND and CACHE_LOCATION
+# at a shared backend such as Redis or Memcached to share cached responses between processes
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "mldb"),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "10000"))},
+    }
+}
+
 if os.getenv("DJANGO_TESTING"):
     DATABASES = {
         "default": {
@@ -74,6 +90,32 @@ if os.getenv("DJANGO_TESTING"):
             "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
         }
     }
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+# Read replicas of the default database, as comma-separated host[:port] entries for PostgreSQL or file paths for
+# SQLite; they are named replica1, replica2, ... and serve the mldb reads of GET and HEAD requests
+REPLICA_DATABASES: List[str] = []
+for location in filter(None, (entry.strip() for entry in os.getenv("DATABASE_REPLICAS", "").split(","))):
+    alias = f"replica{len(REPLICA_DATABASES) + 1}"
+    # Tests run against the default test database, which replicas mirror instead of getting their own
+    DATABASES[alias] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+    if DATABASES[alias]["ENGINE"] == "django.db.backends.sqlite3":
+        DATABASES[alias]["NAME"] = location
+    else:
+        host, _, port = location.partition(":")
+        DATABASES[alias].update(HOST=host, PORT=port or DATABASES["default"]["PORT"])
+    REPLICA_DATABASES.append(alias)
+
+# Persistent connections: seconds a connection is kept for reuse by later requests, 0 to close it after each
+# request; kept connections are checked before reuse so that a restarted or failed-over server is reconnected to.
+# asgi.py defaults it to 0
+for database in DATABASES.values():
+    database.update(CONN_MAX_AGE=int(os.getenv("DATABASE_CONN_MAX_AGE", "60")), CONN_HEALTH_CHECKS=True)
+
+DATABASE_ROUTERS = ["mldb.routers.ReplicaRouter"]
+
+# Seconds after a write during which the writing client's reads go to the primary rather than a lagging replica
+READ_YOUR_WRITES_WINDOW = int(os.getenv("READ_YOUR_WRITES_WINDOW", "5"))
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -101,3 +143,37 @@ USE_TZ = True
 STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Maximum number of ratings accepted by one request to the batch rating endpoint
+RATING_BATCH_MAX_SIZE = int(os.getenv("RATING_BATCH_MAX_SIZE", "500"))
+
+# Maximum number of ids accepted by one request to the batch movie lookup endpoint
+MOVIE_BATCH_MAX_SIZE = int(os.getenv("MOVIE_BATCH_MAX_SIZE", "500"))
+
+# Default pagination of the movie list, "page" or "cursor"; clients can override it with ?pagination=
+MOVIE_LIST_PAGINATION = os.getenv("MOVIE_LIST_PAGINATION", "page")
+
+# Seconds a cached movie list or detail response is kept; writes invalidate entries earlier
+MOVIE_CACHE_TIMEOUT = int(os.getenv("MOVIE_CACHE_TIMEOUT", "300"))
+
+# Number of phantom ratings at the mean that leaderboard scores are damped with
+LEADERBOARD_PRIOR_WEIGHT = int(os.getenv("LEADERBOARD_PRIOR_WEIGHT", "50"))
+
+# Number of tags kept in a movie's tag summary, which movie responses show unless ?tags=full is passed
+TAG_SUMMARY_SIZE = int(os.getenv("TAG_SUMMARY_SIZE", "20"))
+
+# Whether movie list, detail and search reads are built from values() rows and rendered with orjson instead of
+# going through model instances and MovieSerializer; writes always use the serializer
+MOVIE_FAST_READS = os.getenv("MOVIE_FAST_READS", "true").lower() == "true"
+
+# Share of requests whose database queries and serialization go into the per-request histograms, from 0 to 1;
+# every request is still counted and timed
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1"))
+
+# Queries taking at least this many seconds are logged with their view name
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.5"))
+
+# Comma-separated addresses and networks allowed to scrape /metrics
+METRICS_ALLOWED_IPS = [
+    network.strip() for network in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if network.strip()
+]